@@ -1,11 +1,17 @@
+from datetime import datetime, timedelta
+
 import streamlit as st
+from dotenv import load_dotenv
+
+from utils.cache import get_cached_database
+from utils.metrics import timed
 
-from dotenv import load_dotenv 
 load_dotenv()
 
 st.set_page_config(page_title="Email Management System", page_icon="🏠", layout="wide")
 
 
+@timed("page_render", page="Home")
 def main():
     st.title("🏠 Email Management System")
     st.caption("Quick glance at your outreach, templates, and reminders.")
@@ -15,9 +21,20 @@ def main():
     with hero_left:
         st.subheader("Today")
         col1, col2, col3 = st.columns(3)
-        col1.metric("Emails Sent", "50", "+3 vs yesterday")
-        col2.metric("Open Rate", "75%", "↑ 4%")
-        col3.metric("Response Rate", "40%", "↑ 2%")
+        db = get_cached_database()
+        today = datetime.now().date()
+        yesterday, current = db.get_daily_stats(today - timedelta(days=1), today)
+        attempts = current["sent"] + current["failed"]
+        col1.metric(
+            "Emails Sent",
+            current["sent"],
+            f"{current['sent'] - yesterday['sent']:+d} vs yesterday",
+        )
+        col2.metric("Failure Rate", f"{current['failed'] / attempts:.0%}" if attempts else "—")
+        col3.metric("Scheduled", db.get_totals()["backlog"])
+        due = db.count_due_reminders()
+        if due:
+            st.warning(f"🔔 {due} reminder{'s' if due != 1 else ''} due. See the Reminders page.")
         st.write("Manage recipients, templates, schedules, and reminders from the sidebar pages.")
     with hero_right:
         st.image(
@@ -43,13 +60,31 @@ def main():
 
     st.divider()
     st.subheader("Recent Emails")
-    st.table(
-        {
-            "Recipient": ["John Doe", "Jane Smith", "Alex Lee"],
-            "Subject": ["Meeting tomorrow", "Project update", "Follow-up"],
-            "Date": ["2026-01-15", "2026-01-22", "2026-01-24"],
-        }
-    )
+    recent = get_cached_database().get_recent_sends()
+    if recent:
+        st.table(
+            {
+                "Recipient": [send["recipient"] for send in recent],
+                "Subject": [send["subject"] for send in recent],
+                "Date": [send["sent_date"][:16].replace("T", " ") for send in recent],
+            }
+        )
+    else:
+        st.info("No emails sent yet.", icon="ℹ️")
+
+    with st.expander("⚙️ Read cache"):
+        stats = get_cached_database().stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Hits", stats["hits"])
+        c2.metric("Misses", stats["misses"])
+        c3.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+        st.table(
+            {
+                "Read": list(stats["methods"]),
+                "Hits": [m["hits"] for m in stats["methods"].values()],
+                "Misses": [m["misses"] for m in stats["methods"].values()],
+            }
+        )
 
 
 if __name__ == "__main__":
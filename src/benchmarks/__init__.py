@@ -0,0 +1,20 @@
+"""
+Reproducible benchmarks for the data and send paths.
+
+Run from the ``src`` directory::
+
+    python -m benchmarks                          # 10k rows, JSON and SQLite, vs. the baseline
+    python -m benchmarks --sizes 10000 100000 1000000 --backends sqlite
+    python -m benchmarks --only "db.search*" --only "send.*"
+    python -m benchmarks --output results.json    # keep the full JSON document
+    python -m benchmarks --save-baseline          # make this run the new baseline
+
+Each run builds deterministic synthetic datasets (see ``benchmarks.datasets``), then times every
+``DatabaseManager`` read and write, the send-history analytics, template compilation and
+rendering, and ``send_email`` and ``BulkSender`` throughput against a local SMTP sink
+(``benchmarks.smtp_sink``). Results are compared with ``benchmarks/baseline.json`` by median
+time, and the exit code is non-zero when a case got slower than ``--threshold`` (50% by
+default, which shared CI machines stay within; a quiet machine can use 0.2). Timings depend
+on the machine, so record the baseline on the machine that runs the comparison; its ``meta``
+names the commit it was taken at.
+"""
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from benchmarks.datasets import DEFAULT_CACHE_DIR, build_database
+from benchmarks.harness import Case, compare, measure, result_id
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.suites import (
+    SEND_CASES,
+    analytics_cases,
+    database_cases,
+    render_cases,
+    send_cases,
+)
+from utils.db import DatabaseManager
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+BACKEND_SUFFIXES = {"json": ".json", "sqlite": ".db"}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _wanted(group: str, name: str, backend: str, size: int, patterns: list[str]) -> bool:
+    full = result_id({"backend": backend, "size": size, "group": group, "name": name})
+    return not patterns or any(
+        fnmatch.fnmatch(f"{group}.{name}", pattern) or fnmatch.fnmatch(full, pattern)
+        for pattern in patterns
+    )
+
+
+def _selected(cases: list[Case], backend: str, size: int, patterns: list[str]) -> list[Case]:
+    return [case for case in cases if _wanted(case.group, case.name, backend, size, patterns)]
+
+
+def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Run the selected cases for every backend and size; one result dict per case."""
+    results = []
+    for backend in args.backends:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory(prefix="email-bench-") as directory:
+                path = Path(directory) / f"bench{BACKEND_SUFFIXES[backend]}"
+                started = time.perf_counter()
+                build_database(path, size, args.seed, None if args.no_cache else args.cache_dir)
+                logger.info(
+                    f"{backend} {size:,}: dataset ready in {time.perf_counter() - started:.1f}s"
+                )
+                db = DatabaseManager(str(path), write_behind=False)
+                cases = database_cases(db, size, args.repeat + 1, args.seed)
+                cases += analytics_cases(db)
+                cases += render_cases(db, size, args.seed)
+                for case in _selected(cases, backend, size, args.only):
+                    result = {"backend": backend, "size": size, **measure(case, args.repeat)}
+                    logger.info(f"{result_id(result)}: {result['median_ms']} ms")
+                    results.append(result)
+                db.db.close()
+
+    if any(_wanted("send", name, "smtp", 0, args.only) for name in SEND_CASES):
+        sink = SMTPSink(delay=args.smtp_delay).start()
+        pool = sink.pool(args.connections)
+        try:
+            for case in _selected(send_cases(pool, args.messages), "smtp", 0, args.only):
+                result = {"backend": "smtp", "size": 0, **measure(case, args.repeat)}
+                logger.info(f"{result_id(result)}: {result['items_per_s']} messages/s")
+                results.append(result)
+        finally:
+            pool.close()
+            sink.stop()
+    return results
+
+
+def _progress(record: dict[str, Any]) -> bool:
+    return record["level"].no < logger.level("WARNING").no and record["name"].startswith(
+        ("benchmarks", "__main__")
+    )
+
+
+def _print_table(results: list[dict[str, Any]], comparison: list[dict[str, Any]]) -> None:
+    statuses = {row["id"]: row for row in comparison}
+    print(f"{'case':<52} {'median ms':>11} {'p95 ms':>10} {'cold ms':>10} {'items/s':>12}  vs base")
+    for result in results:
+        key = result_id(result)
+        row = statuses.get(key, {})
+        change = f"{row['ratio']:.2f}x {row['status']}" if "ratio" in row else row.get("status", "")
+        print(
+            f"{key:<52} {result['median_ms']:>11.3f} {result['p95_ms']:>10.3f} "
+            f"{result['cold_ms']:>10.3f} {result['items_per_s'] or 0:>12,.0f}  {change}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmark the data and send paths."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000])
+    parser.add_argument(
+        "--backends", nargs="+", choices=sorted(BACKEND_SUFFIXES), default=["json", "sqlite"]
+    )
+    parser.add_argument(
+        "--only", action="append", default=[], help="Glob over group.name or the full id."
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per case.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--messages", type=int, default=200, help="Messages per send case.")
+    parser.add_argument("--connections", type=int, default=4, help="SMTP pool size.")
+    parser.add_argument("--smtp-delay", type=float, default=0.0, help="Sink seconds per message.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Generated datasets.")
+    parser.add_argument("--no-cache", action="store_true", help="Always regenerate datasets.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.5, help="Allowed slowdown, 0.5 for 50%%."
+    )
+    parser.add_argument(
+        "--noise-ms", type=float, default=0.1, help="Ignore changes smaller than this."
+    )
+    parser.add_argument("--output", type=Path, help="Write the JSON document here.")
+    parser.add_argument("--json", action="store_true", help="Print the JSON document.")
+    parser.add_argument("--verbose", action="store_true", help="Log progress.")
+    args = parser.parse_args(argv)
+
+    # send_email logs every message; only warnings, and progress with --verbose, get through.
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    if args.verbose:
+        logger.add(sys.stderr, level="INFO", filter=_progress)
+
+    results = run(args)
+    baseline = None
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    comparison = (
+        compare(results, baseline["results"], args.threshold, args.noise_ms) if baseline else []
+    )
+    regressions = [row for row in comparison if row["status"] == "regression"]
+    document = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sizes": args.sizes,
+            "backends": args.backends,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "baseline": baseline["meta"] if baseline else None,
+            "threshold": args.threshold,
+        },
+        "results": results,
+        "comparison": comparison,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        baseline_doc = {"meta": document["meta"], "results": results}
+        args.baseline.write_text(json.dumps(baseline_doc, indent=2) + "\n", encoding="utf-8")
+    if args.json:
+        print(json.dumps(document, indent=2))
+    else:
+        _print_table(results, comparison)
+        if baseline:
+            print(
+                f"\n{len(regressions)} regression(s) against the baseline from commit "
+                f"{baseline['meta'].get('commit')}"
+            )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
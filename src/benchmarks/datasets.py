@@ -0,0 +1,173 @@
+"""
+Deterministic synthetic datasets for the benchmarks.
+
+``build_database`` fills a fresh database with ``size`` profiles and ``size`` sent emails, plus
+templates, campaigns, reminders and schedules in proportion. The same ``size`` and ``seed``
+always give the same rows, so runs on different commits measure the same data. Large datasets
+take a while to generate, so they are built once per backend, size and seed into ``cache_dir``
+and copied into place for each run.
+"""
+
+from __future__ import annotations
+
+import random
+import shutil
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from utils.db import DatabaseManager
+
+# Bumped whenever the generated rows change, so stale cached datasets are not reused.
+DATASET_VERSION = 1
+DEFAULT_CACHE_DIR = ".bench_data"
+# Fixed so that generated dates, and the stats derived from them, do not depend on the clock.
+BASE_DATE = datetime(2025, 1, 1, 8, 0)
+CHUNK_SIZE = 10_000
+CAMPAIGN_SIZE = 100
+
+FIRST_NAMES = (
+    "Ada", "Alan", "Grace", "Linus", "Barbara", "Dennis", "Margaret", "Ken", "Frances", "Edsger",
+    "Radia", "Tim", "Katherine", "Guido", "Hedy", "Donald", "Sophie", "John", "Anita", "Niklaus",
+)  # fmt: skip
+LAST_NAMES = (
+    "Lovelace", "Turing", "Hopper", "Torvalds", "Liskov", "Ritchie", "Hamilton", "Thompson",
+    "Allen", "Dijkstra", "Perlman", "Berners-Lee", "Johnson", "van Rossum", "Lamarr", "Knuth",
+    "Wilson", "McCarthy", "Borg", "Wirth",
+)  # fmt: skip
+DOMAINS = ("gmail.com", "outlook.com", "yahoo.com", "acme.io", "example.org", "uni.edu")
+TITLES = ("Dr.", "Prof.", "Mr.", "Ms.", "Eng.", "")
+PROFESSIONS = (
+    "Engineer", "Doctor", "Teacher", "Lawyer", "Designer", "Researcher", "Accountant", "Nurse",
+)  # fmt: skip
+_VOCABULARY = (
+    "meeting agenda invoice payment project update proposal contract review budget quarterly "
+    "report launch schedule follow-up introduction thanks interview offer deadline feedback "
+    "conference travel workshop renewal reminder overdue draft approval design release team "
+    "customer partner research paper grant deadline summary notes call next week friday"
+)
+WORDS = _VOCABULARY.split()
+
+
+def profile_rows(size: int, seed: int = 0) -> Iterator[dict[str, str]]:
+    """``size`` profiles with unique email addresses."""
+    rng = random.Random(seed)
+    for i in range(size):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            "name": f"{first} {last}",
+            "email": f"{first}.{last.replace(' ', '')}{i}@{rng.choice(DOMAINS)}".lower(),
+            "title": rng.choice(TITLES),
+            "profession": rng.choice(PROFESSIONS),
+        }
+
+
+def _text(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def sent_email_rows(
+    size: int, recipients: int, seed: int = 0
+) -> Iterator[tuple[list[str], str, str, datetime]]:
+    """
+    ``size`` ``(recipients, subject, body, sent_date)`` rows addressed to the first
+    ``recipients`` generated profiles, spread over a year from ``BASE_DATE``.
+    """
+    rng = random.Random(seed + 1)
+    emails = [profile["email"] for profile in profile_rows(recipients, seed)]
+    for _ in range(size):
+        yield (
+            rng.sample(emails, rng.choice((1, 1, 1, 2, 3))),
+            _text(rng, 2, 6).capitalize(),
+            f"Dear colleague,\n\n{_text(rng, 30, 120)}\n\nBest regards",
+            BASE_DATE + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+        )
+
+
+TEMPLATE_BODY = (
+    "Dear {{title}} {{name}},\n\n{text}\n\nAs a {{profession}} you will appreciate this.\n\n"
+    "{{signature}}"
+)
+
+
+def populate(db: DatabaseManager, size: int, seed: int = 0) -> dict[str, int]:
+    """Insert the dataset for ``size`` into an empty ``db`` and return the row counts."""
+    rng = random.Random(seed + 2)
+    profiles = profile_rows(size, seed)
+    while chunk := list(islice(profiles, CHUNK_SIZE)):
+        db.add_profiles(chunk, skip_existing=False)
+    emails = sent_email_rows(size, min(size, 50_000), seed)
+    email_ids: list[int] = []
+    while chunk := list(islice(emails, CHUNK_SIZE)):
+        email_ids += db.add_sent_emails(chunk)
+
+    templates = max(10, size // 1000)
+    for i in range(templates):
+        db.add_template(f"Template {i}", TEMPLATE_BODY.replace("{text}", _text(rng, 40, 150)))
+    campaigns = max(1, size // 1000)
+    emails = [profile["email"] for profile in profile_rows(min(size, 50_000), seed)]
+    for _ in range(campaigns):
+        recipients = rng.sample(emails, min(len(emails), CAMPAIGN_SIZE))
+        subject = _text(rng, 2, 6).capitalize()
+        body = _text(rng, 30, 120)
+        db.add_campaign(
+            recipients,
+            [subject] * len(recipients),
+            [f"Dear {address.split('.')[0].title()},\n\n{body}" for address in recipients],
+            BASE_DATE + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+        )
+    followups = rng.sample(email_ids, max(1, size // 100))
+    with db.transaction():
+        for email_id in followups:
+            db.add_reminder(email_id, BASE_DATE + timedelta(days=rng.randrange(400)))
+    db.add_schedules(
+        [(email_id, BASE_DATE + timedelta(days=rng.randrange(400))) for email_id in followups]
+    )
+    db.set_user_profile(
+        "Bench Sender", "Dr.", "PhD", "Benchmark University", "Researcher", {}, "Best, Bench"
+    )
+    return {
+        "profiles": size,
+        "sent_emails": size,
+        "templates": templates,
+        "campaigns": campaigns,
+        "reminders": len(followups),
+        "schedules": len(followups),
+    }
+
+
+def build_database(
+    path: str | Path,
+    size: int,
+    seed: int = 0,
+    cache_dir: str | Path | None = DEFAULT_CACHE_DIR,
+) -> dict[str, Any]:
+    """
+    Create the dataset for ``size`` at ``path``, an ``.json`` or ``.db`` file.
+
+    With ``cache_dir`` the generated file is kept there and copied on later calls.
+
+    Returns:
+        ``{"size", "seed", "cached"}``, plus the row counts when the dataset was generated.
+    """
+    path = Path(path)
+    cached = None
+    if cache_dir is not None:
+        cached = Path(cache_dir) / f"v{DATASET_VERSION}-{size}-{seed}{path.suffix}"
+        if cached.exists():
+            shutil.copyfile(cached, path)
+            return {"size": size, "seed": seed, "cached": True}
+
+    logger.info(f"Generating benchmark dataset: {size:,} profiles and sent emails")
+    db = DatabaseManager(str(path), write_behind=True, flush_every=1_000_000, flush_interval=3600.0)
+    counts = populate(db, size, seed)
+    db.flush()
+    db.db.close()
+    if cached is not None:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, cached)
+    return {"size": size, "seed": seed, "cached": False, **counts}
@@ -0,0 +1,134 @@
+"""
+Timing and baseline comparison for the benchmark suite.
+
+Every case is called once cold, which includes building any lazy index or cache it needs. It is
+then called repeatedly with garbage collection paused. Runs are compared on the median of the
+repeated calls, and a change only counts when the fastest call moved the same way, which keeps
+a few calls interrupted by other processes from showing up as regressions.
+"""
+
+from __future__ import annotations
+
+import gc
+import statistics
+import time
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class Case:
+    """
+    One timed operation.
+
+    ``run`` is called with no arguments and must leave the dataset roughly as it found it, or
+    only grow it by a few rows. ``items`` is the units of work per call (messages sent, rows
+    inserted) for the throughput figure.
+    """
+
+    group: str
+    name: str
+    run: Callable[[], Any]
+    items: int = 1
+
+
+def _elapsed(fn: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def measure(
+    case: Case, repeat: int = 20, min_repeat: int = 3, max_seconds: float = 2.0
+) -> dict[str, Any]:
+    """
+    Time ``case`` once cold, then up to ``repeat`` more times.
+
+    Repetition stops early once ``min_repeat`` calls have taken ``max_seconds``, so slow
+    operations on large datasets do not dominate the run.
+
+    Returns:
+        ``{"group", "name", "items", "repeat", "cold_ms", "min_ms", "median_ms", "p95_ms",
+        "items_per_s"}``.
+    """
+    gc.collect()
+    cold = _elapsed(case.run)
+    times: list[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(times) < repeat:
+            times.append(_elapsed(case.run))
+            if len(times) >= min_repeat and time.perf_counter() - started > max_seconds:
+                break
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    times.sort()
+    median = statistics.median(times)
+    return {
+        "group": case.group,
+        "name": case.name,
+        "items": case.items,
+        "repeat": len(times),
+        "cold_ms": round(cold * 1000, 4),
+        "min_ms": round(times[0] * 1000, 4),
+        "median_ms": round(median * 1000, 4),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 4),
+        "items_per_s": round(case.items / median, 1) if median else None,
+    }
+
+
+def result_id(result: Mapping[str, Any]) -> str:
+    """The key that matches a result with its baseline, e.g. ``sqlite/10000/db.search``."""
+    return f"{result['backend']}/{result['size']}/{result['group']}.{result['name']}"
+
+
+def compare(
+    results: Iterable[Mapping[str, Any]],
+    baseline: Iterable[Mapping[str, Any]],
+    threshold: float = 0.5,
+    noise_ms: float = 0.1,
+) -> list[dict[str, Any]]:
+    """
+    Compare median times with a baseline run.
+
+    A case is a ``regression`` when its median and its fastest call both got more than
+    ``threshold`` slower, and an ``improvement`` when both got that much faster, in either case
+    by more than ``noise_ms``.
+    Cases only in the current run are ``new``; cases only in the baseline are skipped, since
+    runs may select different sizes or cases.
+
+    Returns:
+        One ``{"id", "status", "baseline_ms", "median_ms", "ratio"}`` row per current result.
+    """
+    previous = {result_id(result): result for result in baseline}
+    rows = []
+    for result in results:
+        key = result_id(result)
+        before = previous.get(key)
+        if before is None:
+            rows.append({"id": key, "status": "new", "median_ms": result["median_ms"]})
+            continue
+        old, new = before["median_ms"], result["median_ms"]
+        ratio = new / old if old else float("inf")
+        fastest = result["min_ms"] / before["min_ms"] if before["min_ms"] else float("inf")
+        status = "same"
+        if abs(new - old) > noise_ms:
+            if min(ratio, fastest) > 1 + threshold:
+                status = "regression"
+            elif max(ratio, fastest) < 1 / (1 + threshold):
+                status = "improvement"
+        rows.append(
+            {
+                "id": key,
+                "status": status,
+                "baseline_ms": old,
+                "median_ms": new,
+                "ratio": round(ratio, 3),
+            }
+        )
+    return rows
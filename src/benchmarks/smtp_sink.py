@@ -0,0 +1,101 @@
+"""
+Local SMTP server that accepts every message and throws it away, for send benchmarks.
+
+It speaks just enough plain-text ESMTP for ``smtplib`` (and so yagmail and ``SMTPPool``):
+EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP and QUIT, without TLS or authentication.
+``SMTPSink.pool()`` returns an ``SMTPPool`` configured for it. ``delay`` adds a fixed
+server-side latency per message to mimic a remote relay.
+"""
+
+from __future__ import annotations
+
+import socketserver
+import threading
+import time
+
+from loguru import logger
+
+from utils.smtp_pool import SMTPPool
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: SMTPSink
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        self._reply("220 smtp-sink ESMTP ready")
+        while line := self.rfile.readline():
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                self._reply("250-smtp-sink")
+                self._reply("250-8BITMIME")
+                self._reply("250 SIZE 52428800")
+            elif verb in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self._reply("250 OK")
+            elif verb == b"DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while (data := self.rfile.readline()) not in (b".\r\n", b".\n", b""):
+                    size += len(data)
+                if self.server.delay:
+                    time.sleep(self.server.delay)
+                self.server.record(size)
+                self._reply("250 OK queued")
+            elif verb == b"QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """The sink server; ``messages`` and ``bytes`` count what it has accepted."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0) -> None:
+        super().__init__((host, port), _Handler)
+        self.delay = delay
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def host(self) -> str:
+        return self.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, size: int) -> None:
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def pool(self, max_connections: int = 4) -> SMTPPool:
+        """An SMTP pool that sends to this sink without TLS or login."""
+        return SMTPPool(
+            "bench@example.com",
+            None,
+            host=self.host,
+            port=self.port,
+            smtp_ssl=False,
+            smtp_starttls=False,
+            smtp_skip_login=True,
+            max_connections=max_connections,
+            max_messages_per_connection=10_000,
+        )
+
+    def start(self) -> SMTPSink:
+        """Serve from a daemon thread and return self, e.g. ``SMTPSink().start()``."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        logger.debug(f"SMTP sink listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
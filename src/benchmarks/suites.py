@@ -0,0 +1,222 @@
+"""
+The benchmark cases: database operations, send-history analytics, template rendering and sending.
+
+Each function returns a list of ``Case`` objects bound to a prepared database or SMTP sink.
+Write cases either add rows with fresh keys or remove rows created for them beforehand, so the
+dataset stays the same size, give or take a few dozen rows, for every case that follows.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+from datetime import timedelta
+from typing import Any
+
+from benchmarks.datasets import BASE_DATE, TEMPLATE_BODY, profile_rows
+from benchmarks.harness import Case
+from utils import analytics
+from utils.bulk_send import BulkSender, OutgoingMessage
+from utils.db import DatabaseManager
+from utils.helpers import send_email
+from utils.smtp_pool import SMTPPool
+from utils.templating import CompiledTemplate, render_batch
+
+BATCH = 100
+SEND_CASES = ("send_email", "bulk_send")
+
+
+def database_cases(db: DatabaseManager, size: int, calls: int, seed: int = 0) -> list[Case]:
+    """
+    Every public ``DatabaseManager`` read and write.
+
+    Args:
+        db: A database filled by ``benchmarks.datasets.populate`` for ``size``.
+        size: The dataset size.
+        calls: How many times each case will be called, so delete cases get enough rows.
+        seed: Seed for the ids and values the cases pick.
+    """
+    rng = random.Random(seed + 3)
+    fresh = itertools.count()
+    profile_ids = [profile.doc_id for profile in db.profiles.all()]
+    email_ids = [email.doc_id for email in db.sent_emails.all()]
+    template_ids = [template.doc_id for template in db.templates.all()]
+    campaign_ids = [campaign.doc_id for campaign in db.campaigns.all()]
+    schedule_ids = [schedule.doc_id for schedule in db.schedules.all()]
+    known = next(profile_rows(1, seed))
+    day = BASE_DATE.date() + timedelta(days=180)
+
+    def new_profile() -> dict[str, str]:
+        n = next(fresh)
+        return {
+            "name": f"Bench {n}",
+            "email": f"bench{n}@bench.test",
+            "title": "",
+            "profession": "",
+        }
+
+    def new_email() -> tuple[list[str], str, str, Any]:
+        n = next(fresh)
+        return ([f"bench{n}@bench.test"], f"Bench {n}", f"Benchmark body {n}", BASE_DATE)
+
+    spare_profiles = db.add_profiles([new_profile() for _ in range(calls)])
+    spare_templates = [db.add_template(f"Spare {i}", "Hello {{name}}") for i in range(calls)]
+    spare_emails = db.add_sent_emails([new_email() for _ in range(calls)])
+    spare_reminders = [db.add_reminder(email_id, BASE_DATE) for email_id in spare_emails]
+    spare_schedules = db.add_schedules([(email_id, BASE_DATE) for email_id in spare_emails])
+    recipients = [f"bench-campaign{i}@bench.test" for i in range(BATCH)]
+    spare_campaigns = [
+        db.add_campaign(recipients, ["Spare"] * BATCH, ["Spare body"] * BATCH, BASE_DATE)
+        for _ in range(calls)
+    ]
+
+    def profile() -> int:
+        return rng.choice(profile_ids)
+
+    reads = [
+        ("get_all_profiles", db.get_all_profiles),
+        ("get_all_templates", db.get_all_templates),
+        ("get_all_sent_emails", db.get_all_sent_emails),
+        ("get_all_campaigns", db.get_all_campaigns),
+        ("get_all_reminders", db.get_all_reminders),
+        ("get_all_schedules", db.get_all_schedules),
+        ("get_profiles_by_id", db.get_profiles_by_id),
+        ("get_profile", lambda: db.get_profile(profile())),
+        ("get_profiles", lambda: db.get_profiles(rng.sample(profile_ids, min(BATCH, size)))),
+        ("find_profile_by_email", lambda: db.find_profile_by_email(known["email"])),
+        ("find_profiles_by_name", lambda: db.find_profiles_by_name(known["name"])),
+        ("list_profiles", lambda: db.list_profiles(offset=rng.randrange(size // 2))),
+        ("list_profiles.filter", lambda: db.list_profiles(filter="engineer")),
+        ("list_templates", db.list_templates),
+        ("list_reminders", db.list_reminders),
+        ("get_template", lambda: db.get_template(rng.choice(template_ids))),
+        ("get_compiled_template", lambda: db.get_compiled_template(rng.choice(template_ids))),
+        ("get_sent_email", lambda: db.get_sent_email(rng.choice(email_ids))),
+        ("get_campaign", lambda: db.get_campaign(rng.choice(campaign_ids))),
+        ("get_campaigns_on", lambda: db.get_campaigns_on(day)),
+        ("get_reminders_for_email", lambda: db.get_reminders_for_email(rng.choice(email_ids))),
+        ("get_schedules_for_email", lambda: db.get_schedules_for_email(rng.choice(email_ids))),
+        ("get_user_profile", db.get_user_profile),
+        ("search_sent_emails", lambda: db.search_sent_emails("overdue invoice")),
+        ("search", lambda: db.search("quarterly budget")),
+        ("similar", lambda: db.similar("follow-up on the overdue invoice payment")),
+        ("get_totals", db.get_totals),
+        ("get_daily_stats", lambda: db.get_daily_stats(day - timedelta(days=30), day)),
+        ("get_top_recipients", db.get_top_recipients),
+        ("get_recent_sends", db.get_recent_sends),
+        ("count_due_reminders", db.count_due_reminders),
+        ("iter_table.sent_emails", lambda: sum(1 for _ in db.iter_table("sent_emails"))),
+    ]
+    writes = [
+        ("add_profile", lambda: db.add_profile(**new_profile()), 1),
+        ("add_profiles", lambda: db.add_profiles([new_profile() for _ in range(BATCH)]), BATCH),
+        ("update_profile", lambda: db.update_profile(profile(), **new_profile()), 1),
+        ("delete_profile", lambda: db.delete_profile(spare_profiles.pop()), 1),
+        ("add_template", lambda: db.add_template("Bench", TEMPLATE_BODY), 1),
+        (
+            "update_template",
+            lambda: db.update_template(rng.choice(template_ids), "Bench", TEMPLATE_BODY),
+            1,
+        ),
+        ("delete_template", lambda: db.delete_template(spare_templates.pop()), 1),
+        ("add_sent_email", lambda: db.add_sent_email(*new_email()), 1),
+        ("add_sent_emails", lambda: db.add_sent_emails([new_email() for _ in range(BATCH)]), BATCH),
+        (
+            "add_campaign",
+            lambda: db.add_campaign(recipients, ["Bench"] * BATCH, ["Body"] * BATCH, BASE_DATE),
+            BATCH,
+        ),
+        (
+            "update_campaign_statuses",
+            lambda: db.update_campaign_statuses(
+                rng.choice(spare_campaigns), dict.fromkeys(recipients[:10], "failed")
+            ),
+            10,
+        ),
+        ("delete_campaign", lambda: db.delete_campaign(spare_campaigns.pop()), 1),
+        ("add_reminder", lambda: db.add_reminder(rng.choice(email_ids), BASE_DATE), 1),
+        ("delete_reminder", lambda: db.delete_reminder(spare_reminders.pop()), 1),
+        ("add_schedule", lambda: db.add_schedule(rng.choice(email_ids), BASE_DATE), 1),
+        (
+            "update_schedule_status",
+            lambda: db.update_schedule_status(rng.choice(schedule_ids), "pending"),
+            1,
+        ),
+        ("delete_schedule", lambda: db.delete_schedule(spare_schedules.pop()), 1),
+        (
+            "update_user_profile",
+            lambda: db.update_user_profile(
+                "Bench Sender", "Dr.", "PhD", "Benchmark University", "Researcher", {}, "Best"
+            ),
+            1,
+        ),
+    ]
+    return [Case("db", name, run) for name, run in reads] + [
+        Case("db", name, run, items) for name, run, items in writes
+    ]
+
+
+def analytics_cases(db: DatabaseManager) -> list[Case]:
+    """
+    Loading the send history into columns, and the dashboard's summaries over it.
+
+    ``items`` is history rows, one per recipient per message: about 1.7 per unit of dataset size,
+    so ``--sizes 600000`` gives the 1M rows the analytics are meant to summarize in under a
+    second. The summaries meet that; the load does not. On one core it takes about 1.3 s for
+    1M rows held in 10k campaigns in SQLite, and far longer when the rows are spread over
+    per-message ``sent_emails`` documents as in this dataset (about 1.6 s per 170k rows), since
+    each document still costs a few microseconds of Python. ``get_history`` caches the frame,
+    so the load runs once per change to the history while the summaries run on every render.
+    """
+    history = analytics.load_history(db)
+
+    def summarize() -> None:
+        for freq in ("h", "D", "W", "M"):
+            analytics.volume(history, freq)
+        analytics.breakdown(history, "domain")
+        analytics.breakdown(history, "profession")
+        analytics.hour_heatmap(history)
+
+    return [
+        Case("analytics", "load_history", lambda: analytics.load_history(db), len(history)),
+        Case("analytics", "summaries", summarize, len(history)),
+    ]
+
+
+def render_cases(db: DatabaseManager, size: int, seed: int = 0) -> list[Case]:
+    """Template compilation and per-recipient rendering, over up to 10,000 profiles."""
+    profiles = list(profile_rows(min(size, 10_000), seed))
+    body = db.get_all_templates()[0]["body"]
+    template = CompiledTemplate(body)
+    user = db.get_user_profile()
+    return [
+        Case("render", "compile", lambda: CompiledTemplate(body)),
+        Case("render", "render", lambda: template.render({"name": "Ada", "title": "Dr."})),
+        Case(
+            "render",
+            "render_batch",
+            lambda: render_batch(template, profiles, user, "\n\nBest"),
+            len(profiles),
+        ),
+    ]
+
+
+def send_cases(pool: SMTPPool, messages: int = 200) -> list[Case]:
+    """
+    ``send_email`` and ``BulkSender`` throughput through ``pool``, e.g. ``SMTPSink.pool()``.
+
+    Both reuse the pool's persistent connections, the way the app does, so the figures are the
+    client-side cost per message plus the round trips to the server.
+    """
+    batch = [
+        OutgoingMessage(f"recipient{i}@domain{i % 20}.test", "Benchmark", f"Body {i}\n" * 20)
+        for i in range(messages)
+    ]
+    bulk = BulkSender(pool, per_domain_rate=None)
+
+    def send_sequentially() -> None:
+        for message in batch:
+            send_email(message.to, message.subject, message.body, pool=pool, per_domain_rate=None)
+
+    runs = {"send_email": send_sequentially, "bulk_send": lambda: bulk.send_all(batch)}
+    return [Case("send", name, runs[name], messages) for name in SEND_CASES]
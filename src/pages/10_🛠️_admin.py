@@ -0,0 +1,89 @@
+import json
+from datetime import datetime
+
+import streamlit as st
+
+from utils.metrics import get_metrics, metrics_url, timed
+
+metrics = get_metrics()
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:,.2f}"
+
+
+def _since(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def _label(histogram: dict) -> str:
+    return ", ".join(f"{key}={value}" for key, value in histogram["labels"].items())
+
+
+@timed("page_render", page="admin")
+def main():
+    st.title("🛠️ Admin")
+    st.caption("Where the time goes: database calls, storage I/O, SMTP and page renders.")
+    st.divider()
+
+    rate = st.slider(
+        "Sample rate",
+        0.0,
+        1.0,
+        float(metrics.sample_rate),
+        0.01,
+        help="Fraction of calls that are timed; counts are scaled up to estimate all calls. "
+        "Changing it starts a new recording.",
+    )
+    if rate != metrics.sample_rate:
+        metrics.sample_rate = rate
+        metrics.reset()
+
+    snapshot = metrics.snapshot()
+    histograms = snapshot["histograms"]
+    url = metrics_url()
+    endpoint = f"Prometheus endpoint: {url}" if url else "Set EMAIL_METRICS_PORT to serve /metrics."
+    st.caption(f"Recorded since {_since(snapshot['started'])} · {endpoint}")
+
+    if not histograms:
+        st.info("Nothing recorded yet.", icon="ℹ️")
+    else:
+        groups = sorted({histogram["name"] for histogram in histograms})
+        for tab, name in zip(st.tabs(groups), groups, strict=True):
+            rows = [histogram for histogram in histograms if histogram["name"] == name]
+            rows.sort(key=lambda histogram: histogram["sum"], reverse=True)
+            with tab:
+                st.dataframe(
+                    {
+                        "Labels": [_label(row) for row in rows],
+                        "Calls": [row["count"] for row in rows],
+                        "Mean ms": [_ms(row["sum"] / row["count"]) for row in rows],
+                        "p50 ms": [_ms(row["p50"]) for row in rows],
+                        "p95 ms": [_ms(row["p95"]) for row in rows],
+                        "p99 ms": [_ms(row["p99"]) for row in rows],
+                        "Max ms": [_ms(row["max"]) for row in rows],
+                        "Total s": [f"{row['sum']:,.3f}" for row in rows],
+                    },
+                    use_container_width=True,
+                )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "⬇️ Download JSON",
+            json.dumps(snapshot, indent=2),
+            file_name="metrics.json",
+            mime="application/json",
+            use_container_width=True,
+        )
+    with col2:
+        if st.button("🗑️ Reset", use_container_width=True):
+            metrics.reset()
+            st.rerun()
+
+    with st.expander("Prometheus text"):
+        st.code(metrics.to_prometheus(), language="text")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import streamlit as st
+
+from utils.cache import get_cached_database
+from utils.metrics import timed
+from utils.ui import current_page, pager
+
+db = get_cached_database()
+
+PAGE_SIZE = 20
+# Label -> outbox status listed under it.
+VIEWS = {
+    "Dead letters": "dead",
+    "Retrying": "failed",
+    "Queued": "queued",
+    "Sending": "sending",
+    "Sent": "sent",
+}
+
+
+def _when(value):
+    return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M") if value else "—"
+
+
+def _all_ids(status, total):
+    return [row.doc_id for row in db.list_outbox(status, limit=total)["items"]]
+
+
+@timed("page_render", page="outbox")
+def main():
+    st.title("📤 Outbox")
+    st.caption("Messages waiting to go out, being retried, or given up on.")
+    st.divider()
+
+    counts = db.count_outbox()
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Queued", counts["queued"])
+    col2.metric("Sending", counts["sending"])
+    col3.metric("Retrying", counts["failed"])
+    col4.metric("Dead letters", counts["dead"])
+    col5.metric("Sent", counts["sent"])
+
+    st.info(
+        "Retries and interrupted batches are sent by the outbox worker, which runs in the "
+        "scheduler process (`python -m utils.scheduler` from the src folder).",
+        icon="ℹ️",
+    )
+
+    view = st.radio("Show", options=list(VIEWS), horizontal=True, key="outbox_view")
+    status = VIEWS[view]
+    page = current_page("outbox_page", view)
+    result = db.list_outbox(status, offset=page * PAGE_SIZE, limit=PAGE_SIZE)
+    total = result["total"]
+
+    if status == "dead" and total:
+        col1, col2 = st.columns(2)
+        if col1.button("🔁 Requeue all", use_container_width=True):
+            db.requeue_outbox(_all_ids("dead", total))
+            st.rerun()
+        if col2.button("🗑️ Delete all", use_container_width=True):
+            db.delete_outbox(_all_ids("dead", total))
+            st.rerun()
+    elif status == "sent" and total and st.button("🧹 Clear sent", use_container_width=True):
+        db.delete_outbox(_all_ids("sent", total))
+        st.rerun()
+
+    if not total:
+        st.info(f"No {view.lower()}.", icon="ℹ️")
+        return
+
+    for row in result["items"]:
+        with st.container(border=True):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**{row['subject']}** → {row['recipient']}")
+                details = [f"Queued {_when(row['created_at'])}", f"attempts: {row['attempts']}"]
+                if status == "failed":
+                    details.append(f"next attempt {_when(row['next_attempt'])}")
+                if status == "sent":
+                    details.append(f"sent {_when(row['sent_at'])}")
+                st.caption(" · ".join(details))
+                if row.get("attachments"):
+                    names = ", ".join(attachment["filename"] for attachment in row["attachments"])
+                    st.caption(f"📎 {names}")
+                if row.get("error"):
+                    code = f" (SMTP {row['error_code']})" if row.get("error_code") else ""
+                    st.caption(f"Last error{code}: {row['error']}")
+                with st.expander("Body"):
+                    st.text(row["body"])
+            with col2:
+                retry = status in ("dead", "failed") and st.button(
+                    "Retry now", key=f"retry_{row.doc_id}", use_container_width=True
+                )
+                if retry:
+                    db.requeue_outbox([row.doc_id])
+                    st.rerun()
+                delete = status != "sending" and st.button(
+                    "Delete", key=f"delete_{row.doc_id}", use_container_width=True
+                )
+                if delete:
+                    db.delete_outbox([row.doc_id])
+                    st.rerun()
+
+    pager("outbox_page", total, PAGE_SIZE)
+
+
+if __name__ == "__main__":
+    main()
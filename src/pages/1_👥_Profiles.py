@@ -1,10 +1,19 @@
+import io
+
 import streamlit as st
 
-from utils.db import DatabaseManager
+from utils.cache import get_cached_database
+from utils.metrics import timed
+from utils.transfer import detect_format, import_profiles
+from utils.ui import current_page, pager
+
+db = get_cached_database()
 
-db = DatabaseManager()
+PAGE_SIZE = 20
+SORT_OPTIONS = {"name": "Name", "email": "Email", "profession": "Profession", "-id": "Newest"}
 
 
+@timed("page_render", page="Profiles")
 def main():
     st.title("👥 Profiles")
     st.caption("Add team members, then use them as recipients across the app.")
@@ -31,19 +40,67 @@ def main():
 
             if submitted:
                 if name and email and title and profession:
+                    if db.find_profile_by_email(email):
+                        st.error(f"A profile with the email {email} already exists")
+                        st.stop()
                     db.add_profile(name, email, title, profession)
                     st.success("Profile added successfully")
                     st.rerun()
                 else:
                     st.error("Please fill in all fields")
 
+    with st.expander("📥 Import contacts from a file"):
+        st.caption(
+            "CSV with a header row, or JSON Lines, with name, email, title and profession fields. "
+            "Emails that already exist are skipped."
+        )
+        uploaded = st.file_uploader("Contacts file", type=["csv", "jsonl", "ndjson"])
+        if uploaded is not None and st.button("Import", use_container_width=True):
+            progress = st.progress(0.0, text="Importing…")
+
+            def report_progress(report):
+                # Position in the upload approximates progress without counting lines first.
+                done = min(uploaded.tell() / max(uploaded.size, 1), 1.0)
+                progress.progress(done, text=f"Read {report.read} records…")
+
+            stream = io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+            report = import_profiles(
+                db, stream, detect_format(uploaded.name), on_chunk=report_progress
+            )
+            progress.empty()
+            st.success(
+                f"Imported {report.inserted} of {report.read} contacts "
+                f"({report.duplicates} duplicates, {report.invalid} invalid)"
+            )
+            for error in report.errors:
+                st.caption(error)
+
     st.divider()
     st.subheader("Existing Profiles")
-    profiles = db.get_all_profiles()
 
-    if not profiles:
-        st.info("No profiles yet. Add a profile above to get started.")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        query = st.text_input(
+            "Filter", placeholder="Name, email, title or profession", key="profile_filter"
+        )
+    with col2:
+        sort = st.selectbox("Sort by", options=list(SORT_OPTIONS), format_func=SORT_OPTIONS.get)
+
+    page = current_page("profile_page", (query, sort))
+    result = db.list_profiles(offset=page * PAGE_SIZE, limit=PAGE_SIZE, sort=sort, filter=query)
+    profiles, total = result["items"], result["total"]
+    if total and not profiles:
+        # The last page emptied out (e.g. after deleting its profiles).
+        st.session_state["profile_page"] = 0
+        st.rerun()
+
+    if not total:
+        if query:
+            st.info("No profiles match this filter.")
+        else:
+            st.info("No profiles yet. Add a profile above to get started.")
     else:
+        st.caption(f"{total} profile{'s' if total != 1 else ''}")
         for profile in profiles:
             with st.container(border=True):
                 col1, col2 = st.columns([3, 1])
@@ -57,6 +114,7 @@ def main():
                         db.delete_profile(profile.doc_id)
                         st.success("Profile deleted")
                         st.rerun()
+        pager("profile_page", total, PAGE_SIZE)
 
 
 if __name__ == "__main__":
@@ -1,17 +1,24 @@
 import streamlit as st
 
-from utils.db import DatabaseManager
+from utils.cache import get_cached_database
+from utils.metrics import timed
+from utils.ui import current_page, pager
 
-db = DatabaseManager()
+db = get_cached_database()
 
+PAGE_SIZE = 10
 
+
+@timed("page_render", page="Email_Templates")
 def main():
     st.title("📄 Email Templates")
     st.caption("Create reusable templates to speed up sending.")
     st.divider()
 
     st.info(
-        "Give each template a clear name and a body. These appear in the Send Email page dropdown.",
+        "Give each template a clear name and a body. These appear in the Send Email page dropdown. "
+        "Placeholders such as {{name}}, {{first_name}}, {{title}}, {{profession}}, {{user.name}} "
+        "and {{signature}} are filled in for each recipient when sending.",
         icon="ℹ️",
     )
 
@@ -36,10 +43,21 @@ def main():
 
     st.divider()
     st.subheader("Existing Templates")
-    templates = db.get_all_templates()
 
-    if not templates:
-        st.info("No templates yet. Add one above to get started.")
+    query = st.text_input("Filter", placeholder="Template name or text", key="template_filter")
+    page = current_page("template_page", query)
+    result = db.list_templates(offset=page * PAGE_SIZE, limit=PAGE_SIZE, filter=query)
+    templates, total = result["items"], result["total"]
+    if total and not templates:
+        # The last page emptied out (e.g. after deleting its templates).
+        st.session_state["template_page"] = 0
+        st.rerun()
+
+    if not total:
+        if query:
+            st.info("No templates match this filter.")
+        else:
+            st.info("No templates yet. Add one above to get started.")
     else:
         for template in templates:
             with st.container(border=True):
@@ -56,6 +74,7 @@ def main():
                     db.delete_template(template.doc_id)
                     st.success("Template deleted")
                     st.rerun()
+        pager("template_page", total, PAGE_SIZE)
 
 
 if __name__ == "__main__":
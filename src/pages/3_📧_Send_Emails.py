@@ -2,13 +2,41 @@ from datetime import datetime, time, timedelta
 
 import streamlit as st
 
-from utils.db import DatabaseManager
+from utils.attachments import AttachmentTooLargeError, format_size, get_attachment_store
+from utils.cache import get_cached_database
+from utils.metrics import timed
+from utils.outbox import OutboxWorker
+from utils.smtp_pool import get_smtp_pool
+from utils.templating import render_batch
 
-from utils.helpers import send_email
+db = get_cached_database()
+store = get_attachment_store()
 
-db = DatabaseManager()
+# Seconds "Send Now" keeps claiming messages before leaving the rest to the outbox worker. At a
+# provider's 20 messages a minute, a large batch would otherwise hold the page for minutes.
+INLINE_SEND_SECONDS = 15.0
 
 
+def _describe(row):
+    return f"{row['recipient']} ({row['error']})" if row.get("error") else row["recipient"]
+
+
+def _save_uploads(uploads):
+    """Copy each upload into the attachment store once, however often the page reruns."""
+    saved = st.session_state.setdefault("saved_attachments", {})
+    attachments = []
+    for upload in uploads or []:
+        if upload.file_id not in saved:
+            try:
+                saved[upload.file_id] = store.save(upload, upload.name, upload.type)
+            except AttachmentTooLargeError as exc:
+                st.error(str(exc))
+                continue
+        attachments.append(saved[upload.file_id])
+    return attachments
+
+
+@timed("page_render", page="Send_Emails")
 def main():
     st.title("📧 Send Email")
     st.caption("Compose, schedule, and set reminders with a live preview.")
@@ -20,7 +48,7 @@ def main():
     if "schedule_time" not in st.session_state:
         st.session_state["schedule_time"] = time(hour=datetime.now().hour, minute=datetime.now().minute)
 
-    profiles = db.get_all_profiles()
+    profiles = db.get_profiles_by_id()
     templates = db.get_all_templates()
 
     st.info(
@@ -36,8 +64,8 @@ def main():
         with col_left:
             selected_profiles = st.multiselect(
                 "Select Recipients",
-                options=[p["name"] for p in profiles],
-                format_func=lambda x: f"{x} ({next(p['email'] for p in profiles if p['name'] == x)})",
+                options=list(profiles),
+                format_func=lambda pid: f"{profiles[pid]['name']} ({profiles[pid]['email']})",
                 placeholder="Choose one or more contacts…",
                 help="You can select multiple recipients.",
             )
@@ -54,10 +82,34 @@ def main():
             )
             add_signature = st.toggle("Add Signature", help="Append your saved signature to the email.")
 
-    template_body = next((t["body"] for t in templates if t["name"] == selected_template), "")
+    template = next((t for t in templates if t["name"] == selected_template), None)
+    template_body = template["body"] if template else ""
+    compiled = db.get_compiled_template(template.doc_id) if template else None
 
     user_profile = db.get_user_profile()
     signature = user_profile.get("signature", "") if user_profile else ""
+    suffix = f"\n\n{signature}" if add_signature else ""
+
+    recipients = db.get_profiles(selected_profiles)
+
+    def render_bodies(targets):
+        """Personalize the template for each recipient profile in one pass."""
+        if compiled is None:
+            return [template_body + suffix] * len(targets)
+        return render_batch(compiled, targets, user_profile, suffix=suffix)
+
+    def save_campaign(kind, sent_date, **extra):
+        """Record the whole selection as one campaign."""
+        return db.add_campaign(
+            recipients=[p["email"] for p in recipients],
+            subjects=[f"Email to {p['name']}" for p in recipients],
+            bodies=render_bodies(recipients),
+            sent_date=sent_date,
+            kind=kind,
+            template_id=template.doc_id if template else None,
+            attachments=attachment_docs,
+            **extra,
+        )
 
     st.divider()
     st.subheader("Content & Preview")
@@ -76,46 +128,103 @@ def main():
 
     with col2:
         st.markdown("**Live Preview**")
-        preview_body = template_body
-        if add_signature:
-            preview_body += f"\n\n{signature}"
+        if recipients:
+            preview_body = render_bodies(recipients[:1])[0]
+            st.caption(f"As {recipients[0]['name'].strip()} will see it")
+        else:
+            preview_body = template_body + suffix
+        # Drive the keyed widget through session state so the preview follows the selection.
+        st.session_state["preview email"] = preview_body
         st.text_area(
             "Rendered preview",
-            value=preview_body,
             height=320,
             key="preview email",
             label_visibility="collapsed",
         )
 
+    st.divider()
+    st.subheader("Attachments")
+    uploads = st.file_uploader(
+        "Attach files",
+        accept_multiple_files=True,
+        help=f"Up to {format_size(store.max_bytes)} in total; every recipient gets the same files.",
+    )
+    attachments = _save_uploads(uploads)
+    attachments_ok = True
+    try:
+        total_size = store.check_total(attachments)
+    except AttachmentTooLargeError as exc:
+        st.error(str(exc))
+        attachments_ok = False
+    else:
+        if attachments:
+            st.caption(f"{len(attachments)} file(s) · {format_size(total_size)}")
+    attachment_docs = [attachment.to_dict() for attachment in attachments]
+
     st.divider()
     st.subheader("Actions")
-    can_send = bool(selected_profiles and selected_template)
+    can_send = bool(selected_profiles and selected_template and attachments_ok)
 
     col1, col2, col3 = st.columns(3)
 
     with col1:
         if st.button("🚀 Send Now", use_container_width=True, disabled=not can_send):
-            if can_send:
-                errors = []
-                for profile in selected_profiles:
-                    recipient_email = next(p["email"] for p in profiles if p["name"] == profile)
-                    subject = f"Email to {profile}"
-                    success = send_email(
-                        to=[recipient_email],
-                        subject=subject,
-                        contents=preview_body
+            pool = get_smtp_pool()
+            if can_send and pool is None:
+                st.error("Sender email or password not configured in the environment")
+            elif can_send:
+                # Queue everything first, so whatever this run does not get to is sent by the
+                # outbox worker instead of being lost.
+                emails = [profile["email"] for profile in recipients]
+                subjects = [f"Email to {profile['name']}" for profile in recipients]
+                bodies = render_bodies(recipients)
+                with db.transaction(durable=True):
+                    campaign_id = db.add_campaign(
+                        recipients=emails,
+                        subjects=subjects,
+                        bodies=bodies,
+                        sent_date=datetime.now(),
+                        template_id=template.doc_id if template else None,
+                        statuses=["queued"] * len(emails),
+                        attachments=attachment_docs,
                     )
-                    if success:
-                        email_id = db.add_sent_email(
-                            [recipient_email], f"Email to {profile}", preview_body, datetime.now()
-                        )
-                        db.add_schedule(email_id, datetime.now())
-                    else:
-                        errors.append(recipient_email)
-                if errors:
-                    st.error("Failed to send to: {', '.join(errors)}")
-                else: 
+                    outbox_ids = db.enqueue_outbox(
+                        list(zip(emails, subjects, bodies, strict=True)),
+                        campaign_id=campaign_id,
+                        attachments=attachment_docs,
+                    )
+                total = len(outbox_ids)
+                progress = st.progress(0.0, text=f"Sending 0/{total}…")
+                done = 0
+
+                def report(result, row):
+                    nonlocal done
+                    done += 1
+                    progress.progress(done / total, text=f"Sending {done}/{total}…")
+
+                OutboxWorker(db, pool).drain(
+                    outbox_ids, on_result=report, time_budget=INLINE_SEND_SECONDS
+                )
+                progress.empty()
+
+                rows = db.get_outbox(outbox_ids)
+                pending = [row for row in rows if row["status"] in ("queued", "sending", "failed")]
+                dead = [row for row in rows if row["status"] == "dead"]
+                if not pending and not dead:
                     st.success("Emails sent successfully")
+                if pending:
+                    retrying = [row for row in pending if row.get("error")]
+                    st.warning(
+                        f"{len(pending)} of {total} emails are still in the outbox and will be "
+                        "sent by the outbox worker (`python -m utils.scheduler`)."
+                        + (
+                            " Retrying: " + ", ".join(_describe(row) for row in retrying)
+                            if retrying
+                            else ""
+                        )
+                    )
+                if dead:
+                    st.error("Failed to send to: " + ", ".join(_describe(row) for row in dead))
             else:
                 st.error("Please select at least one recipient and a template")
 
@@ -136,12 +245,7 @@ def main():
         if st.button("🗓️ Schedule", use_container_width=True, disabled=not can_send):
             if can_send:
                 schedule_datetime = datetime.combine(schedule_date, schedule_time)
-                for profile in selected_profiles:
-                    recipient_email = next(p["email"] for p in profiles if p["name"] == profile)
-                    email_id = db.add_sent_email(
-                        [recipient_email], f"Email to {profile}", preview_body, schedule_datetime
-                    )
-                    db.add_schedule(email_id, schedule_datetime)
+                save_campaign("schedule", schedule_datetime)
                 st.success(f"Emails scheduled for {schedule_datetime}")
             else:
                 st.error("Please select at least one recipient and a template")
@@ -157,12 +261,7 @@ def main():
         if st.button("⏰ Add Reminder", use_container_width=True, disabled=not can_send):
             if can_send:
                 reminder_date = datetime.now() + timedelta(days=reminder_days)
-                for profile in selected_profiles:
-                    recipient_email = next(p["email"] for p in profiles if p["name"] == profile)
-                    email_id = db.add_sent_email(
-                        [recipient_email], f"Email to {profile}", preview_body, datetime.now()
-                    )
-                    db.add_reminder(email_id, reminder_date)
+                save_campaign("reminder", datetime.now(), reminder_date=reminder_date)
                 st.success(f"Reminders set for {reminder_date}")
             else:
                 st.error("Please select at least one recipient and a template")
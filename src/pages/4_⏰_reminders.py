@@ -1,27 +1,55 @@
-
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from utils.cache import get_cached_database
+from utils.metrics import timed
+from utils.ui import current_page, pager
 
-from utils.db import DatabaseManager
+db = get_cached_database()
 
-db = DatabaseManager()
+PAGE_SIZE = 20
+# Label -> how far past now the window reaches (None: no limit).
+WINDOWS = {
+    "Due now": timedelta(0),
+    "Next 7 days": timedelta(days=7),
+    "Next 30 days": timedelta(days=30),
+    "All": None,
+}
 
 
+@timed("page_render", page="reminders")
 def main():
     st.title("⏰ Reminders")
     st.caption("View and manage your email reminders.")
     st.divider()
 
-    reminders = db.get_all_reminders()
+    window = st.radio("Show", options=list(WINDOWS), horizontal=True, key="reminder_window")
+    page = current_page("reminder_page", window)
 
-    if not reminders:
-        st.info("No reminders set yet. Add some from the Send Email page.", icon="ℹ️")
+    now = datetime.now()
+    horizon = WINDOWS[window]
+    result = db.list_reminders(
+        end=None if horizon is None else now + horizon,
+        offset=page * PAGE_SIZE,
+        limit=PAGE_SIZE,
+    )
+
+    total = result["total"]
+    if total and not result["items"]:
+        # The last page emptied out (e.g. after marking its reminders done).
+        st.session_state["reminder_page"] = 0
+        st.rerun()
+    if not total:
+        if window == "All":
+            st.info("No reminders set yet. Add some from the Send Email page.", icon="ℹ️")
+        else:
+            st.info("Nothing due in this window. Pick a longer one to see what's coming.", icon="ℹ️")
         return
 
-    st.subheader("Upcoming Reminders")
+    st.subheader(f"Upcoming Reminders ({total})")
 
-    for reminder in reminders:
-        email = db.get_sent_email(reminder['email_id'])
+    for item in result["items"]:
+        reminder, email = item["reminder"], item["email"]
         if not email:
             continue  # Skip if email not found
 
@@ -30,8 +58,9 @@ def main():
 
             with col1:
                 st.markdown(f"**{email['subject']}**")
-                due_date = datetime.fromisoformat(reminder['reminder_date']).strftime('%Y-%m-%d %H:%M')
-                st.caption(f"Due: {due_date}")
+                due = datetime.fromisoformat(reminder['reminder_date'])
+                overdue = " · overdue" if due < now else ""
+                st.caption(f"Due: {due.strftime('%Y-%m-%d %H:%M')}{overdue}")
                 st.caption(f"Recipients: {', '.join(email['recipients'])}")
 
             with col2:
@@ -46,6 +75,8 @@ def main():
                     st.success("Reminder deleted!")
                     st.rerun()
 
+    pager("reminder_page", total, PAGE_SIZE)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
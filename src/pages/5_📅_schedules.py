@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import streamlit as st
+
+from utils.cache import get_cached_database
+from utils.metrics import timed
+
+db = get_cached_database()
+
+STATUS_ICONS = {"pending": "🕒", "retrying": "🔁", "queued": "📤", "sent": "✅", "failed": "❌"}
+# Schedules the scheduler is done with; a queued campaign is in the outbox.
+DONE_STATUSES = ("queued", "sent")
+
+
+@timed("page_render", page="schedules")
+def main():
+    st.title("📅 Schedules")
+    st.caption("Emails waiting to be sent by the scheduler.")
+    st.divider()
+
+    today = datetime.now().date()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Campaigns today", len(db.get_campaigns_on(today)))
+    col2.metric("Emails sent today", db.get_stat("sent_day", today.isoformat()))
+    col3.metric("Waiting to send", db.get_totals()["backlog"])
+
+    st.info(
+        "Scheduled emails are sent by the scheduler process. Start it from the src folder with "
+        "`python -m utils.scheduler`. Due campaigns move to the outbox, which it also sends.",
+        icon="ℹ️",
+    )
+
+    schedules = [s for s in db.get_all_schedules() if s.get("status") in STATUS_ICONS]
+    if not schedules:
+        st.info("No scheduled emails yet. Schedule some from the Send Email page.", icon="ℹ️")
+        return
+
+    show_sent = st.toggle("Show sent and queued", value=False)
+    if not show_sent:
+        schedules = [s for s in schedules if s["status"] not in DONE_STATUSES]
+
+    for schedule in sorted(schedules, key=lambda s: s["schedule_date"]):
+        campaign = None
+        if "campaign_id" in schedule:
+            campaign = db.get_campaign(schedule["campaign_id"])
+            email = campaign and {
+                "subject": campaign["subjects"][0],
+                "recipients": campaign["recipients"],
+            }
+        else:
+            email = db.get_sent_email(schedule["email_id"])
+        with st.container(border=True):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**{email['subject'] if email else 'Missing email'}**")
+                due = datetime.fromisoformat(schedule["schedule_date"]).strftime("%Y-%m-%d %H:%M")
+                st.caption(f"Due: {due}")
+                if email:
+                    st.caption(f"Recipients: {', '.join(email['recipients'])}")
+                if campaign and len(campaign["recipients"]) > 1:
+                    counts = {s: campaign["statuses"].count(s) for s in set(campaign["statuses"])}
+                    st.caption(
+                        " · ".join(f"{STATUS_ICONS.get(s, '')} {n} {s}" for s, n in counts.items())
+                    )
+                if schedule.get("error"):
+                    attempts = schedule.get("attempts", 0)
+                    st.caption(f"Last error: {schedule['error']} (attempts: {attempts})")
+            with col2:
+                st.markdown(f"{STATUS_ICONS[schedule['status']]} {schedule['status'].title()}")
+                if schedule["status"] != "sent" and st.button(
+                    "Cancel", key=f"cancel_{schedule.doc_id}", use_container_width=True
+                ):
+                    if campaign:
+                        db.delete_campaign(campaign.doc_id)
+                    else:
+                        db.delete_schedule(schedule.doc_id)
+                    st.success("Schedule cancelled")
+                    st.rerun()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from utils.cache import get_cached_database
+from utils.metrics import timed
+from utils.ui import current_page, pager
+
+db = get_cached_database()
+
+KIND_LABELS = {
+    "sent_email": "📧 Sent emails",
+    "campaign": "📣 Campaigns",
+    "profile": "👥 Profiles",
+    "template": "📄 Templates",
+}
+PAGE_SIZE = 20
+
+
+def render_hit(hit):
+    doc = hit["doc"]
+    with st.container(border=True):
+        if hit["kind"] == "sent_email":
+            st.markdown(f"**{doc['subject']}**")
+            sent = datetime.fromisoformat(doc["sent_date"]).strftime("%Y-%m-%d %H:%M")
+            st.caption(f"To: {', '.join(doc['recipients'])} · {sent}")
+            st.text(doc["body"][:300])
+        elif hit["kind"] == "campaign":
+            st.markdown(f"**{doc['subjects'][0]}**")
+            sent = datetime.fromisoformat(doc["sent_date"]).strftime("%Y-%m-%d %H:%M")
+            count = len(doc["recipients"])
+            st.caption(f"{count} recipient{'s' if count != 1 else ''} · {doc['kind']} · {sent}")
+            st.text(doc["bodies"][0][:300])
+        elif hit["kind"] == "profile":
+            st.markdown(f"**{doc['name']}** · {doc['email']}")
+            st.caption(f"{doc['title']} · {doc['profession']}")
+        else:
+            st.markdown(f"**{doc['name']}**")
+            st.text(doc["body"][:300])
+        st.caption(f"{KIND_LABELS[hit['kind']]} · score {hit['score']:.2f}")
+
+
+@timed("page_render", page="search")
+def main():
+    st.title("🔍 Search")
+    st.caption("Find sent emails, campaigns, contacts, and templates.")
+    st.divider()
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        query = st.text_input("Search", placeholder="e.g. birthday charles", key="search_query")
+    with col2:
+        kinds = st.multiselect(
+            "Look in",
+            options=list(KIND_LABELS),
+            default=list(KIND_LABELS),
+            format_func=KIND_LABELS.get,
+        )
+
+    page = current_page("search_page", (query, tuple(kinds)))
+
+    if not query.strip():
+        st.info("Type a word or the start of one. Every word must match.", icon="ℹ️")
+        return
+    if not kinds:
+        st.warning("Pick at least one collection to search.")
+        return
+
+    started = time.perf_counter()
+    results = db.search(query, kinds=kinds, offset=page * PAGE_SIZE, limit=PAGE_SIZE)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    total = results["total"]
+    st.caption(f"{total} result{'s' if total != 1 else ''} in {elapsed_ms:.1f} ms")
+    if not total:
+        st.info("No matches.")
+        return
+
+    for hit in results["hits"]:
+        render_hit(hit)
+
+    pager("search_page", total, PAGE_SIZE)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,19 @@
 import streamlit as st
-from utils.db import DatabaseManager
+from loguru import logger
 
-db = DatabaseManager()
+from utils.cache import get_cached_database
+from utils.intents import classify
+from utils.llm import CONTEXT_TABLES, build_context, get_chat_client, relevant_records
+from utils.metrics import timed
+from utils.retrieval import parse_period, topic
 
+# Similarity scores below this are mostly unrelated words sharing a hash bucket
+MIN_SIMILARITY = 0.1
+
+db = get_cached_database()
+
+
+@timed("page_render", page="email_chatbot")
 def main():
     st.title("🤖 Email Chatbot")
     st.caption("Get help with composing emails, managing templates, and more!")
@@ -22,6 +33,14 @@ def main():
                       "What would you like to do today?"
         })
 
+    client = get_chat_client()
+    use_llm = st.toggle(
+        "Use AI model",
+        value=client is not None,
+        disabled=client is None,
+        help="Answer with an LLM. Needs OPENAI_API_KEY, and OPENAI_BASE_URL for other servers.",
+    )
+
     # Display chat history
     for message in st.session_state.chat_history:
         with st.chat_message(message["role"]):
@@ -36,73 +55,126 @@ def main():
         with st.chat_message("user"):
             st.write(prompt)
 
-        # Generate response
-        response = generate_response(prompt.lower())
+        # Generate and display the response, streamed when the AI model is used
+        with st.chat_message("assistant"):
+            if use_llm:
+                response = stream_llm_response(client, prompt, st.session_state.chat_history[1:-1])
+            else:
+                response = generate_response(prompt)
+                st.write(response)
 
         # Add assistant response to history
         st.session_state.chat_history.append({"role": "assistant", "content": response})
 
-        # Display assistant response
-        with st.chat_message("assistant"):
-            st.write(response)
-
         # Rerun to update the chat
         st.rerun()
 
-def generate_response(prompt):
-    """Generate a response based on the user's prompt."""
 
-    # Get data from database
-    profiles = db.get_all_profiles()
-    templates = db.get_all_templates()
+def stream_llm_response(client, prompt, history):
+    """Stream the model's reply into the current chat message and return the full text."""
+    placeholder = st.empty()
+    response = ""
+    try:
+        stamp = db.table_versions(CONTEXT_TABLES)
+        context = build_context(db)
+        records = relevant_records(db, prompt)
+        if records:
+            context += f"\n\nRecords matching the question:\n{records}"
+        for chunk in client.stream(prompt, context, history, stamp):
+            response += chunk
+            placeholder.markdown(response + "▌")
+    except Exception as exc:
+        logger.error(f"AI model request failed: {exc}")
+        st.warning("The AI model is unavailable right now, so here is a basic answer instead.")
+        response = generate_response(prompt)
+    placeholder.markdown(response)
+    return response
+
+
+def generate_response(prompt):
+    """Generate a response based on the intent of the user's prompt."""
+    intent = classify(prompt).intent
 
-    # Basic keyword matching for responses
-    if any(word in prompt for word in ["hello", "hi", "hey", "greetings"]):
+    # Data is only read by the branches that use it
+    if intent == "greeting":
         return "Hello! How can I help you with your emails today?"
 
-    elif any(word in prompt for word in ["compose", "write", "create", "draft"]):
-        if "email" in prompt:
-            return compose_email_help(templates)
+    elif intent == "compose":
+        return compose_email_help(db.get_all_templates(), similar_templates(prompt))
 
-    elif any(word in prompt for word in ["template", "templates"]):
-        return template_help(templates)
+    elif intent == "suggest_template":
+        return suggest_template_help(db.get_all_templates(), similar_templates(prompt))
+
+    elif intent == "history":
+        return history_help(prompt)
 
-    elif any(word in prompt for word in ["recipient", "recipients", "contact", "contacts"]):
-        return recipient_help(profiles)
+    elif intent == "templates":
+        return template_help(db.get_all_templates())
 
-    elif any(word in prompt for word in ["send", "schedule", "reminder"]):
-        return "To send emails, schedule them, or set reminders, please visit the '📧 Send Emails' page from the sidebar. I can help you prepare your content here first!"
+    elif intent == "recipients":
+        return recipient_help(db.list_profiles(limit=5))
 
-    elif any(word in prompt for word in ["help", "what can you do", "commands"]):
+    elif intent == "send":
+        return (
+            "To send emails, schedule them, or set reminders, please visit the "
+            "'📧 Send Emails' page from the sidebar. Choose 'Schedule' or 'Add Reminder' after "
+            "composing your email. I can help you prepare your content here first!"
+        )
+
+    elif intent == "help":
         return get_help_text()
 
-    elif any(word in prompt for word in ["thank", "thanks"]):
+    elif intent == "thanks":
         return "You're welcome! Is there anything else I can help you with?"
 
-    elif any(word in prompt for word in ["bye", "goodbye", "see you"]):
+    elif intent == "goodbye":
         return "Goodbye! Feel free to come back anytime you need help with your emails."
 
     else:
-        # Try to understand context or provide general help
-        return get_general_response(prompt, profiles, templates)
+        # Point to the right page, or provide general help
+        return get_general_response(intent)
+
+
+def similar_templates(prompt, k=3):
+    """Templates closest to what the prompt is about; empty if it names no topic."""
+    query = topic(prompt)
+    if not query:
+        return []
+    hits = db.similar(query, kinds=("template",), k=k, min_score=MIN_SIMILARITY)
+    return [hit["doc"] for hit in hits]
+
 
-def compose_email_help(templates):
+def compose_email_help(templates, matches=()):
     """Help with composing emails."""
     if not templates:
-        return "You don't have any email templates yet. Visit the '📄 Email Templates' page to create some templates first!"
+        return (
+            "You don't have any email templates yet. Visit the '📄 Email Templates' page to "
+            "create some templates first!"
+        )
 
     template_names = [t["name"] for t in templates]
     response = "I can help you compose an email! Here are your available templates:\n\n"
     for i, name in enumerate(template_names, 1):
         response += f"{i}. {name}\n"
-    response += "\nTell me which template you'd like to use, or describe what kind of email you want to write (e.g., 'business introduction', 'follow-up', 'thank you note')."
+    if matches:
+        response += (
+            f"\n**{matches[0]['name']}** looks like the closest fit for what you described.\n"
+        )
+    response += (
+        "\nTell me which template you'd like to use, or describe what kind of email you want "
+        "to write (e.g., 'business introduction', 'follow-up', 'thank you note')."
+    )
 
     return response
 
+
 def template_help(templates):
     """Provide information about templates."""
     if not templates:
-        return "You don't have any email templates yet. Go to the '📄 Email Templates' page to create your first template!"
+        return (
+            "You don't have any email templates yet. Go to the '📄 Email Templates' page to "
+            "create your first template!"
+        )
 
     count = len(templates)
     template_names = [t["name"] for t in templates]
@@ -111,19 +183,77 @@ def template_help(templates):
     for name in template_names:
         response += f"• {name}\n"
 
-    response += "\nYou can create new templates or edit existing ones on the '📄 Email Templates' page."
+    response += (
+        "\nYou can create new templates or edit existing ones on the '📄 Email Templates' page."
+    )
+
+    return response
+
+
+def suggest_template_help(templates, matches):
+    """Suggest the templates most similar to what the user described."""
+    if not templates:
+        return template_help(templates)
+    if not matches:
+        return (
+            "Tell me what the email is about (e.g., 'a thank-you note after an interview') "
+            "and I'll suggest the closest template.\n\n" + template_help(templates)
+        )
+
+    response = "These templates look closest to what you described:\n\n"
+    for template in matches:
+        preview = " ".join(template["body"].split())
+        if len(preview) > 80:
+            preview = preview[:79] + "…"
+        response += f"• **{template['name']}**: {preview}\n"
+    response += (
+        "\nUse one on the '📧 Send Emails' page, or adjust it on the '📄 Email Templates' page."
+    )
+    return response
+
 
+def history_help(prompt):
+    """Find past emails and campaigns by topic and time, e.g. 'invoices I sent last month'."""
+    start, end, rest = parse_period(prompt)
+    hits = db.similar(
+        topic(rest),
+        kinds=("sent_email", "campaign"),
+        k=5,
+        start=start,
+        end=end,
+        min_score=MIN_SIMILARITY,
+    )
+    period = " in that period" if start else ""
+    if not hits:
+        return (
+            f"I couldn't find any sent emails matching that{period}. "
+            "Try the '🔍 Search' page for exact words."
+        )
+
+    response = f"Here's what I found{period}:\n\n"
+    for hit in hits:
+        doc = hit["doc"]
+        day = doc["sent_date"][:10]
+        if hit["kind"] == "campaign":
+            subject = doc["subjects"][0] if doc["subjects"] else "(no subject)"
+            count = len(doc["recipients"])
+            response += f"• {day}: **{subject}** to {count} recipients (campaign)\n"
+        else:
+            subject = doc["subject"] or "(no subject)"
+            response += f"• {day}: **{subject}** to {', '.join(doc['recipients'])}\n"
+    response += "\nOpen the '🔍 Search' page to see the full emails."
     return response
 
-def recipient_help(profiles):
-    """Provide information about recipients."""
-    if not profiles:
+
+def recipient_help(listing):
+    """Provide information about recipients, from the first page of the profile listing."""
+    if not listing["total"]:
         return "You don't have any recipients yet. Visit the '👥 Profiles' page to add contacts!"
 
-    count = len(profiles)
+    count = listing["total"]
     response = f"You have {count} contact{'s' if count != 1 else ''} in your address book:\n\n"
 
-    for profile in profiles[:5]:  # Show first 5
+    for profile in listing["items"]:  # Show first 5
         response += f"• {profile['name']} - {profile['title']} ({profile['profession']})\n"
 
     if count > 5:
@@ -133,6 +263,7 @@ def recipient_help(profiles):
 
     return response
 
+
 def get_help_text():
     """Return help text."""
     return """Here's what I can help you with:
@@ -146,6 +277,10 @@ def get_help_text():
 • Show you available email templates
 • List your contacts and their details
 • Help you match templates to recipients
+• Suggest the template closest to the email you describe
+
+**Sent Emails:**
+• Find what you sent, e.g. "what did I send to Charles last week?"
 
 **System Navigation:**
 • Guide you to the right pages for specific tasks
@@ -157,23 +292,30 @@ def get_help_text():
 
 Just ask me anything related to email management!"""
 
-def get_general_response(prompt, profiles, templates):
-    """Try to provide a helpful general response."""
-    # Check if user is asking about specific features
-    if "dashboard" in prompt:
-        return "The dashboard shows your email statistics and quick actions. Visit the home page to see your metrics and recent activity."
-
-    elif "schedule" in prompt or "reminder" in prompt:
-        return "You can schedule emails and set reminders on the '📧 Send Emails' page. Choose 'Schedule' or 'Add Reminder' after composing your email."
-
-    elif "search" in prompt:
-        return "Use the '🔍 Search' page to find specific emails, contacts, or templates in your system."
 
-    elif "profile" in prompt or "user" in prompt:
-        return "You can manage your user profile and system settings on the '🙋‍♀️ User Profile' page."
+GENERAL_RESPONSES = {
+    "dashboard": (
+        "The '📊 Dashboard' page shows your sending statistics, failure rates, and analytics. "
+        "The home page has today's numbers and recent activity."
+    ),
+    "search": (
+        "Use the '🔍 Search' page to find specific emails, contacts, or templates in your system."
+    ),
+    "user_profile": (
+        "You can manage your user profile and system settings on the '🙋‍♀️ User Profile' page."
+    ),
+}
+FALLBACK_RESPONSE = (
+    "I'm not sure I understand. Try asking about:\n• Composing emails\n"
+    "• Your templates or contacts\n• How to use specific features\n"
+    "• Or just say 'help' to see all my capabilities!"
+)
+
+
+def get_general_response(intent):
+    """Try to provide a helpful general response."""
+    return GENERAL_RESPONSES.get(intent, FALLBACK_RESPONSE)
 
-    else:
-        return "I'm not sure I understand. Try asking about:\n• Composing emails\n• Your templates or contacts\n• How to use specific features\n• Or just say 'help' to see all my capabilities!"
 
 if __name__ == "__main__":
     main()
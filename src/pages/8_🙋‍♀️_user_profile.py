@@ -1,10 +1,12 @@
 import streamlit as st
 
-from utils.db import DatabaseManager
+from utils.cache import get_cached_database
+from utils.metrics import timed
 
-db = DatabaseManager()
+db = get_cached_database()
 
 
+@timed("page_render", page="user_profile")
 def main():
     st.title("🙋‍♀️ User Profile")
 
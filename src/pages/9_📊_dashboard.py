@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from utils.analytics import between, breakdown, get_history, hour_heatmap, volume
+from utils.cache import get_cached_database
+from utils.metrics import timed
+
+db = get_cached_database()
+
+WINDOWS = {"Last 7 days": 7, "Last 14 days": 14, "Last 30 days": 30, "Last 90 days": 90}
+BUCKETS = {"Hour": "h", "Day": "D", "Week": "W", "Month": "M"}
+
+
+@timed("page_render", page="dashboard")
+def main():
+    st.title("📊 Dashboard")
+    st.caption("Sending activity, failures, and what is still waiting to go out.")
+    st.divider()
+
+    window = st.radio("Period", list(WINDOWS), index=1, horizontal=True)
+    today = datetime.now().date()
+    days = db.get_daily_stats(today - timedelta(days=WINDOWS[window] - 1), today)
+    sent = sum(day["sent"] for day in days)
+    failed = sum(day["failed"] for day in days)
+    totals = db.get_totals()
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Emails sent", sent)
+    col2.metric("Failed attempts", failed)
+    col3.metric("Failure rate", f"{failed / (sent + failed):.1%}" if sent + failed else "—")
+    col4.metric("Waiting to send", totals["backlog"])
+    col5.metric("Reminders due", db.count_due_reminders())
+
+    st.subheader("Sends per day")
+    if sent or failed:
+        st.bar_chart(
+            {
+                "Day": [day["day"] for day in days],
+                "Sent": [day["sent"] for day in days],
+                "Failed": [day["failed"] for day in days],
+            },
+            x="Day",
+            y=["Sent", "Failed"],
+        )
+    else:
+        st.info("Nothing sent in this period.", icon="ℹ️")
+
+    left, right = st.columns(2)
+    with left:
+        st.subheader("Top recipients")
+        top = db.get_top_recipients(10)
+        if top:
+            st.table(
+                {
+                    "Recipient": [address for address, _ in top],
+                    "Emails": [count for _, count in top],
+                }
+            )
+        else:
+            st.caption("No emails sent yet.")
+    with right:
+        st.subheader("All time")
+        st.metric("Emails sent", totals["sent"])
+        st.metric("Failure rate", f"{totals['failure_rate']:.1%}")
+
+    st.divider()
+    st.subheader("Analytics")
+    start = datetime.combine(today - timedelta(days=WINDOWS[window] - 1), datetime.min.time())
+    history = between(get_history(db), start)
+    if history.empty:
+        st.info("No send history in this period.", icon="ℹ️")
+        return
+    st.caption(f"{len(history):,} messages in this period, counted by their final status.")
+    volume_tab, domain_tab, profession_tab, hours_tab = st.tabs(
+        ["Volume", "Domains", "Professions", "Hours"]
+    )
+    with volume_tab:
+        bucket = st.radio("Bucket", list(BUCKETS), index=1, horizontal=True)
+        st.line_chart(volume(history, BUCKETS[bucket]))
+    with domain_tab:
+        st.dataframe(breakdown(history, "domain"))
+    with profession_tab:
+        st.dataframe(breakdown(history, "profession"))
+    with hours_tab:
+        st.caption("Emails sent per weekday and hour of day.")
+        st.dataframe(hour_heatmap(history))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Vectorized analytics over the sending history.
+
+``load_history`` flattens sent emails and campaigns into one columnar ``DataFrame`` with a
+row per recipient per message. Dates are parsed once per distinct string and addresses are
+normalized once per distinct address, and the results are spread back over the rows by
+integer codes, so a history with millions of rows loads without parsing each row in Python.
+``get_history`` caches that snapshot until one of the tables it was built from changes.
+
+The summaries (``volume``, ``breakdown`` and ``hour_heatmap``) are single grouped or
+``bincount`` passes over the columns.
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+# Outcomes kept in the history; pending and draft rows have not been sent yet.
+STATUSES = ("sent", "failed")
+# Tables the history is built from; a write to any of them invalidates the snapshot.
+HISTORY_TABLES = ("sent_emails", "campaigns", "profiles")
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+UNKNOWN = "Unknown"
+
+
+def load_history(db: Any, chunk_size: int = 10_000) -> pd.DataFrame:
+    """
+    Build the columnar history from the database, streaming it in chunks.
+
+    Args:
+        db: A ``DatabaseManager`` or ``CachedDatabase``.
+        chunk_size: Documents read per chunk.
+
+    Returns:
+        A frame with ``sent_at`` (datetime64), and ``status``, ``recipient``, ``domain`` and
+        ``profession`` as categoricals. Recipients are lower-cased; recipients without a
+        profile get the profession ``Unknown``.
+    """
+    recipients: list[str] = []
+    statuses: list[str] = []
+    # One date and recipient count per document; np.repeat spreads them over the rows.
+    dates: list[str] = []
+    counts: list[int] = []
+    for email in db.iter_table("sent_emails", chunk_size, fields=("recipients", "sent_date")):
+        recipients += email["recipients"]
+        statuses += ["sent"] * len(email["recipients"])
+        dates.append(email["sent_date"])
+        counts.append(len(email["recipients"]))
+    for campaign in db.iter_table(
+        "campaigns", chunk_size, fields=("recipients", "statuses", "sent_date")
+    ):
+        recipients += campaign["recipients"]
+        statuses += campaign["statuses"]
+        dates.append(campaign["sent_date"])
+        counts.append(len(campaign["recipients"]))
+
+    # Factorizing and mapping the few distinct statuses beats Categorical's lookup per row.
+    status_codes, unique_statuses = pd.factorize(np.asarray(statuses, dtype=object))
+    wanted = np.array([STATUSES.index(s) if s in STATUSES else -1 for s in unique_statuses])
+    status_codes = wanted.astype(np.int8)[status_codes]
+    keep = status_codes >= 0
+    status = pd.Categorical.from_codes(status_codes[keep], categories=STATUSES)
+    date_codes, unique_dates = pd.factorize(np.asarray(dates, dtype=object))
+    date_codes = np.repeat(date_codes, counts)[keep]
+    sent_at = pd.to_datetime(unique_dates, format="ISO8601").take(date_codes)
+
+    address_codes, raw_addresses = pd.factorize(np.asarray(recipients, dtype=object)[keep])
+    # Plain string methods over the distinct addresses; pandas' .str accessor costs more here.
+    normalized = [address.strip().lower() for address in raw_addresses]
+    addresses = pd.Series(normalized, dtype=object)
+    domains = pd.Series([a.rpartition("@")[2] or UNKNOWN for a in normalized], dtype=object)
+    professions = {
+        profile["email"].strip().lower(): profile.get("profession") or UNKNOWN
+        for profile in db.get_profiles_by_id().values()
+    }
+
+    return pd.DataFrame(
+        {
+            "sent_at": sent_at,
+            "status": status,
+            "recipient": _spread(addresses, address_codes),
+            "domain": _spread(domains, address_codes),
+            "profession": _spread(addresses.map(professions).fillna(UNKNOWN), address_codes),
+        }
+    )
+
+
+def _spread(values: pd.Series, codes: np.ndarray) -> pd.Categorical:
+    """Turn one value per distinct address into a categorical column over all rows."""
+    value_codes, categories = pd.factorize(values)
+    return pd.Categorical.from_codes(value_codes[codes], categories=categories)
+
+
+_snapshots: dict[int, tuple[tuple[int, ...], pd.DataFrame]] = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_history(db: Any) -> pd.DataFrame:
+    """
+    Return the history of ``db``, rebuilding it only after a write to ``HISTORY_TABLES``.
+
+    The frame is shared between callers and must be treated as read-only.
+    """
+    stamp = db.table_versions(HISTORY_TABLES)
+    with _snapshots_lock:
+        cached = _snapshots.get(id(db))
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    history = load_history(db)
+    with _snapshots_lock:
+        _snapshots[id(db)] = (stamp, history)
+    return history
+
+
+def between(
+    history: pd.DataFrame, start: datetime | None = None, end: datetime | None = None
+) -> pd.DataFrame:
+    """Rows sent at or after ``start`` and before ``end``; ``None`` leaves a side open."""
+    mask = np.ones(len(history), dtype=bool)
+    if start is not None:
+        mask &= (history["sent_at"] >= start).to_numpy()
+    if end is not None:
+        mask &= (history["sent_at"] < end).to_numpy()
+    return history if mask.all() else history[mask]
+
+
+def volume(history: pd.DataFrame, freq: str = "D") -> pd.DataFrame:
+    """
+    Count sent and failed messages per time bucket.
+
+    Args:
+        history: Frame from ``get_history``, optionally narrowed with ``between``.
+        freq: Pandas period alias for the bucket size: ``h``, ``D``, ``W`` or ``M``.
+
+    Returns:
+        One row per bucket from the first to the last, gaps included, indexed by the start of
+        the bucket, with ``sent`` and ``failed`` columns.
+    """
+    if history.empty:
+        return pd.DataFrame(columns=list(STATUSES), dtype="int64")
+    periods = history["sent_at"].dt.to_period(freq)
+    counts = (
+        history.groupby([periods, "status"], observed=True)
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=list(STATUSES), fill_value=0)
+    )
+    counts = counts.reindex(pd.period_range(periods.min(), periods.max(), freq=freq), fill_value=0)
+    counts.index = counts.index.to_timestamp()
+    counts.columns = list(counts.columns)
+    return counts
+
+
+def breakdown(history: pd.DataFrame, by: str, top: int | None = 10) -> pd.DataFrame:
+    """
+    Count sent and failed messages per ``domain``, ``profession`` or ``recipient``.
+
+    Returns:
+        The ``top`` groups by total messages, with ``sent``, ``failed``, ``total`` and
+        ``failure_rate`` columns.
+    """
+    counts = (
+        history.groupby([by, "status"], observed=True)
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=list(STATUSES), fill_value=0)
+    )
+    counts.columns = list(counts.columns)
+    counts["total"] = counts["sent"] + counts["failed"]
+    counts["failure_rate"] = counts["failed"] / counts["total"].where(counts["total"] > 0)
+    counts = counts.sort_values("total", ascending=False, kind="stable")
+    return counts if top is None else counts.head(top)
+
+
+def hour_heatmap(history: pd.DataFrame, status: str = "sent") -> pd.DataFrame:
+    """Messages with ``status`` per weekday (rows, Monday first) and hour of day (columns)."""
+    stamps = history["sent_at"].to_numpy()[(history["status"] == status).to_numpy()]
+    days = stamps.astype("datetime64[D]").astype(np.int64)
+    hours = stamps.astype("datetime64[h]").astype(np.int64) % 24
+    # 1970-01-01 was a Thursday, so day 0 is weekday 3.
+    cells = (days + 3) % 7 * 24 + hours
+    grid = np.bincount(cells, minlength=7 * 24).reshape(7, 24)
+    return pd.DataFrame(grid, index=list(WEEKDAYS), columns=range(24))
@@ -0,0 +1,218 @@
+"""
+Content-addressed attachment store and pre-encoded MIME parts.
+
+Uploaded files are streamed to disk in chunks under ``EMAIL_ATTACHMENT_DIR`` (default
+``.attachments``), named by the hash of their content, so a file uploaded twice is stored once
+and a queued message only needs to remember the hash. ``EMAIL_ATTACHMENT_MAX_MB`` caps the size
+of one file and of all the files on one message.
+
+yagmail reads and base64-encodes every attachment again for each message it builds. ``part``
+encodes a stored file once, a chunk at a time, and keeps the finished MIME part in a LRU
+bounded by ``EMAIL_ATTACHMENT_CACHE_MB``, so a batch to 500 recipients shares one encoded
+copy. ``SMTPPool`` attaches such parts to the message as they are.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from email.mime.base import MIMEBase
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from utils.metrics import span
+
+_ENV_DIR = "EMAIL_ATTACHMENT_DIR"
+_ENV_MAX_MB = "EMAIL_ATTACHMENT_MAX_MB"
+_ENV_CACHE_MB = "EMAIL_ATTACHMENT_CACHE_MB"
+DEFAULT_DIR = ".attachments"
+# Gmail refuses messages over 25 MB, and base64 grows attachments by a third.
+DEFAULT_MAX_MB = 18.0
+DEFAULT_CACHE_MB = 64.0
+
+# Bytes read per chunk. A multiple of 57, so each chunk encodes to whole 76-character lines.
+_CHUNK = 57 * 1024
+
+
+class AttachmentTooLargeError(ValueError):
+    """Raised when a file, or the files on one message, exceed the configured size cap."""
+
+
+@dataclass(frozen=True)
+class Attachment:
+    """A file in the store, as recorded on queued messages and campaigns."""
+
+    digest: str
+    filename: str
+    size: int
+    content_type: str
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, doc: dict[str, Any]) -> Attachment:
+        return cls(doc["digest"], doc["filename"], doc["size"], doc["content_type"])
+
+
+def format_size(size: int) -> str:
+    """``size`` bytes in the largest unit that keeps it above one, e.g. ``2.4 MB``."""
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+class AttachmentStore:
+    """
+    Files kept under ``directory`` by content hash, plus a byte-bounded LRU of encoded parts.
+
+    ``max_bytes`` caps each saved file; ``check_total`` applies the same cap to a message.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_DIR,
+        max_bytes: int = int(DEFAULT_MAX_MB * 1024 * 1024),
+        cache_bytes: int = int(DEFAULT_CACHE_MB * 1024 * 1024),
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.cache_bytes = cache_bytes
+        # (digest, filename) -> encoded part and its payload length in characters.
+        self._parts: OrderedDict[tuple[str, str], tuple[MIMEBase, int]] = OrderedDict()
+        self._cached = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest
+
+    def save(self, stream: BinaryIO, filename: str, content_type: str | None = None) -> Attachment:
+        """
+        Copy ``stream`` into the store a chunk at a time and return its ``Attachment``.
+
+        Raises:
+            AttachmentTooLargeError: The stream is longer than ``max_bytes``; nothing is kept.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                while chunk := stream.read(_CHUNK):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AttachmentTooLargeError(
+                            f"{filename} is larger than {format_size(self.max_bytes)}"
+                        )
+                    digest.update(chunk)
+                    handle.write(chunk)
+            # Same content, same name: an existing copy is as good as ours.
+            target = self.path(digest.hexdigest())
+            if target.exists():
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        if not content_type or content_type == "application/octet-stream":
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return Attachment(digest.hexdigest(), os.path.basename(filename), size, content_type)
+
+    def check_total(self, attachments: Iterable[Attachment]) -> int:
+        """
+        Return the combined size of ``attachments``.
+
+        Raises:
+            AttachmentTooLargeError: They add up to more than ``max_bytes``.
+        """
+        total = sum(attachment.size for attachment in attachments)
+        if total > self.max_bytes:
+            raise AttachmentTooLargeError(
+                f"Attachments add up to {format_size(total)}, more than the "
+                f"{format_size(self.max_bytes)} allowed per message"
+            )
+        return total
+
+    def part(self, attachment: Attachment) -> MIMEBase:
+        """
+        The base64-encoded MIME part for ``attachment``, encoded on first use only.
+
+        The part is shared by every message it is attached to and must not be modified.
+
+        Raises:
+            FileNotFoundError: The file is no longer in the store.
+        """
+        key = (attachment.digest, attachment.filename)
+        with self._lock:
+            cached = self._parts.get(key)
+            if cached is not None:
+                self._parts.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        with span("attachment_encode"):
+            payload = self._encode(self.path(attachment.digest))
+        main_type, _, sub_type = attachment.content_type.partition("/")
+        part = MIMEBase(main_type, sub_type or "octet-stream", name=attachment.filename)
+        part.set_payload(payload)
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=attachment.filename)
+        with self._lock:
+            if key not in self._parts and len(payload) <= self.cache_bytes:
+                self._parts[key] = (part, len(payload))
+                self._cached += len(payload)
+                while self._cached > self.cache_bytes:
+                    _, (_, evicted) = self._parts.popitem(last=False)
+                    self._cached -= evicted
+        return part
+
+    @staticmethod
+    def _encode(path: Path) -> str:
+        # Encoding chunk by chunk keeps only one raw chunk in memory next to the output. Lines
+        # end in CRLF, as SMTP wants them, so the payload can go out without being rewritten.
+        lines = []
+        with open(path, "rb") as handle:
+            while chunk := handle.read(_CHUNK):
+                lines.append(base64.encodebytes(chunk).replace(b"\n", b"\r\n").decode("ascii"))
+        return "".join(lines).rstrip("\r\n")
+
+
+_shared_store: AttachmentStore | None = None
+_shared_store_key: tuple | None = None
+_shared_store_lock = threading.Lock()
+
+
+def get_attachment_store() -> AttachmentStore:
+    """
+    Return the process-wide attachment store, configured from environment variables.
+
+    The store, and with it the cache of encoded parts, is rebuilt if the configuration changes.
+    """
+    global _shared_store, _shared_store_key
+
+    key = tuple(os.getenv(name) for name in (_ENV_DIR, _ENV_MAX_MB, _ENV_CACHE_MB))
+    with _shared_store_lock:
+        if _shared_store is not None and _shared_store_key == key:
+            return _shared_store
+        _shared_store = AttachmentStore(
+            os.getenv(_ENV_DIR, DEFAULT_DIR),
+            max_bytes=int(float(os.getenv(_ENV_MAX_MB, DEFAULT_MAX_MB)) * 1024 * 1024),
+            cache_bytes=int(float(os.getenv(_ENV_CACHE_MB, DEFAULT_CACHE_MB)) * 1024 * 1024),
+        )
+        _shared_store_key = key
+        return _shared_store
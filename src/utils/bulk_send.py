@@ -0,0 +1,590 @@
+from __future__ import annotations
+
+import itertools
+import os
+import re
+import smtplib
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from email.mime.base import MIMEBase
+
+from loguru import logger
+
+from utils.smtp_pool import PoolExhaustedError, SMTPPool
+
+
+@dataclass
+class OutgoingMessage:
+    """
+    A fully rendered message addressed to a single recipient.
+
+    ``attachments`` are file paths or shared, pre-encoded MIME parts (see ``SMTPPool.send``).
+    """
+
+    to: str
+    subject: str
+    body: str
+    attachments: Sequence[str | MIMEBase] | None = None
+    message_id: str | None = None
+
+
+@dataclass
+class SendResult:
+    """Outcome of sending one ``OutgoingMessage``."""
+
+    message: OutgoingMessage
+    success: bool
+    latency: float
+    sent_at: datetime
+    error_class: str | None = None
+    error: str | None = None
+    error_code: int | None = None
+    transient: bool = False
+
+    @property
+    def recipient(self) -> str:
+        return self.message.to
+
+
+def recipient_domain(address: str) -> str:
+    return address.rpartition("@")[2].strip().lower()
+
+
+# Recipient domains that one provider's servers receive for; they share that provider's limits.
+PROVIDER_DOMAINS = {
+    "gmail.com": "gmail",
+    "googlemail.com": "gmail",
+    "outlook.com": "outlook",
+    "hotmail.com": "outlook",
+    "live.com": "outlook",
+    "msn.com": "outlook",
+    "yahoo.com": "yahoo",
+    "ymail.com": "yahoo",
+    "aol.com": "yahoo",
+    "icloud.com": "icloud",
+    "me.com": "icloud",
+    "mac.com": "icloud",
+}
+# Fragments of an SMTP host name that tell which provider the sender account is with.
+PROVIDER_HOSTS = {
+    "gmail": "gmail",
+    "google": "gmail",
+    "office365": "outlook",
+    "outlook": "outlook",
+    "yahoo": "yahoo",
+    "icloud": "icloud",
+    "me.com": "icloud",
+}
+
+_ENV_ACCOUNT_QUOTA = "EMAIL_ACCOUNT_QUOTA"
+_ENV_DOMAIN_QUOTAS = "EMAIL_DOMAIN_QUOTAS"
+_QUOTA_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(s|sec|second|min|minute|day)s?\s*$")
+
+
+def domain_key(address: str) -> str:
+    """The key a recipient's domain limits are kept under: its provider, or the domain itself."""
+    domain = recipient_domain(address)
+    return PROVIDER_DOMAINS.get(domain, domain)
+
+
+def _seconds_to_midnight() -> float:
+    now = datetime.now()
+    return (datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).seconds
+
+
+@dataclass(frozen=True)
+class Quota:
+    """How many messages may go out per second, minute and calendar day; None is no limit."""
+
+    per_second: float | None = None
+    per_minute: float | None = None
+    per_day: int | None = None
+
+    @classmethod
+    def parse(cls, text: str) -> Quota:
+        """
+        Read a quota written like ``20/min, 500/day``; ``s``, ``min`` and ``day`` are the units.
+
+        Raises:
+            ValueError: ``text`` is not in that form.
+        """
+        fields: dict[str, float] = {}
+        for item in text.split(","):
+            match = _QUOTA_RE.match(item)
+            if match is None:
+                raise ValueError(f"Invalid quota {item.strip()!r}; expected e.g. '20/min, 500/day'")
+            unit = {"s": "per_second", "m": "per_minute", "d": "per_day"}[match[2][0]]
+            fields[unit] = float(match[1])
+        per_day = fields.pop("per_day", None)
+        return cls(**fields, per_day=None if per_day is None else int(per_day))
+
+
+# Conservative sending limits for a personal account with each provider; business plans allow
+# more. Set EMAIL_ACCOUNT_QUOTA (e.g. ``20/min, 2000/day``) to use your own.
+ACCOUNT_QUOTAS = {
+    "gmail": Quota(per_minute=20, per_day=500),
+    "outlook": Quota(per_minute=30, per_day=300),
+    "yahoo": Quota(per_minute=20, per_day=500),
+    "icloud": Quota(per_minute=20, per_day=1000),
+}
+# How fast the big providers take mail from one sender before answering 421/450 "try again
+# later". Other domains get the sender's ``per_domain_rate``. EMAIL_DOMAIN_QUOTAS overrides or
+# extends these, e.g. ``gmail=60/min; example.com=10/min, 1000/day``.
+DOMAIN_QUOTAS = {
+    "gmail": Quota(per_minute=60),
+    "outlook": Quota(per_minute=30),
+    "yahoo": Quota(per_minute=30),
+    "icloud": Quota(per_minute=30),
+}
+
+
+def account_quota(host: str) -> Quota | None:
+    """The limits for a sender account on SMTP ``host``: EMAIL_ACCOUNT_QUOTA, or its provider's."""
+    configured = os.getenv(_ENV_ACCOUNT_QUOTA)
+    if configured:
+        return Quota.parse(configured)
+    host = host.lower()
+    provider = next((name for part, name in PROVIDER_HOSTS.items() if part in host), None)
+    return ACCOUNT_QUOTAS.get(provider)
+
+
+def domain_quotas() -> dict[str, Quota]:
+    """``DOMAIN_QUOTAS`` with the entries of EMAIL_DOMAIN_QUOTAS laid over them."""
+    quotas = dict(DOMAIN_QUOTAS)
+    for entry in filter(str.strip, os.getenv(_ENV_DOMAIN_QUOTAS, "").split(";")):
+        key, _, text = entry.partition("=")
+        key = key.strip().lower()
+        quotas[PROVIDER_DOMAINS.get(key, key)] = Quota.parse(text)
+    return quotas
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when a sending limit holds a message back for longer than the sender will wait."""
+
+    def __init__(self, key: str, retry_after: float) -> None:
+        super().__init__(f"Sending limit for {key} reached; retry in {retry_after:.0f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    """Tokens refilled at ``rate`` per second up to ``capacity``; one is spent per message."""
+
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class DomainRateLimiter:
+    """
+    Token-bucket limits per key: a recipient domain or provider, or the sender account.
+
+    A key is limited by ``quotas[key]``, or else to ``rate`` messages per second. Per-second and
+    per-minute limits refill one token at a time, so with ``burst=1`` messages are evenly
+    spaced; a larger ``burst`` lets that many go back to back after a pause. Daily quotas count
+    messages per calendar day, from zero or from ``seed_today``. ``defer`` holds a key back
+    after the server asked us to slow down.
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        quotas: Mapping[str, Quota] | None = None,
+        burst: int = 1,
+    ) -> None:
+        self.default = Quota(per_second=rate) if rate else None
+        self.quotas = dict(quotas or {})
+        self.burst = burst
+        self._buckets: dict[str, list[_Bucket]] = {}
+        self._held: dict[str, float] = {}
+        self._days: dict[str, tuple[date, int]] = {}
+        self._lock = threading.Lock()
+
+    def quota(self, key: str) -> Quota | None:
+        return self.quotas.get(key, self.default)
+
+    def _buckets_for(self, key: str, now: float) -> list[_Bucket]:
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            quota = self.quota(key) or Quota()
+            per_minute = quota.per_minute / 60 if quota.per_minute else None
+            rates = [rate for rate in (quota.per_second, per_minute) if rate]
+            buckets = self._buckets[key] = [_Bucket(rate, self.burst, now) for rate in rates]
+        return buckets
+
+    def _used_today(self, key: str) -> int:
+        day, used = self._days.get(key, (None, 0))
+        return used if day == date.today() else 0
+
+    def _delay(self, key: str, now: float) -> float:
+        quota = self.quota(key)
+        if quota and quota.per_day is not None and self._used_today(key) >= quota.per_day:
+            raise QuotaExceededError(key, _seconds_to_midnight())
+        waits = [bucket.delay(now) for bucket in self._buckets_for(key, now)]
+        return max(self._held.get(key, now) - now, 0.0, *waits)
+
+    def delay(self, key: str) -> float:
+        """
+        Seconds until ``key`` may send again; 0 if it may now.
+
+        Raises:
+            QuotaExceededError: ``key`` has used up its daily quota.
+        """
+        with self._lock:
+            return self._delay(key, time.monotonic())
+
+    def _take(self, key: str, now: float) -> None:
+        for bucket in self._buckets_for(key, now):
+            bucket.tokens -= 1
+        self._days[key] = (date.today(), self._used_today(key) + 1)
+
+    def take(self, key: str) -> None:
+        """Count one message against ``key``; call it once ``delay`` has returned 0."""
+        with self._lock:
+            self._take(key, time.monotonic())
+
+    def wait(self, key: str, max_wait: float | None = None) -> None:
+        """
+        Block until ``key`` may send, then count the message against it.
+
+        Raises:
+            QuotaExceededError: The wait would be longer than ``max_wait`` seconds, or the
+                daily quota is used up.
+        """
+        wait_for(((self, key),), max_wait)
+
+    def defer(self, key: str, seconds: float) -> None:
+        """Send nothing for ``key`` for ``seconds``, then resume at the steady rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._held[key] = max(self._held.get(key, now), now + seconds)
+            for bucket in self._buckets_for(key, now):
+                bucket.tokens = min(bucket.tokens, 0.0)
+
+    def remaining_today(self, key: str) -> int | None:
+        """Messages ``key`` may still send today, or None without a daily quota."""
+        quota = self.quota(key)
+        if quota is None or quota.per_day is None:
+            return None
+        with self._lock:
+            return max(0, quota.per_day - self._used_today(key))
+
+    def seed_today(self, key: str, count: int) -> None:
+        """Raise today's count for ``key`` to ``count``, e.g. what other processes have sent."""
+        with self._lock:
+            self._days[key] = (date.today(), max(self._used_today(key), count))
+
+
+def reserve(
+    limits: Iterable[tuple[DomainRateLimiter, str]], max_wait: float | None = None
+) -> float:
+    """
+    Count one message against every ``(limiter, key)`` in ``limits`` if all of them allow it.
+
+    The limiters stay locked from the check to the count, so concurrent senders sharing them
+    can never both pass the check for the last token.
+
+    Returns:
+        0 when the message may go, and was counted; else the seconds until it may.
+
+    Raises:
+        QuotaExceededError: For the key holding the message back, when that is for longer than
+            ``max_wait`` seconds or its daily quota is used up.
+    """
+    limits = list(dict.fromkeys(limits))
+    # Always lock in the same order, so two calls over overlapping limiters cannot deadlock.
+    locks = {id(limiter): limiter._lock for limiter, _ in limits}
+    with ExitStack() as stack:
+        for _, lock in sorted(locks.items()):
+            stack.enter_context(lock)
+        now = time.monotonic()
+        delays = [(limiter._delay(key, now), key) for limiter, key in limits]
+        delay, blocking = max(delays, key=lambda item: item[0])
+        if max_wait is not None and delay > max_wait:
+            raise QuotaExceededError(blocking, delay)
+        if delay <= 0:
+            for limiter, key in limits:
+                limiter._take(key, now)
+        return delay
+
+
+def wait_for(
+    limits: Iterable[tuple[DomainRateLimiter, str]], max_wait: float | None = None
+) -> None:
+    """Block until ``reserve`` counts the message against ``limits``; it raises the same way."""
+    limits = list(limits)
+    while (delay := reserve(limits, max_wait)) > 0:
+        time.sleep(delay)
+
+
+_shared_limits: dict[tuple, tuple[DomainRateLimiter, DomainRateLimiter]] = {}
+_shared_limits_lock = threading.Lock()
+
+
+def get_send_limits(
+    pool: SMTPPool, per_domain_rate: float | None
+) -> tuple[DomainRateLimiter, DomainRateLimiter]:
+    """
+    Return the process-wide limiters for ``pool``'s sender account and for recipient domains.
+
+    Everything sent through the same account in this process, by ``send_email`` or any
+    ``BulkSender``, counts against the same limiters. The account is keyed by ``pool.user``
+    and domains by ``domain_key``; they are rebuilt if the quota settings change.
+    """
+    key = (
+        pool.user,
+        pool.host,
+        per_domain_rate,
+        os.getenv(_ENV_ACCOUNT_QUOTA),
+        os.getenv(_ENV_DOMAIN_QUOTAS),
+    )
+    with _shared_limits_lock:
+        if key not in _shared_limits:
+            quota = account_quota(pool.host)
+            _shared_limits[key] = (
+                DomainRateLimiter(quotas={pool.user: quota} if quota else None),
+                DomainRateLimiter(per_domain_rate, quotas=domain_quotas()),
+            )
+        return _shared_limits[key]
+
+
+# 5xx replies that say the sender's login or configuration is wrong, not the message; a retry
+# can succeed once that is fixed.
+SENDER_ERROR_CODES = frozenset({530, 534, 535, 538})
+# Enhanced status of "daily sending quota exceeded" (Gmail sends it with a 550).
+QUOTA_STATUS = b"5.4.5"
+
+
+def classify_error(exc: BaseException) -> tuple[int | None, bool]:
+    """
+    Return the SMTP reply code behind ``exc``, if any, and whether retrying may succeed.
+
+    4xx replies, dropped connections, timeouts, other network errors, a pool with no free
+    connection and a reached sending limit are transient. 5xx replies are permanent, except
+    the authentication failures in ``SENDER_ERROR_CODES`` and an exceeded daily quota
+    (``QUOTA_STATUS``). Anything else, such as a malformed address, is permanent.
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        code = min(codes) if codes else None
+    elif isinstance(exc, smtplib.SMTPResponseException):
+        code = exc.smtp_code
+        if QUOTA_STATUS in _reply_text(exc):
+            return code, True
+    elif isinstance(exc, (OSError, PoolExhaustedError, QuotaExceededError)):
+        return None, True
+    else:
+        return None, False
+    if code is None:
+        return None, False
+    return code, 400 <= code < 500 or code in SENDER_ERROR_CODES
+
+
+def _reply_text(exc: smtplib.SMTPResponseException) -> bytes:
+    error = exc.smtp_error
+    return error if isinstance(error, bytes) else str(error).encode()
+
+
+@dataclass
+class BulkSender:
+    """
+    Send many single-recipient messages concurrently over a shared SMTP pool.
+
+    ``concurrency`` defaults to the pool's connection limit so every worker can hold a
+    connection. Messages are held to the sender account's quota (``account_quota``), to each
+    recipient provider's quota (``domain_quotas``) or else ``per_domain_rate`` messages per
+    second per domain, and to ``rate`` messages per second overall. The account and domain
+    limits are shared with every other sender through the same account, see
+    ``get_send_limits``. A server that answers 4xx "slow down" pauses the account, or the
+    recipient's domain when only the recipient was refused, for ``deferral_cooldown`` seconds.
+    """
+
+    # Key of the overall cap in its own limiter.
+    OVERALL = "overall"
+
+    pool: SMTPPool
+    concurrency: int | None = None
+    per_domain_rate: float | None = 2.0
+    rate: float | None = None
+    max_wait: float = 60.0
+    deferral_cooldown: float = 30.0
+    _account: DomainRateLimiter = field(init=False, repr=False)
+    _limiter: DomainRateLimiter = field(init=False, repr=False)
+    _throttle: DomainRateLimiter = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.concurrency is None:
+            self.concurrency = self.pool.max_connections
+        self._account, self._limiter = get_send_limits(self.pool, self.per_domain_rate)
+        # The overall cap is one more bucket, with every message under the same key.
+        self._throttle = DomainRateLimiter(self.rate)
+
+    def remaining_today(self) -> int | None:
+        """Messages the account may still send today, or None without a daily quota."""
+        return self._account.remaining_today(self.pool.user)
+
+    def seed_today(self, count: int) -> None:
+        """Count ``count`` messages already sent today against the account's daily quota."""
+        self._account.seed_today(self.pool.user, count)
+
+    def _reserve(self, key: str) -> float:
+        """
+        Count a message to domain ``key`` against every limit if all of them allow it now.
+
+        Returns:
+            0 when the message may go, else the seconds until it may.
+
+        Raises:
+            QuotaExceededError: A limit holds the message back for longer than ``max_wait``;
+                its ``key`` is ``key``, the account's address or ``OVERALL``.
+        """
+        limits = (
+            (self._throttle, self.OVERALL),
+            (self._account, self.pool.user),
+            (self._limiter, key),
+        )
+        return reserve(limits, self.max_wait)
+
+    def _back_off(self, message: OutgoingMessage, exc: Exception) -> None:
+        """Pause whoever the server says is sending too fast."""
+        if isinstance(exc, smtplib.SMTPRecipientsRefused):
+            codes = [code for code, _ in exc.recipients.values()]
+            if codes and all(400 <= code < 500 for code in codes):
+                self._limiter.defer(domain_key(message.to), self.deferral_cooldown)
+        elif isinstance(exc, smtplib.SMTPResponseException):
+            if QUOTA_STATUS in _reply_text(exc):
+                self._account.defer(self.pool.user, _seconds_to_midnight())
+            elif 400 <= exc.smtp_code < 500:
+                self._account.defer(self.pool.user, self.deferral_cooldown)
+
+    def _failure(self, message: OutgoingMessage, exc: Exception, started: float) -> SendResult:
+        code, transient = classify_error(exc)
+        return SendResult(
+            message=message,
+            success=False,
+            latency=time.perf_counter() - started,
+            sent_at=datetime.now(),
+            error_class=type(exc).__name__,
+            error=str(exc),
+            error_code=code,
+            transient=transient,
+        )
+
+    def _send_one(self, message: OutgoingMessage) -> SendResult:
+        started = time.perf_counter()
+        try:
+            self.pool.send(
+                to=[message.to],
+                subject=message.subject,
+                contents=message.body,
+                attachments=message.attachments,
+                message_id=message.message_id,
+            )
+        except Exception as exc:
+            logger.error(f"Failed to send to {message.to}: {exc}")
+            self._back_off(message, exc)
+            return self._failure(message, exc, started)
+        return SendResult(
+            message=message,
+            success=True,
+            latency=time.perf_counter() - started,
+            sent_at=datetime.now(),
+        )
+
+    def iter_send(self, messages: Iterable[OutgoingMessage]) -> Iterator[SendResult]:
+        """
+        Yield results in completion order, so callers can report progress as they arrive.
+
+        Messages are handed to the workers one recipient domain after another in turn, each as
+        soon as its limits allow, so a domain that is being held back never keeps the workers
+        from the others. Messages that a limit would hold back for longer than ``max_wait``,
+        such as those over a daily quota, fail at once with a transient ``QuotaExceededError``:
+        those to the domain for a domain's limit, and all the rest for the account's or the
+        overall one.
+        """
+        queues: dict[str, deque[OutgoingMessage]] = {}
+        for message in messages:
+            queues.setdefault(domain_key(message.to), deque()).append(message)
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="bulk-send"
+        ) as executor:
+            running: set[Future[SendResult]] = set()
+            while queues or running:
+                pause = self.max_wait
+                for key in list(queues):
+                    if len(running) >= self.concurrency:
+                        break
+                    try:
+                        delay = self._reserve(key)
+                    except QuotaExceededError as exc:
+                        if exc.key == key:
+                            held = [queues.pop(key)]
+                        else:
+                            # No other domain can get past the account or overall limit either.
+                            held = list(queues.values())
+                            queues.clear()
+                        logger.warning(f"Holding back {sum(map(len, held))} message(s): {exc}")
+                        for message in itertools.chain.from_iterable(held):
+                            yield self._failure(message, exc, time.perf_counter())
+                        if not queues:
+                            break
+                        continue
+                    if delay:
+                        pause = min(pause, delay)
+                        continue
+                    # Send the next message for this domain and move it to the back of the turn.
+                    queue = queues.pop(key)
+                    running.add(executor.submit(self._send_one, queue.popleft()))
+                    if queue:
+                        queues[key] = queue
+                if not running:
+                    if queues:
+                        time.sleep(pause)
+                    continue
+                done, running = wait(
+                    running, timeout=pause if queues else None, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+
+    def send_all(
+        self,
+        messages: Sequence[OutgoingMessage],
+        on_result: Callable[[SendResult, int, int], None] | None = None,
+    ) -> list[SendResult]:
+        """
+        Send every message and return the per-recipient results.
+
+        Args:
+            messages: Rendered messages to send.
+            on_result: Optional callback invoked as ``on_result(result, done, total)`` from the
+                calling thread after each message completes.
+
+        Returns:
+            One ``SendResult`` per message, in completion order.
+        """
+        results: list[SendResult] = []
+        total = len(messages)
+        for result in self.iter_send(messages):
+            results.append(result)
+            if on_result is not None:
+                on_result(result, len(results), total)
+
+        failed = sum(not r.success for r in results)
+        logger.info(f"Bulk send finished: {total - failed} sent, {failed} failed")
+        return results
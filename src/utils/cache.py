@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from utils.db import DatabaseManager, get_database
+
+# Read methods served from the cache, and the tables each one depends on.
+CACHED_READS: dict[str, tuple[str, ...]] = {
+    "get_all_profiles": ("profiles",),
+    "get_profiles_by_id": ("profiles",),
+    "list_profiles": ("profiles",),
+    "get_all_templates": ("templates",),
+    "list_templates": ("templates",),
+    "get_compiled_template": ("templates",),
+    "get_user_profile": ("user_profile",),
+    "get_campaigns_on": ("campaigns", "bodies"),
+    "get_stat": ("stats",),
+    "get_daily_stats": ("stats",),
+    "get_totals": ("stats",),
+    "get_top_recipients": ("stats",),
+    "get_recent_sends": ("stats",),
+}
+
+
+class CachedDatabase:
+    """
+    Read-through cache in front of a ``DatabaseManager``, shared by every page and session.
+
+    The methods in ``CACHED_READS`` remember their result together with the version stamp of
+    the tables they read (see ``DatabaseManager.table_versions``). A repeated call costs one
+    stamp comparison until a write to one of those tables, in this process or another, moves
+    the stamp. Every other attribute is passed straight through to the manager, so writes and
+    uncached reads work as before.
+
+    Cached results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, db: DatabaseManager, maxsize: int = 256) -> None:
+        self.db = db
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[tuple[int, ...], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits: dict[str, int] = dict.fromkeys(CACHED_READS, 0)
+        self._misses: dict[str, int] = dict.fromkeys(CACHED_READS, 0)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.db, name)
+        if name not in CACHED_READS:
+            return attribute
+        return lambda *args, **kwargs: self._call(name, attribute, args, kwargs)
+
+    def _call(
+        self, name: str, method: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> Any:
+        key = (name, args, tuple(sorted(kwargs.items())))
+        stamp = self.db.table_versions(CACHED_READS[name])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self._hits[name] += 1
+                return entry[1]
+            self._misses[name] += 1
+
+        value = method(*args, **kwargs)
+        with self._lock:
+            self._entries[key] = (stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Hit and miss counts since start-up.
+
+        Returns:
+            ``{"hits", "misses", "hit_rate", "entries", "methods": {name: {"hits", "misses"}}}``.
+        """
+        with self._lock:
+            hits, misses = sum(self._hits.values()), sum(self._misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "entries": len(self._entries),
+                "methods": {
+                    name: {"hits": self._hits[name], "misses": self._misses[name]}
+                    for name in CACHED_READS
+                },
+            }
+
+
+_shared: dict[int, CachedDatabase] = {}
+_shared_lock = threading.Lock()
+
+
+def get_cached_database(db_path: str | None = None) -> CachedDatabase:
+    """Return the process-wide cache in front of ``get_database(db_path)``."""
+    db = get_database(db_path)
+    with _shared_lock:
+        if id(db) not in _shared:
+            _shared[id(db)] = CachedDatabase(db)
+        return _shared[id(db)]
@@ -1,111 +1,1453 @@
+import hashlib
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import wraps
 from typing import Any
 
-from tinydb import Query, TinyDB
+from tinydb.table import Document
+
+from utils.indexes import HashIndex, ListingIndex, SortedIndex
+from utils.locks import ReadWriteLock
+from utils.metrics import get_metrics
+from utils.retrieval import VectorIndex, similarity_text
+from utils.search_index import InvertedIndex, tokenize
+from utils.storage import iter_chunks, open_storage
+from utils.templating import CompiledTemplate, TemplateCache
+
+PROFILE_FIELDS = ("name", "email", "title", "profession")
+# Schedule statuses still waiting to go out, and those of a campaign handed to the outbox.
+DISPATCHABLE_STATUSES = ("pending", "retrying")
+QUEUED_SCHEDULE_STATUSES = ("queued", "sent", "failed")
+# Outbox statuses a worker may claim, and those not yet finished.
+CLAIMABLE_STATUSES = ("queued", "failed")
+UNSENT_STATUSES = ("queued", "sending", "failed")
+# ``claim_outbox`` spreads a claim of ``limit`` messages over the oldest ``limit`` times this.
+CLAIM_WINDOW = 8
+
+
+def _instrumented(method: Callable[..., Any], lock: str) -> Callable[..., Any]:
+    # Times whole calls, lock wait included, into db_call{method=...}.
+    metrics = get_metrics()
+    histogram = metrics.histogram("db_call", method=method.__name__)
+
+    @wraps(method)
+    def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+        if not metrics.sampled():
+            with getattr(self.lock, lock)():
+                return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            with getattr(self.lock, lock)():
+                return method(self, *args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _reads(method: Callable[..., Any]) -> Callable[..., Any]:
+    return _instrumented(method, "read")
+
+
+def _writes(method: Callable[..., Any]) -> Callable[..., Any]:
+    return _instrumented(method, "write")
 
 
 class DatabaseManager:
-    """Lightweight wrapper around TinyDB collections used in the app."""
+    """
+    Lightweight wrapper around the document collections used in the app.
+
+    ``db_path`` picks the storage backend: ``.db``/``.sqlite`` files use SQLite, anything else
+    a TinyDB JSON file. It defaults to the ``EMAIL_DB_PATH`` environment variable, falling back
+    to ``email_manager.json``.
+
+    Every public method runs under a read or write lock, so a single instance can be shared by
+    all Streamlit sessions in the process; use ``get_database`` for that shared instance. Their
+    call times are recorded in the ``db_call`` histogram of ``utils.metrics``.
+
+    Group related writes with ``transaction()``. With ``write_behind`` (or
+    ``EMAIL_DB_WRITE_BEHIND=1``) writes are buffered and flushed every ``flush_every`` writes
+    or ``flush_interval`` seconds, whichever comes first, and on ``flush()`` or exit.
+    """
+
+    def __init__(
+        self,
+        db_path: str | None = None,
+        write_behind: bool | None = None,
+        flush_every: int = 100,
+        flush_interval: float = 2.0,
+    ) -> None:
+        db_path = db_path or os.getenv("EMAIL_DB_PATH", "email_manager.json")
+        if write_behind is None:
+            write_behind = os.getenv("EMAIL_DB_WRITE_BEHIND", "").lower() in {"1", "true", "yes"}
+        self.db_path = db_path
+        self.lock = ReadWriteLock()
+        self.db = open_storage(
+            db_path,
+            write_behind=write_behind,
+            flush_every=flush_every,
+            flush_interval=flush_interval,
+            lock=self.lock.write,
+        )
+        # TinyDB wraps its storage object; SQLiteStorage is its own storage.
+        self.storage = getattr(self.db, "storage", self.db)
+        # Built on the first search, then kept current by the add_/update_/delete_ methods.
+        self._search_index: InvertedIndex | None = None
+        # Hashed TF-IDF vectors for similar(), built and maintained the same way.
+        self._similarity_index: VectorIndex | None = None
+        self._search_lock = threading.Lock()
+        self.template_cache = TemplateCache()
+        # body hash -> body text for the content-addressed ``bodies`` table, loaded lazily.
+        self._bodies_by_hash: dict[str, str] | None = None
+        # ISO day -> ids of the campaigns going out that day, and reminder_date -> reminder id,
+        # each loaded lazily and rebuilt when the storage generation it was read at moves.
+        self._campaign_days: dict[str, list[int]] | None = None
+        self._campaign_days_generation: int | None = None
+        self._reminder_dates: SortedIndex | None = None
+        self._reminder_generation: int | None = None
+        # (table, field) -> HashIndex for the LOOKUP_FIELDS, and profile id -> profile, with
+        # the _stamp() of the table each reflects.
+        self._lookups: dict[tuple[str, str], HashIndex] = {}
+        self._lookup_stamps: dict[tuple[str, str], tuple[int, int]] = {}
+        self._profiles_by_id: dict[int, Document] | None = None
+        self._profiles_stamp: tuple[int, int] | None = None
+        # table name -> sorted, filterable snapshot for the list_ methods, and its _stamp().
+        self._listings: dict[str, ListingIndex] = {}
+        self._listing_stamps: dict[str, tuple[int, int]] = {}
+        # table name -> write counter, see table_versions().
+        self._versions: dict[str, int] = {}
+        # (metric, key) -> row of the ``stats`` table, and the storage generation it was read at.
+        self._stats: dict[tuple[str, str], Document] | None = None
+        self._stats_generation: int | None = None
+        # Outbox ids by status, claimable outbox ids by next attempt, and their generation.
+        self._outbox_statuses: HashIndex | None = None
+        self._outbox_due: SortedIndex | None = None
+        self._outbox_generation: int | None = None
+        self.profiles = self._table("profiles")
+        self.templates = self._table("templates")
+        self.sent_emails = self._table("sent_emails")
+        self.reminders = self._table("reminders")
+        self.schedules = self._table("schedules")
+        self.user_profile = self._table("user_profile")
+        self.bodies = self._table("bodies")
+        self.campaigns = self._table("campaigns")
+        self.stats = self._table("stats")
+        self.outbox = self._table("outbox")
+        if not len(self.stats):
+            # A database from before the aggregates existed: count its history once.
+            self.rebuild_stats()
+
+    def _table(self, name: str) -> "_VersionedTable":
+        self._versions[name] = 0
+        return _VersionedTable(self.db.table(name), lambda: self._bump(name))
+
+    def _bump(self, *names: str) -> None:
+        for name in names or tuple(self._versions):
+            self._versions[name] += 1
+
+    @_reads
+    def table_versions(self, names: Iterable[str]) -> tuple[int, ...]:
+        """
+        Return a version stamp for the given tables, for keying cached reads.
+
+        Each table's counter moves on every write made through this manager. The leading
+        element moves when another process changes the database, which may touch any table.
+        """
+        return (self.storage.generation(), *(self._versions[name] for name in names))
+
+    # Transactions -------------------------------------------------------------
+    @contextmanager
+    def transaction(self, durable: bool = False) -> Iterator["DatabaseManager"]:
+        """
+        Batch every write made inside the block into a single durable commit.
+
+        If the block raises, none of its writes are kept and the exception propagates.
+        Transactions nest; only the outermost one commits. Transactions of other processes
+        wait for it; with ``durable`` the outermost one also commits before returning in
+        write-behind mode, so no other process acts on what was there before.
+        """
+        with self.lock.write():
+            try:
+                with self.storage.transaction(durable):
+                    yield self
+            except BaseException:
+                self._clear_query_caches()
+                self._search_index = None
+                self._similarity_index = None
+                self.template_cache.invalidate()
+                self._bodies_by_hash = None
+                self._campaign_days = None
+                self._reminder_dates = None
+                self._lookups.clear()
+                self._profiles_by_id = None
+                self._listings.clear()
+                self._stats = None
+                self._outbox_statuses = None
+                self._bump()
+                raise
+
+    def flush(self) -> None:
+        """Persist any writes buffered by write-behind mode."""
+        with self.lock.write():
+            self.storage.flush()
+
+    def iter_table(
+        self,
+        name: str,
+        chunk_size: int = 1000,
+        bodies: bool = True,
+        fields: Sequence[str] | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Stream every document of table ``name`` in id order without loading the whole table.
+
+        Documents are read ``chunk_size`` at a time under the read lock, which is released
+        between chunks so a slow consumer never holds off writers. Sent emails and campaigns
+        come with their bodies filled in unless ``bodies`` is false or ``fields`` is given.
+        ``fields`` narrows each document to those top-level fields.
+        """
+        chunks = iter_chunks(self.db.table(name), chunk_size, fields)
+        bodies = bodies and not fields
+        while True:
+            with self.lock.read():
+                chunk = next(chunks, None)
+                if chunk is not None and bodies and name in ("sent_emails", "campaigns"):
+                    self._hydrate_chunk(chunk)
+            if chunk is None:
+                return
+            yield from chunk
+
+    def _clear_query_caches(self) -> None:
+        for table in (
+            self.profiles,
+            self.templates,
+            self.sent_emails,
+            self.reminders,
+            self.schedules,
+            self.user_profile,
+            self.bodies,
+            self.campaigns,
+            self.stats,
+            self.outbox,
+        ):
+            table.clear_cache()
+
+    # Lookup indexes -----------------------------------------------------------
+    # Hash indexes are built from a table on first lookup and kept current by every write
+    # through this manager. Each remembers the _stamp() of the table it reflects; a write by
+    # another process, or one here that _track() did not see, moves the stamp and triggers a
+    # rebuild.
+    LOOKUP_FIELDS = {
+        "profiles": ("email", "name"),
+        "reminders": ("email_id", "campaign_id"),
+        "schedules": ("email_id", "campaign_id"),
+        "outbox": ("key", "campaign_id"),
+    }
 
-    def __init__(self, db_path: str = "email_manager.json") -> None:
-        self.db = TinyDB(db_path)
-        self.profiles = self.db.table("profiles")
-        self.templates = self.db.table("templates")
-        self.sent_emails = self.db.table("sent_emails")
-        self.reminders = self.db.table("reminders")
-        self.schedules = self.db.table("schedules")
-        self.user_profile = self.db.table("user_profile")
+    @staticmethod
+    def _lookup_key(value: Any) -> Any:
+        # Names and addresses match case-insensitively and ignore surrounding spaces.
+        return value.strip().lower() if isinstance(value, str) else value
+
+    def _stamp(self, table) -> tuple[int, int]:
+        """The storage generation and this manager's write count for ``table``."""
+        return self.storage.generation(), self._versions[table.name]
+
+    @staticmethod
+    def _restamp(old: tuple[int, int] | None, new: tuple[int, int]) -> tuple[int, int] | None:
+        """
+        The stamp of an index built at ``old`` once ``_track`` has applied the write that moved
+        the table to ``new``, or None if the table has also changed in ways the index has not
+        seen and it must be rebuilt.
+        """
+        if old is None or new[0] != old[0] or new[1] - old[1] > 1:
+            return None
+        return new
+
+    def _lookup_index(self, table, field: str) -> HashIndex:
+        key = (table.name, field)
+        stamp = self._stamp(table)
+        index = self._lookups.get(key)
+        if index is None or self._lookup_stamps.get(key) != stamp:
+            index = HashIndex((self._lookup_key(doc.get(field)), doc.doc_id) for doc in table.all())
+            self._lookups[key] = index
+            self._lookup_stamps[key] = stamp
+        return index
+
+    def _lookup(self, table, field: str, value: Any) -> list[int]:
+        return self._lookup_index(table, field).get(self._lookup_key(value))
+
+    def _profile_map(self) -> dict[int, Document]:
+        stamp = self._stamp(self.profiles)
+        profiles = self._profiles_by_id
+        if profiles is None or self._profiles_stamp != stamp:
+            profiles = self._profiles_by_id = {doc.doc_id: doc for doc in self.profiles.all()}
+            self._profiles_stamp = stamp
+        return profiles
+
+    # Fields each listing can filter and sort on.
+    LISTING_FIELDS = {
+        "profiles": PROFILE_FIELDS,
+        "templates": ("name", "body"),
+    }
+
+    def _list(self, table, sort: str, text: str, offset: int, limit: int) -> dict[str, Any]:
+        stamp = self._stamp(table)
+        listing = self._listings.get(table.name)
+        if listing is None or self._listing_stamps.get(table.name) != stamp:
+            listing = ListingIndex(table.all(), self.LISTING_FIELDS[table.name])
+            self._listings[table.name] = listing
+            self._listing_stamps[table.name] = stamp
+        total, items = listing.page(sort, text, offset, limit)
+        return {"total": total, "items": items}
+
+    def _track(self, table, doc_id: int, doc: dict[str, Any] | None) -> None:
+        """Update the lookup indexes of ``table`` after a write; ``doc=None`` for a delete."""
+        self._listings.pop(table.name, None)
+        current = self._stamp(table)
+        for field in self.LOOKUP_FIELDS.get(table.name, ()):
+            key = (table.name, field)
+            index = self._lookups.get(key)
+            if index is None:
+                continue
+            stamp = self._restamp(self._lookup_stamps.get(key), current)
+            if stamp is None:
+                del self._lookups[key]
+                continue
+            self._lookup_stamps[key] = stamp
+            if doc is None:
+                index.remove(doc_id)
+            else:
+                index.add(self._lookup_key(doc.get(field)), doc_id)
+        if table is self.profiles and self._profiles_by_id is not None:
+            self._profiles_stamp = self._restamp(self._profiles_stamp, current)
+            if self._profiles_stamp is None:
+                self._profiles_by_id = None
+            elif doc is None:
+                self._profiles_by_id.pop(doc_id, None)
+            else:
+                self._profiles_by_id[doc_id] = Document(doc, doc_id=doc_id)
 
     # Profiles -----------------------------------------------------------------
+    @_writes
     def add_profile(self, name: str, email: str, title: str, profession: str) -> int:
-        return self.profiles.insert(
-            {"name": name, "email": email, "title": title, "profession": profession}
-        )
+        doc = {"name": name, "email": email, "title": title, "profession": profession}
+        profile_id = self.profiles.insert(doc)
+        self._track(self.profiles, profile_id, doc)
+        self._index("profile", profile_id, doc)
+        return profile_id
+
+    @_writes
+    def add_profiles(
+        self, profiles: Iterable[Mapping[str, Any]], skip_existing: bool = True
+    ) -> list[int]:
+        """
+        Insert many profiles in a single write.
+
+        Args:
+            profiles: Mappings with ``name``, ``email``, ``title`` and ``profession``; missing
+                fields are stored empty.
+            skip_existing: Skip profiles whose email is already stored or repeats earlier in
+                ``profiles``.
 
+        Returns:
+            The ids of the inserted profiles.
+        """
+        emails = self._lookup_index(self.profiles, "email")
+        docs: list[dict[str, Any]] = []
+        seen: set[str] = set()
+        for profile in profiles:
+            doc = {field: profile.get(field) or "" for field in PROFILE_FIELDS}
+            key = self._lookup_key(doc["email"])
+            if skip_existing and (key in seen or emails.get(key)):
+                continue
+            seen.add(key)
+            docs.append(doc)
+        if not docs:
+            return []
+
+        with self.transaction():
+            profile_ids = self.profiles.insert_multiple(docs)
+        for profile_id, doc in zip(profile_ids, docs, strict=True):
+            self._track(self.profiles, profile_id, doc)
+            self._index("profile", profile_id, doc)
+        return profile_ids
+
+    @_reads
     def get_profile(self, profile_id: int) -> dict[str, Any] | None:
-        return self.profiles.get(doc_id=profile_id)
+        return self._profile_map().get(profile_id)
+
+    @_reads
+    def get_profiles(self, profile_ids: list[int]) -> list[dict[str, Any]]:
+        """Return the profiles with the given ids, in the same order, skipping missing ones."""
+        profiles = self._profile_map()
+        return [profiles[i] for i in profile_ids if i in profiles]
 
+    @_reads
+    def get_profiles_by_id(self) -> dict[int, dict[str, Any]]:
+        """Return every profile keyed by id, e.g. to label ids in a picker."""
+        return dict(self._profile_map())
+
+    @_reads
+    def find_profile_by_email(self, email: str) -> dict[str, Any] | None:
+        ids = self._lookup(self.profiles, "email", email)
+        return self._profile_map().get(ids[0]) if ids else None
+
+    @_reads
+    def find_profiles_by_name(self, name: str) -> list[dict[str, Any]]:
+        return self.get_profiles(self._lookup(self.profiles, "name", name))
+
+    @_writes
     def update_profile(self, profile_id: int, name: str, email: str, title: str, profession: str) -> None:
-        self.profiles.update(
-            {"name": name, "email": email, "title": title, "profession": profession},
-            doc_ids=[profile_id],
-        )
+        doc = {"name": name, "email": email, "title": title, "profession": profession}
+        self.profiles.update(doc, doc_ids=[profile_id])
+        self._track(self.profiles, profile_id, self.profiles.get(doc_id=profile_id))
+        self._index("profile", profile_id, doc)
 
+    @_writes
     def delete_profile(self, profile_id: int) -> None:
         self.profiles.remove(doc_ids=[profile_id])
+        self._track(self.profiles, profile_id, None)
+        self._unindex("profile", profile_id)
 
+    @_reads
     def get_all_profiles(self) -> list[dict[str, Any]]:
         return self.profiles.all()
 
+    @_reads
+    def list_profiles(
+        self, offset: int = 0, limit: int = 20, sort: str = "name", filter: str = ""
+    ) -> dict[str, Any]:
+        """
+        Return one page of profiles.
+
+        Args:
+            offset: Number of matching profiles to skip.
+            limit: Maximum number of profiles to return.
+            sort: ``name``, ``email``, ``title``, ``profession`` or ``id``; prefix with ``-``
+                for descending order.
+            filter: Case-insensitive text that must appear in one of the profile fields.
+
+        Returns:
+            ``{"total": int, "items": [profile, ...]}``.
+        """
+        return self._list(self.profiles, sort, filter, offset, limit)
+
     # Templates ----------------------------------------------------------------
+    @_writes
     def add_template(self, name: str, body: str) -> int:
-        return self.templates.insert({"name": name, "body": body})
+        doc = {"name": name, "body": body}
+        template_id = self.templates.insert(doc)
+        self._track(self.templates, template_id, doc)
+        self._index("template", template_id, doc)
+        return template_id
 
+    @_reads
     def get_template(self, template_id: int) -> dict[str, Any] | None:
         return self.templates.get(doc_id=template_id)
 
+    @_writes
     def update_template(self, template_id: int, name: str, body: str) -> None:
-        self.templates.update({"name": name, "body": body}, doc_ids=[template_id])
+        doc = {"name": name, "body": body}
+        self.templates.update(doc, doc_ids=[template_id])
+        self._track(self.templates, template_id, doc)
+        self.template_cache.invalidate(template_id)
+        self._index("template", template_id, doc)
 
+    @_writes
     def delete_template(self, template_id: int) -> None:
         self.templates.remove(doc_ids=[template_id])
+        self._track(self.templates, template_id, None)
+        self.template_cache.invalidate(template_id)
+        self._unindex("template", template_id)
 
+    @_reads
     def get_all_templates(self) -> list[dict[str, Any]]:
         return self.templates.all()
 
+    @_reads
+    def list_templates(
+        self, offset: int = 0, limit: int = 20, sort: str = "name", filter: str = ""
+    ) -> dict[str, Any]:
+        """Return one page of templates, like ``list_profiles``; sort by ``name`` or ``id``."""
+        return self._list(self.templates, sort, filter, offset, limit)
+
+    @_reads
+    def get_compiled_template(self, template_id: int) -> CompiledTemplate | None:
+        """Return the template parsed for rendering, compiling it only on first use."""
+        template = self.templates.get(doc_id=template_id)
+        if template is None:
+            return None
+        return self.template_cache.get(template_id, template["body"])
+
+    # Bodies -------------------------------------------------------------------
+    # Sent emails reference their body by content hash, so a body shared by many rows is
+    # stored once in the ``bodies`` table. Rows written before this carry an inline ``body``
+    # until ``compact_bodies`` moves it out; reads handle both shapes.
+    @staticmethod
+    def _body_hash(body: str) -> str:
+        return hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _body_map(self) -> dict[str, str]:
+        if self._bodies_by_hash is None:
+            self._bodies_by_hash = {doc["hash"]: doc["body"] for doc in self.bodies.all()}
+        return self._bodies_by_hash
+
+    def _store_bodies(self, bodies: list[str]) -> list[str]:
+        """Return the hash of each body, inserting the ones not stored yet in a single write."""
+        known = self._body_map()
+        hashes: list[str] = []
+        new: dict[str, str] = {}
+        for body in bodies:
+            body_hash = self._body_hash(body)
+            hashes.append(body_hash)
+            if body_hash not in known:
+                new[body_hash] = body
+        if new:
+            self.bodies.insert_multiple({"hash": h, "body": body} for h, body in new.items())
+            known.update(new)
+        return hashes
+
+    def _hydrate(self, email: dict[str, Any] | None) -> dict[str, Any] | None:
+        if email is not None and "body" not in email and "body_hash" in email:
+            body = self._body_map().get(email["body_hash"])
+            if body is None:
+                # Stored by another process after we loaded the map.
+                self._bodies_by_hash = None
+                body = self._body_map().get(email["body_hash"], "")
+            email["body"] = body
+        return email
+
+    def _hydrate_chunk(self, docs: list[dict[str, Any]]) -> None:
+        # Fetch just the bodies these documents need, unless every body is cached already,
+        # so streaming a large table never pulls the whole bodies table into memory.
+        hashes = {h for doc in docs for h in doc.get("body_hashes", [doc.get("body_hash")])}
+        hashes.discard(None)
+        if self._bodies_by_hash is not None or not hasattr(self.bodies, "search_in"):
+            known = self._body_map()
+        else:
+            known = {doc["hash"]: doc["body"] for doc in self.bodies.search_in("hash", hashes)}
+        for doc in docs:
+            if "body_hashes" in doc:
+                doc["bodies"] = [known.get(h, "") for h in doc["body_hashes"]]
+            elif "body" not in doc and "body_hash" in doc:
+                doc["body"] = known.get(doc["body_hash"], "")
+
+    @_writes
+    def compact_bodies(self) -> dict[str, int]:
+        """
+        Move inline sent-email bodies into the ``bodies`` table and drop unreferenced bodies.
+
+        Returns:
+            Counts of rows ``moved``, unique ``bodies`` kept and orphaned bodies ``removed``.
+        """
+        with self.transaction():
+            inline = [email for email in self.sent_emails.all() if "body" in email]
+            hashes = self._store_bodies([email["body"] for email in inline])
+            for email, body_hash in zip(inline, hashes, strict=True):
+                self.sent_emails.update(_move_body_to(body_hash), doc_ids=[email.doc_id])
+
+            referenced = {email["body_hash"] for email in self.sent_emails.all()}
+            for campaign in self.campaigns.all():
+                referenced.update(campaign["body_hashes"])
+            referenced.update(row["body_hash"] for row in self.outbox.all())
+            orphans = [doc.doc_id for doc in self.bodies.all() if doc["hash"] not in referenced]
+            if orphans:
+                self.bodies.remove(doc_ids=orphans)
+                self._bodies_by_hash = None
+        return {"moved": len(inline), "bodies": len(self._body_map()), "removed": len(orphans)}
+
     # Sent emails --------------------------------------------------------------
+    @_writes
     def add_sent_email(self, recipients: list[str], subject: str, body: str, sent_date) -> int:
-        return self.sent_emails.insert(
-            {
-                "recipients": recipients,
-                "subject": subject,
-                "body": body,
-                "sent_date": sent_date.isoformat(),
-            }
-        )
+        return self.add_sent_emails([(recipients, subject, body, sent_date)])[0]
 
+    @_writes
+    def add_sent_emails(self, emails: list[tuple[list[str], str, str, Any]]) -> list[int]:
+        """Insert many ``(recipients, subject, body, sent_date)`` rows in a single write."""
+        with self.transaction():
+            hashes = self._store_bodies([body for _, _, body, _ in emails])
+            email_ids = self.sent_emails.insert_multiple(
+                {
+                    "recipients": recipients,
+                    "subject": subject,
+                    "body_hash": body_hash,
+                    "sent_date": sent_date.isoformat(),
+                }
+                for (recipients, subject, _, sent_date), body_hash in zip(
+                    emails, hashes, strict=True
+                )
+            )
+            self._count_sends(
+                (sent_date.isoformat(), recipient, subject, "sent")
+                for recipients, subject, _, sent_date in emails
+                for recipient in recipients
+            )
+        for email_id, (recipients, subject, body, sent_date) in zip(email_ids, emails, strict=True):
+            doc = {"recipients": recipients, "subject": subject, "body": body}
+            self._index("sent_email", email_id, {**doc, "sent_date": sent_date.isoformat()})
+        return email_ids
+
+    @_reads
     def get_sent_email(self, email_id: int) -> dict[str, Any] | None:
-        return self.sent_emails.get(doc_id=email_id)
+        return self._hydrate(self.sent_emails.get(doc_id=email_id))
 
+    @_reads
     def get_all_sent_emails(self) -> list[dict[str, Any]]:
-        return self.sent_emails.all()
+        return [self._hydrate(email) for email in self.sent_emails.all()]
+
+    # Campaigns ----------------------------------------------------------------
+    # One campaign is one click on the Send page: the rendered bodies (by hash), a status per
+    # recipient, and at most one schedule and one reminder pointing back at it. Per-recipient
+    # data is kept in parallel arrays so a batch of any size is a single document.
+    CAMPAIGN_KINDS = ("send", "schedule", "reminder")
+
+    @_writes
+    def add_campaign(
+        self,
+        recipients: list[str],
+        subjects: list[str],
+        bodies: list[str],
+        sent_date,
+        kind: str = "send",
+        template_id: int | None = None,
+        statuses: list[str] | None = None,
+        errors: Mapping[str, str] | None = None,
+        reminder_date=None,
+        attachments: list[dict[str, Any]] | None = None,
+    ) -> int:
+        """
+        Record one batch of emails, plus its schedule or reminder, in a single write.
+
+        Args:
+            recipients: One email address per message.
+            subjects: The subject of each message, parallel to ``recipients``.
+            bodies: The rendered body of each message, parallel to ``recipients``.
+            sent_date: When the batch went out, or is due to for ``kind="schedule"``.
+            kind: ``send``, ``schedule`` (adds a pending schedule at ``sent_date``) or
+                ``reminder`` (adds a reminder at ``reminder_date``).
+            template_id: The template the bodies were rendered from, if any.
+            statuses: Status per recipient; defaults to ``sent``, ``pending`` or ``draft``
+                depending on ``kind``.
+            errors: Last error per recipient address, for failed sends.
+            reminder_date: Due date of the reminder; required for ``kind="reminder"``.
+            attachments: Stored files sent with every message, as ``Attachment.to_dict`` gives
+                them (see ``utils.attachments``).
+
+        Returns:
+            The new campaign id.
+        """
+        if kind not in self.CAMPAIGN_KINDS:
+            raise ValueError(f"Unknown campaign kind: {kind}")
+        if not len(recipients) == len(subjects) == len(bodies):
+            raise ValueError("recipients, subjects and bodies must have the same length")
+        if statuses is None:
+            default = {"send": "sent", "schedule": "pending", "reminder": "draft"}[kind]
+            statuses = [default] * len(recipients)
+
+        with self.transaction():
+            doc = {
+                "kind": kind,
+                "template_id": template_id,
+                "created_at": datetime.now().isoformat(),
+                "sent_date": sent_date.isoformat(),
+                "recipients": list(recipients),
+                "subjects": list(subjects),
+                "body_hashes": self._store_bodies(list(bodies)),
+                "statuses": list(statuses),
+                "errors": dict(errors or {}),
+                "attachments": list(attachments or []),
+            }
+            campaign_id = self.campaigns.insert(doc)
+            self._count_sends(
+                (doc["sent_date"], recipient, subject, status)
+                for recipient, subject, status in zip(recipients, subjects, statuses, strict=True)
+            )
+            if kind == "schedule":
+                schedule = {
+                    "campaign_id": campaign_id,
+                    "schedule_date": sent_date.isoformat(),
+                    "status": "pending",
+                }
+                self._track(self.schedules, self.schedules.insert(schedule), schedule)
+                self._count({("backlog", "schedules"): 1})
+            elif kind == "reminder":
+                reminder = {"campaign_id": campaign_id, "reminder_date": reminder_date.isoformat()}
+                reminder_id = self.reminders.insert(reminder)
+                self._track(self.reminders, reminder_id, reminder)
+                if self._reminder_dates is not None:
+                    self._reminder_dates.add(reminder_date.isoformat(), reminder_id)
+
+        if self._campaign_days is not None:
+            self._campaign_days.setdefault(doc["sent_date"][:10], []).append(campaign_id)
+        self._index("campaign", campaign_id, {**doc, "bodies": bodies})
+        return campaign_id
+
+    def _hydrate_campaign(self, campaign: dict[str, Any] | None) -> dict[str, Any] | None:
+        if campaign is not None and "bodies" not in campaign:
+            known = self._body_map()
+            if any(h not in known for h in campaign["body_hashes"]):
+                self._bodies_by_hash = None
+                known = self._body_map()
+            campaign["bodies"] = [known.get(h, "") for h in campaign["body_hashes"]]
+        return campaign
+
+    @_reads
+    def get_campaign(self, campaign_id: int) -> dict[str, Any] | None:
+        return self._hydrate_campaign(self.campaigns.get(doc_id=campaign_id))
+
+    @_reads
+    def get_all_campaigns(self) -> list[dict[str, Any]]:
+        return [self._hydrate_campaign(campaign) for campaign in self.campaigns.all()]
+
+    @_reads
+    def get_campaigns_on(self, day: date) -> list[dict[str, Any]]:
+        """Return the campaigns that went out, or are due to, on ``day``."""
+        generation = self.storage.generation()
+        days = self._campaign_days
+        if days is None or generation != self._campaign_days_generation:
+            # First use, or another process changed the database.
+            days = {}
+            for campaign in self.campaigns.all():
+                days.setdefault(campaign["sent_date"][:10], []).append(campaign.doc_id)
+            self._campaign_days = days
+            self._campaign_days_generation = generation
+        ids = days.get(day.isoformat(), [])
+        return [self._hydrate_campaign(campaign) for campaign in self.campaigns.get(doc_ids=ids)]
+
+    @_writes
+    def update_campaign_statuses(
+        self,
+        campaign_id: int,
+        statuses: Mapping[str, str],
+        errors: Mapping[str, str | None] | None = None,
+    ) -> None:
+        """Set the status, and optionally the last error, of some recipients by address."""
+        with self.transaction():
+            campaign = self.campaigns.get(doc_id=campaign_id)
+            if campaign is None:
+                return
+            # Taken before the update, which changes the status list in place.
+            before = dict(zip(campaign["recipients"], campaign["statuses"], strict=True))
+            subjects = dict(zip(campaign["recipients"], campaign["subjects"], strict=True))
+            self.campaigns.update(
+                _set_recipient_statuses(statuses, errors or {}), doc_ids=[campaign_id]
+            )
+            # Count each failed attempt, but a recipient's send only once.
+            now = datetime.now().isoformat()
+            self._count_sends(
+                (now, recipient, subjects[recipient], status)
+                for recipient, status in statuses.items()
+                if recipient in before and not status == before[recipient] == "sent"
+            )
+
+    @_writes
+    def delete_campaign(self, campaign_id: int) -> None:
+        """Delete a campaign, its schedule, reminder and outbox messages, and its counted sends."""
+        with self.transaction():
+            self.delete_outbox(self._lookup(self.outbox, "campaign_id", campaign_id))
+            campaign = self.campaigns.get(doc_id=campaign_id)
+            if campaign is not None:
+                # Subtracted as rebuild_stats counts them, on the campaign's sent_date.
+                deltas: Counter[tuple[str, str]] = Counter()
+                for recipient, status in zip(
+                    campaign["recipients"], campaign["statuses"], strict=True
+                ):
+                    _tally(deltas, campaign["sent_date"][:10], recipient, status)
+                self._count({name: -delta for name, delta in deltas.items()})
+            self.campaigns.remove(doc_ids=[campaign_id])
+            for table in (self.schedules, self.reminders):
+                attached = self._lookup(table, "campaign_id", campaign_id)
+                if attached and table is self.schedules:
+                    self._count({("backlog", "schedules"): -_waiting(table.get(doc_ids=attached))})
+                if attached:
+                    table.remove(doc_ids=attached)
+                for doc_id in attached:
+                    self._track(table, doc_id, None)
+        self._campaign_days = None
+        self._reminder_dates = None
+        self._unindex("campaign", campaign_id)
 
     # Reminders ----------------------------------------------------------------
+    def _reminder_index(self) -> SortedIndex:
+        generation = self.storage.generation()
+        index = self._reminder_dates
+        if index is None or generation != self._reminder_generation:
+            # First use, or another process changed the database.
+            index = self._reminder_dates = SortedIndex(
+                (reminder["reminder_date"], reminder.doc_id) for reminder in self.reminders.all()
+            )
+            self._reminder_generation = generation
+        return index
+
+    @_writes
     def add_reminder(self, email_id: int, reminder_date) -> int:
-        return self.reminders.insert(
-            {"email_id": email_id, "reminder_date": reminder_date.isoformat()}
-        )
+        reminder = {"email_id": email_id, "reminder_date": reminder_date.isoformat()}
+        reminder_id = self.reminders.insert(reminder)
+        self._track(self.reminders, reminder_id, reminder)
+        if self._reminder_dates is not None:
+            self._reminder_dates.add(reminder_date.isoformat(), reminder_id)
+        return reminder_id
 
+    @_reads
     def get_reminder(self, reminder_id: int) -> dict[str, Any] | None:
         return self.reminders.get(doc_id=reminder_id)
 
+    @_writes
     def update_reminder(self, reminder_id: int, reminder_date) -> None:
         self.reminders.update({"reminder_date": reminder_date.isoformat()}, doc_ids=[reminder_id])
+        if self._reminder_dates is not None:
+            self._reminder_dates.add(reminder_date.isoformat(), reminder_id)
 
+    @_writes
     def delete_reminder(self, reminder_id: int) -> None:
         self.reminders.remove(doc_ids=[reminder_id])
+        self._track(self.reminders, reminder_id, None)
+        if self._reminder_dates is not None:
+            self._reminder_dates.remove(reminder_id)
 
+    @_reads
     def get_all_reminders(self) -> list[dict[str, Any]]:
         return self.reminders.all()
 
+    @_reads
+    def get_reminders_for_email(self, email_id: int) -> list[dict[str, Any]]:
+        return self.reminders.get(doc_ids=self._lookup(self.reminders, "email_id", email_id))
+
+    @_reads
+    def get_reminders_for_campaign(self, campaign_id: int) -> list[dict[str, Any]]:
+        return self.reminders.get(doc_ids=self._lookup(self.reminders, "campaign_id", campaign_id))
+
+    @_reads
+    def list_reminders(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        offset: int = 0,
+        limit: int = 20,
+    ) -> dict[str, Any]:
+        """
+        Page through reminders due between ``start`` and ``end``, soonest first.
+
+        Each reminder comes joined with a summary of the email or campaign it belongs to,
+        fetched for the whole page at once.
+
+        Args:
+            start: Earliest due date to include; ``None`` for no lower bound.
+            end: Latest due date to include; ``None`` for no upper bound.
+            offset: Number of matching reminders to skip.
+            limit: Maximum number of reminders to return.
+
+        Returns:
+            ``{"total": int, "items": [{"reminder", "email"}, ...]}``, where ``email`` holds the
+            ``subject`` and ``recipients`` or is ``None`` if the email no longer exists.
+        """
+        index = self._reminder_index()
+        low = start.isoformat() if start else None
+        high = end.isoformat() if end else None
+        ids = index.range(low, high, offset=offset, limit=limit)
+        by_id = {reminder.doc_id: reminder for reminder in self.reminders.get(doc_ids=ids)}
+        reminders = [by_id[i] for i in ids if i in by_id]
+
+        email_ids = [r["email_id"] for r in reminders if "email_id" in r]
+        campaign_ids = [r["campaign_id"] for r in reminders if "campaign_id" in r]
+        emails = {e.doc_id: e for e in self.sent_emails.get(doc_ids=email_ids)}
+        campaigns = {c.doc_id: c for c in self.campaigns.get(doc_ids=campaign_ids)}
+
+        items = []
+        for reminder in reminders:
+            if "campaign_id" in reminder:
+                campaign = campaigns.get(reminder["campaign_id"])
+                email = campaign and {
+                    "subject": campaign["subjects"][0] if campaign["subjects"] else "",
+                    "recipients": campaign["recipients"],
+                }
+            else:
+                email = emails.get(reminder["email_id"])
+            items.append({"reminder": reminder, "email": email})
+        return {"total": index.count(low, high), "items": items}
+
     # Schedules ----------------------------------------------------------------
-    def add_schedule(self, email_id: int, schedule_date) -> int:
-        return self.schedules.insert(
-            {"email_id": email_id, "schedule_date": schedule_date.isoformat()}
-        )
+    @_writes
+    def add_schedule(self, email_id: int, schedule_date, status: str = "pending") -> int:
+        return self.add_schedules([(email_id, schedule_date)], status=status)[0]
+
+    @_writes
+    def add_schedules(self, schedules: list[tuple[int, Any]], status: str = "pending") -> list[int]:
+        """Insert many ``(email_id, schedule_date)`` rows in a single write."""
+        docs = [
+            {"email_id": email_id, "schedule_date": schedule_date.isoformat(), "status": status}
+            for email_id, schedule_date in schedules
+        ]
+        with self.transaction():
+            schedule_ids = self.schedules.insert_multiple(docs)
+            self._count({("backlog", "schedules"): _waiting(docs)})
+        for schedule_id, doc in zip(schedule_ids, docs, strict=True):
+            self._track(self.schedules, schedule_id, doc)
+        return schedule_ids
 
+    @_reads
     def get_schedule(self, schedule_id: int) -> dict[str, Any] | None:
         return self.schedules.get(doc_id=schedule_id)
 
+    @_writes
     def update_schedule(self, schedule_id: int, schedule_date) -> None:
         self.schedules.update({"schedule_date": schedule_date.isoformat()}, doc_ids=[schedule_id])
 
+    @_writes
+    def update_schedule_status(
+        self,
+        schedule_id: int,
+        status: str,
+        attempts: int | None = None,
+        next_attempt=None,
+        error: str | None = None,
+    ) -> None:
+        """Record a status: ``pending``, ``retrying``, ``queued``, ``sent`` or ``failed``."""
+        fields: dict[str, Any] = {"status": status, "error": error}
+        if attempts is not None:
+            fields["attempts"] = attempts
+        fields["next_attempt"] = next_attempt.isoformat() if next_attempt else None
+        with self.transaction():
+            schedule = self.schedules.get(doc_id=schedule_id)
+            self.schedules.update(fields, doc_ids=[schedule_id])
+            if schedule is None:
+                return
+            deltas: Counter[tuple[str, str]] = Counter()
+            deltas["backlog", "schedules"] = _waiting([fields]) - _waiting([schedule])
+            # Campaign recipients are counted by update_campaign_statuses instead.
+            if "email_id" in schedule:
+                _tally(deltas, datetime.now().date().isoformat(), "", status)
+            self._count(deltas)
+
+    @_writes
     def delete_schedule(self, schedule_id: int) -> None:
-        self.schedules.remove(doc_ids=[schedule_id])
+        with self.transaction():
+            schedule = self.schedules.get(doc_id=schedule_id)
+            self.schedules.remove(doc_ids=[schedule_id])
+            self._count({("backlog", "schedules"): -_waiting([schedule] if schedule else [])})
+        self._track(self.schedules, schedule_id, None)
 
+    @_reads
     def get_all_schedules(self) -> list[dict[str, Any]]:
         return self.schedules.all()
 
+    @_reads
+    def get_schedules_for_email(self, email_id: int) -> list[dict[str, Any]]:
+        return self.schedules.get(doc_ids=self._lookup(self.schedules, "email_id", email_id))
+
+    @_reads
+    def get_schedules_for_campaign(self, campaign_id: int) -> list[dict[str, Any]]:
+        return self.schedules.get(doc_ids=self._lookup(self.schedules, "campaign_id", campaign_id))
+
+    # Outbox -------------------------------------------------------------------
+    # Messages are queued in the ``outbox`` table, one row per recipient, before anything is
+    # sent, so a batch outlives the process that queued it. A worker claims ``queued`` rows,
+    # and ``failed`` ones whose ``next_attempt`` has come, by marking them ``sending`` under a
+    # lease, then records ``sent``, ``failed`` (to be retried) or ``dead`` (given up). Each row
+    # has an idempotency ``key``; queueing a key that is already in the outbox does nothing.
+    # A row still ``sending`` after its lease ran out was claimed by a worker that died
+    # mid-send. Its message may have gone out, so ``recover_outbox`` moves it to ``dead``
+    # rather than sending it twice; it can be requeued from the dead-letter view.
+    # Outbox writes run in durable transactions: the read of the due rows and the write of the
+    # claim exclude those of other processes, so two workers never claim the same message.
+    OUTBOX_STATUSES = ("queued", "sending", "sent", "failed", "dead")
+
+    def _outbox_index(self) -> tuple[HashIndex, SortedIndex]:
+        generation = self.storage.generation()
+        statuses = self._outbox_statuses
+        if (
+            statuses is None
+            or generation != self._outbox_generation
+            or len(statuses) != len(self.outbox)
+        ):
+            # First use, or another process (a worker, the Send page) changed the outbox.
+            rows = self.outbox.all()
+            self._outbox_statuses = HashIndex((row["status"], row.doc_id) for row in rows)
+            self._outbox_due = SortedIndex(
+                (row["next_attempt"], row.doc_id)
+                for row in rows
+                if row["status"] in CLAIMABLE_STATUSES
+            )
+            self._outbox_generation = generation
+        return self._outbox_statuses, self._outbox_due
+
+    def _track_outbox(self, doc_id: int, doc: Mapping[str, Any] | None) -> None:
+        if self._outbox_statuses is None:
+            return
+        if doc is None:
+            self._outbox_statuses.remove(doc_id)
+            self._outbox_due.remove(doc_id)
+            return
+        self._outbox_statuses.add(doc["status"], doc_id)
+        if doc["status"] in CLAIMABLE_STATUSES:
+            self._outbox_due.add(doc["next_attempt"], doc_id)
+        else:
+            self._outbox_due.remove(doc_id)
+
+    def _update_outbox(self, changes: Mapping[int, Mapping[str, Any]]) -> None:
+        """Apply per-row field changes, and copy the outcomes into the campaigns they belong to."""
+        rows = {row.doc_id: row for row in self.outbox.get(doc_ids=list(changes))}
+        campaigns: dict[int, tuple[dict[str, str], dict[str, str | None]]] = {}
+        sends = []
+        unsent = 0
+        for doc_id, fields in changes.items():
+            row = rows.get(doc_id)
+            if row is None:
+                continue
+            self.outbox.update(dict(fields), doc_ids=[doc_id])
+            updated = {**row, **fields}
+            self._track_outbox(doc_id, updated)
+            unsent += (updated["status"] in UNSENT_STATUSES) - (row["status"] in UNSENT_STATUSES)
+            if updated["status"] == row["status"]:
+                continue
+            # Campaigns and the stats see ``sent`` and ``failed``; a dead message failed.
+            status = {"dead": "failed", "sending": None}.get(updated["status"], updated["status"])
+            if status is None:
+                continue
+            if row.get("campaign_id") is not None:
+                statuses, errors = campaigns.setdefault(row["campaign_id"], ({}, {}))
+                statuses[row["recipient"]] = status
+                errors[row["recipient"]] = updated.get("error")
+            elif status in ("sent", "failed"):
+                sends.append((datetime.now().isoformat(), row["recipient"], row["subject"], status))
+        for campaign_id, (statuses, errors) in campaigns.items():
+            self.update_campaign_statuses(campaign_id, statuses, errors)
+            self._settle_schedules(campaign_id)
+        self._count_sends(sends)
+        self._count({("backlog", "outbox"): unsent})
+
+    def _settle_schedules(self, campaign_id: int) -> None:
+        """
+        Bring the status of a campaign's queued schedule in line with its outbox messages.
+
+        It stays ``queued`` while any message is unsent, then becomes ``sent`` if all of them
+        went out or ``failed`` if any went dead; requeueing a dead message queues it again.
+        """
+        rows = self.outbox.get(doc_ids=self._lookup(self.outbox, "campaign_id", campaign_id))
+        dead = sum(row["status"] == "dead" for row in rows)
+        if any(row["status"] in UNSENT_STATUSES for row in rows):
+            status, error = "queued", None
+        elif dead:
+            status, error = "failed", f"{dead} of {len(rows)} messages not delivered"
+        else:
+            status, error = "sent", None
+        schedule_ids = self._lookup(self.schedules, "campaign_id", campaign_id)
+        for schedule in self.schedules.get(doc_ids=schedule_ids):
+            if schedule.get("status") in QUEUED_SCHEDULE_STATUSES and schedule["status"] != status:
+                self.update_schedule_status(
+                    schedule.doc_id, status, attempts=schedule.get("attempts"), error=error
+                )
+
+    @_writes
+    def enqueue_outbox(
+        self,
+        messages: list[tuple[str, str, str]],
+        campaign_id: int | None = None,
+        keys: list[str] | None = None,
+        not_before: datetime | None = None,
+        attachments: list[dict[str, Any]] | None = None,
+    ) -> list[int]:
+        """
+        Queue ``(recipient, subject, body)`` messages for the outbox worker in a single write.
+
+        Args:
+            messages: One message per recipient.
+            campaign_id: The campaign the messages belong to. Their outcomes are copied into its
+                per-recipient statuses as they arrive.
+            keys: An idempotency key per message. Defaults to a hash of the campaign, recipient,
+                subject, body and attachments, so queueing the same campaign again sends nothing
+                twice.
+            not_before: Hold the messages until this time; defaults to now.
+            attachments: Stored files sent with every message, as ``Attachment.to_dict`` gives
+                them. Only their digests and names are kept on the rows.
+
+        Returns:
+            The outbox id of each message. A key that was queued before keeps its existing row.
+        """
+        now = datetime.now().isoformat()
+        attachments = list(attachments or [])
+        digests = [attachment["digest"] for attachment in attachments]
+        with self.transaction(durable=True):
+            hashes = self._store_bodies([body for _, _, body in messages])
+            if keys is None:
+                keys = [
+                    _outbox_key(campaign_id, recipient, subject, body_hash, digests)
+                    for (recipient, subject, _), body_hash in zip(messages, hashes, strict=True)
+                ]
+            new: dict[str, dict[str, Any]] = {}
+            for (recipient, subject, _), body_hash, key in zip(messages, hashes, keys, strict=True):
+                if key in new or self._lookup(self.outbox, "key", key):
+                    continue
+                new[key] = {
+                    "key": key,
+                    "campaign_id": campaign_id,
+                    "recipient": recipient,
+                    "subject": subject,
+                    "body_hash": body_hash,
+                    "attachments": [dict(attachment) for attachment in attachments],
+                    "status": "queued",
+                    "attempts": 0,
+                    "created_at": now,
+                    "next_attempt": not_before.isoformat() if not_before else now,
+                    "lease_until": None,
+                    "owner": None,
+                    "error": None,
+                    "error_code": None,
+                    "sent_at": None,
+                }
+            rows = list(new.values())
+            for doc_id, doc in zip(self.outbox.insert_multiple(rows), rows, strict=True):
+                self._track(self.outbox, doc_id, doc)
+                self._track_outbox(doc_id, doc)
+            self._count({("backlog", "outbox"): len(new)})
+        return [self._lookup(self.outbox, "key", key)[0] for key in keys]
+
+    @_writes
+    def claim_outbox(
+        self,
+        owner: str,
+        limit: int,
+        lease: float = 300.0,
+        outbox_ids: Iterable[int] | None = None,
+        now: datetime | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Mark up to ``limit`` due messages ``sending`` for ``owner`` and return them.
+
+        Due messages are ``queued``, or ``failed`` with their ``next_attempt`` passed. Among the
+        oldest ``CLAIM_WINDOW`` times ``limit`` of them, recipient domains take turns, so one
+        batch does not go to a single domain while messages to others wait. The claim lasts
+        ``lease`` seconds, after which ``recover_outbox`` considers the worker dead.
+
+        Args:
+            owner: Name of the claiming worker.
+            limit: Maximum number of messages to claim.
+            lease: Seconds the worker has to record the outcome with ``finish_outbox``.
+            outbox_ids: Only claim among these rows.
+            now: The current time; defaults to ``datetime.now()``.
+
+        Returns:
+            The claimed rows with their ``body``, oldest first.
+        """
+        now = now or datetime.now()
+        with self.transaction(durable=True):
+            _, due = self._outbox_index()
+            window = limit * CLAIM_WINDOW
+            if outbox_ids is None:
+                candidates = due.range(None, now.isoformat(), limit=window)
+            else:
+                wanted = set(outbox_ids)
+                candidates = [i for i in due.range(None, now.isoformat()) if i in wanted][:window]
+            rows = _take_turns(
+                [
+                    row
+                    for row in self.outbox.get(doc_ids=candidates)
+                    if row["status"] in CLAIMABLE_STATUSES
+                    and row["next_attempt"] <= now.isoformat()
+                ],
+                limit,
+            )
+            lease_until = (now + timedelta(seconds=lease)).isoformat()
+            changes = {
+                row.doc_id: {
+                    "status": "sending",
+                    "owner": owner,
+                    "lease_until": lease_until,
+                    "attempts": row["attempts"] + 1,
+                }
+                for row in rows
+            }
+            self._update_outbox(changes)
+        claimed = []
+        for row in sorted(rows, key=lambda row: (row["next_attempt"], row.doc_id)):
+            claimed.append(self._hydrate(Document({**row, **changes[row.doc_id]}, row.doc_id)))
+        return claimed
+
+    @_writes
+    def finish_outbox(
+        self, outcomes: Iterable[tuple[int, str, str | None, int | None, datetime | None]]
+    ) -> None:
+        """
+        Record send outcomes for claimed messages in a single write.
+
+        Args:
+            outcomes: ``(outbox_id, status, error, error_code, when)`` per message, where
+                ``status`` is ``sent``, ``failed`` or ``dead`` and ``when`` is the send time
+                for ``sent`` and the next attempt for ``failed``.
+        """
+        changes = {}
+        for outbox_id, status, error, error_code, when in outcomes:
+            if status not in ("sent", "failed", "dead"):
+                raise ValueError(f"Unknown outbox outcome: {status}")
+            fields: dict[str, Any] = {
+                "status": status,
+                "error": error,
+                "error_code": error_code,
+                "lease_until": None,
+            }
+            if status == "sent":
+                fields["sent_at"] = when.isoformat()
+            elif status == "failed":
+                fields["next_attempt"] = when.isoformat()
+            changes[outbox_id] = fields
+        with self.transaction(durable=True):
+            self._update_outbox(changes)
+
+    @_writes
+    def recover_outbox(self, now: datetime | None = None) -> int:
+        """
+        Move messages whose claim expired while ``sending`` to ``dead``.
+
+        Returns:
+            The number of messages moved.
+        """
+        now = (now or datetime.now()).isoformat()
+        with self.transaction(durable=True):
+            statuses, _ = self._outbox_index()
+            stale = [
+                row.doc_id
+                for row in self.outbox.get(doc_ids=statuses.get("sending"))
+                if row["status"] == "sending" and (row["lease_until"] or "") < now
+            ]
+            error = "Interrupted while sending; it may have been delivered"
+            self._update_outbox(
+                {
+                    doc_id: {"status": "dead", "error": error, "lease_until": None}
+                    for doc_id in stale
+                }
+            )
+        return len(stale)
+
+    @_writes
+    def requeue_outbox(self, outbox_ids: Iterable[int]) -> int:
+        """
+        Send ``failed`` or ``dead`` messages again as soon as a worker is free.
+
+        Returns:
+            The number of messages requeued.
+        """
+        now = datetime.now().isoformat()
+        with self.transaction(durable=True):
+            rows = [
+                row
+                for row in self.outbox.get(doc_ids=list(outbox_ids))
+                if row["status"] in ("failed", "dead")
+            ]
+            self._update_outbox(
+                {
+                    row.doc_id: {
+                        "status": "queued",
+                        "attempts": 0,
+                        "next_attempt": now,
+                        "error": None,
+                    }
+                    for row in rows
+                }
+            )
+        return len(rows)
+
+    @_writes
+    def delete_outbox(self, outbox_ids: Iterable[int]) -> None:
+        """Drop messages from the outbox; ones being sent right now are kept."""
+        with self.transaction(durable=True):
+            rows = [
+                row
+                for row in self.outbox.get(doc_ids=list(outbox_ids))
+                if row["status"] != "sending"
+            ]
+            self.outbox.remove(doc_ids=[row.doc_id for row in rows])
+            self._count({("backlog", "outbox"): -_unsent(rows)})
+        for row in rows:
+            self._track(self.outbox, row.doc_id, None)
+            self._track_outbox(row.doc_id, None)
+
+    @_reads
+    def get_outbox(self, outbox_ids: list[int]) -> list[dict[str, Any]]:
+        """Return the given outbox rows, bodies included, in the order of ``outbox_ids``."""
+        by_id = {row.doc_id: row for row in self.outbox.get(doc_ids=outbox_ids)}
+        return [self._hydrate(by_id[i]) for i in outbox_ids if i in by_id]
+
+    @_reads
+    def count_outbox(self) -> dict[str, int]:
+        """Return the number of outbox messages in each of ``OUTBOX_STATUSES``."""
+        statuses, _ = self._outbox_index()
+        return {status: len(statuses.get(status)) for status in self.OUTBOX_STATUSES}
+
+    @_reads
+    def list_outbox(self, status: str, offset: int = 0, limit: int = 20) -> dict[str, Any]:
+        """
+        Page through the outbox messages with ``status``, most recently queued first.
+
+        Returns:
+            ``{"total": int, "items": [row, ...]}``, bodies included.
+        """
+        statuses, _ = self._outbox_index()
+        ids = sorted(statuses.get(status), reverse=True)
+        page = ids[offset : offset + limit]
+        by_id = {row.doc_id: row for row in self.outbox.get(doc_ids=page)}
+        return {"total": len(ids), "items": [self._hydrate(by_id[i]) for i in page if i in by_id]}
+
+    # Aggregates ---------------------------------------------------------------
+    # Dashboard figures live in the ``stats`` table as one {"metric", "key", "value"} row per
+    # counter, moved in the same transaction as the write being counted, so reading them never
+    # scans the history. Metrics: ``sent_day`` and ``failed_day`` (sends and failed attempts
+    # per ISO day), ``sent_to`` (sends per lower-cased address), ``totals`` (``sent`` and
+    # ``failed``), ``backlog`` (``schedules`` still due to go out and ``outbox`` messages not
+    # sent yet) and ``recent`` (``sends``, the latest few messages, newest first).
+    RECENT_SENDS = 10
+
+    def _stats_map(self) -> dict[tuple[str, str], Document]:
+        generation = self.storage.generation()
+        if self._stats is None or generation != self._stats_generation:
+            # First use, or another process (such as the scheduler) moved the counters.
+            self._stats = {(doc["metric"], doc["key"]): doc for doc in self.stats.all()}
+            self._stats_generation = generation
+        return self._stats
+
+    def _count(self, deltas: Mapping[tuple[str, str], int], recent: list[dict] = ()) -> None:
+        """Add ``deltas`` to the counters and merge ``recent`` sends into the recent list."""
+        stats = self._stats_map()
+        values = {name: _value(stats.get(name)) + delta for name, delta in deltas.items() if delta}
+        if recent:
+            previous = stats.get(("recent", "sends"))
+            sends = [*recent, *(previous["value"] if previous else [])]
+            values["recent", "sends"] = heapq.nlargest(self.RECENT_SENDS, sends, key=_sent_date)
+        new = []
+        for (metric, key), value in values.items():
+            row = {"metric": metric, "key": key, "value": value}
+            doc = stats.get((metric, key))
+            if doc is None:
+                new.append(row)
+            else:
+                self.stats.update({"value": value}, doc_ids=[doc.doc_id])
+                stats[metric, key] = Document(row, doc_id=doc.doc_id)
+        for doc_id, row in zip(self.stats.insert_multiple(new), new, strict=True):
+            stats[row["metric"], row["key"]] = Document(row, doc_id=doc_id)
+
+    def _count_sends(self, sends: Iterable[tuple[str, str, str, str]]) -> None:
+        """Count ``(sent_date, recipient, subject, status)`` send outcomes."""
+        deltas: Counter[tuple[str, str]] = Counter()
+        recent = []
+        for sent_date, recipient, subject, status in sends:
+            _tally(deltas, sent_date[:10], recipient, status)
+            if status == "sent":
+                recent.append(_recent(recipient, subject, sent_date))
+        self._count(deltas, recent)
+
+    @_writes
+    def rebuild_stats(self) -> dict[str, int]:
+        """
+        Recompute every aggregate from the sent emails, campaigns and schedules.
+
+        Only needed once for a database written before the aggregates existed (it runs on
+        open when the ``stats`` table is empty) or to repair counters after manual edits.
+        Campaign sends are counted on the campaign's ``sent_date``.
+
+        Returns:
+            The number of counters written.
+        """
+        deltas: Counter[tuple[str, str]] = Counter()
+        recent: list[dict[str, str]] = []
+        for chunk in iter_chunks(self.db.table("sent_emails")):
+            for email in chunk:
+                for recipient in email["recipients"]:
+                    _tally(deltas, email["sent_date"][:10], recipient, "sent")
+                    recent.append(_recent(recipient, email["subject"], email["sent_date"]))
+                recent = heapq.nlargest(self.RECENT_SENDS, recent, key=_sent_date)
+        for chunk in iter_chunks(self.db.table("campaigns")):
+            for campaign in chunk:
+                for recipient, subject, status in zip(
+                    campaign["recipients"], campaign["subjects"], campaign["statuses"], strict=True
+                ):
+                    _tally(deltas, campaign["sent_date"][:10], recipient, status)
+                    if status == "sent":
+                        recent.append(_recent(recipient, subject, campaign["sent_date"]))
+                recent = heapq.nlargest(self.RECENT_SENDS, recent, key=_sent_date)
+        deltas["backlog", "schedules"] = _waiting(self.schedules.all())
+        deltas["backlog", "outbox"] = _unsent(self.outbox.all())
+
+        rows = [{"metric": m, "key": k, "value": v} for (m, k), v in deltas.items() if v]
+        rows.append({"metric": "recent", "key": "sends", "value": recent})
+        with self.transaction():
+            self.stats.truncate()
+            self.stats.insert_multiple(rows)
+        self._stats = None
+        return len(rows)
+
+    @_reads
+    def get_stat(self, metric: str, key: str) -> Any:
+        """Return one counter, or 0 if nothing has been counted under it yet."""
+        return _value(self._stats_map().get((metric, key)))
+
+    @_reads
+    def get_daily_stats(self, start: date, end: date) -> list[dict[str, Any]]:
+        """Return ``{"day", "sent", "failed"}`` for every day from ``start`` to ``end``."""
+        stats = self._stats_map()
+        rows = []
+        for offset in range((end - start).days + 1):
+            day = date.fromordinal(start.toordinal() + offset).isoformat()
+            sent, failed = (stats.get((metric, day)) for metric in ("sent_day", "failed_day"))
+            rows.append({"day": day, "sent": _value(sent), "failed": _value(failed)})
+        return rows
+
+    @_reads
+    def get_totals(self) -> dict[str, Any]:
+        """
+        Return the all-time figures for the dashboard.
+
+        Returns:
+            ``{"sent", "failed", "failure_rate", "backlog", "outbox"}``, where ``failure_rate``
+            is the share of send attempts that failed, ``backlog`` counts schedules still to go
+            out and ``outbox`` the queued messages not sent or given up on yet.
+        """
+        stats = self._stats_map()
+        sent, failed, backlog, outbox = (
+            _value(stats.get(("totals", "sent"))),
+            _value(stats.get(("totals", "failed"))),
+            _value(stats.get(("backlog", "schedules"))),
+            _value(stats.get(("backlog", "outbox"))),
+        )
+        attempts = sent + failed
+        return {
+            "sent": sent,
+            "failed": failed,
+            "failure_rate": failed / attempts if attempts else 0.0,
+            "backlog": backlog,
+            "outbox": outbox,
+        }
+
+    @_reads
+    def get_top_recipients(self, limit: int = 10) -> list[tuple[str, int]]:
+        """Return the ``limit`` addresses sent to most, as ``(address, sends)`` pairs."""
+        stats = self._stats_map().items()
+        counts = (
+            (key, doc["value"])
+            for (metric, key), doc in stats
+            if metric == "sent_to" and doc["value"] > 0
+        )
+        return heapq.nlargest(limit, counts, key=lambda pair: pair[1])
+
+    @_reads
+    def get_recent_sends(self) -> list[dict[str, str]]:
+        """Return the latest sends as ``{"recipient", "subject", "sent_date"}``, newest first."""
+        doc = self._stats_map().get(("recent", "sends"))
+        return doc["value"] if doc else []
+
+    @_reads
+    def count_due_reminders(self, now: datetime | None = None) -> int:
+        """Number of reminders due at or before ``now``, from the reminder date index."""
+        return self._reminder_index().count(None, (now or datetime.now()).isoformat())
+
     # User profile -------------------------------------------------------------
+    @_writes
     def set_user_profile(
         self, name: str, title: str, degree: str, university: str, profession: str, social_media: dict[str, str], signature: str
     ) -> int:
@@ -122,10 +1464,12 @@ class DatabaseManager:
             }
         )
 
+    @_reads
     def get_user_profile(self) -> dict[str, Any] | None:
         profiles = self.user_profile.all()
         return profiles[0] if profiles else None
 
+    @_writes
     def update_user_profile(
         self, name: str, title: str, degree: str, university: str, profession: str, social_media: dict[str, str], signature: str
     ) -> None:
@@ -148,14 +1492,361 @@ class DatabaseManager:
                 name, title, degree, university, profession, social_media, signature
             )
 
+    @_writes
     def delete_user_profile(self) -> None:
         self.user_profile.truncate()
 
     # Search -------------------------------------------------------------------
+    SEARCH_KINDS = ("sent_email", "campaign", "profile", "template")
+
+    @staticmethod
+    def _search_fields(kind: str, doc: dict[str, Any]) -> list[str]:
+        if kind == "sent_email":
+            recipients = " ".join(doc.get("recipients", []))
+            return [recipients, doc.get("subject", ""), doc.get("body", "")]
+        if kind == "campaign":
+            # Personalized bodies mostly repeat each other; index each distinct one once.
+            bodies = dict.fromkeys(doc["bodies"])
+            return [" ".join(doc["recipients"]), *dict.fromkeys(doc["subjects"]), *bodies]
+        if kind == "profile":
+            return [doc["name"], doc["email"], doc["title"], doc["profession"]]
+        return [doc["name"], doc["body"]]
+
+    def _index(self, kind: str, doc_id: int, doc: dict[str, Any]) -> None:
+        with self._search_lock:
+            if self._search_index is not None:
+                self._search_index.add((kind, doc_id), self._search_fields(kind, doc))
+            if self._similarity_index is not None and kind in self.SIMILAR_KINDS:
+                self._similarity_index.add((kind, doc_id), *self._similarity_fields(kind, doc))
+
+    def _unindex(self, kind: str, doc_id: int) -> None:
+        with self._search_lock:
+            if self._search_index is not None:
+                self._search_index.remove((kind, doc_id))
+            if self._similarity_index is not None:
+                self._similarity_index.remove((kind, doc_id))
+
+    def _get_search_index(self) -> InvertedIndex:
+        # Callers hold self._search_lock.
+        if self._search_index is None:
+            index = InvertedIndex()
+            for kind, table in (
+                ("sent_email", self.sent_emails),
+                ("campaign", self.campaigns),
+                ("profile", self.profiles),
+                ("template", self.templates),
+            ):
+                for doc in table.all():
+                    if kind == "sent_email":
+                        self._hydrate(doc)
+                    elif kind == "campaign":
+                        self._hydrate_campaign(doc)
+                    index.add((kind, doc.doc_id), self._search_fields(kind, doc))
+            self._search_index = index
+        return self._search_index
+
+    @_reads
+    def search(
+        self,
+        query: str,
+        kinds: tuple[str, ...] | list[str] | None = None,
+        offset: int = 0,
+        limit: int = 20,
+    ) -> dict[str, Any]:
+        """
+        Full-text search over sent emails, campaigns, profiles and templates, ranked by BM25.
+
+        Every query word must match, and each word also matches longer words it is a prefix of.
+
+        Returns:
+            ``{"total": int, "hits": [{"kind", "score", "doc"}, ...]}`` for the requested page.
+        """
+        tables = {
+            "sent_email": self.sent_emails,
+            "campaign": self.campaigns,
+            "profile": self.profiles,
+            "template": self.templates,
+        }
+        wanted = set(kinds or self.SEARCH_KINDS)
+        where = None if wanted >= set(self.SEARCH_KINDS) else (lambda key: key[0] in wanted)
+        with self._search_lock:
+            page = self._get_search_index().search(query, offset=offset, limit=limit, where=where)
+        hits = []
+        for (kind, doc_id), score in page.hits:
+            doc = tables[kind].get(doc_id=doc_id)
+            if kind == "sent_email":
+                self._hydrate(doc)
+            elif kind == "campaign":
+                self._hydrate_campaign(doc)
+            if doc is not None:
+                hits.append({"kind": kind, "score": score, "doc": doc})
+        return {"total": page.total, "hits": hits}
+
+    # Similarity ---------------------------------------------------------------
+    SIMILAR_KINDS = ("sent_email", "campaign", "template")
+
+    @staticmethod
+    def _similarity_fields(kind: str, doc: dict[str, Any]) -> tuple[str, str, datetime | None]:
+        """The text, kind and date that ``similar()`` indexes for one document."""
+        if kind == "sent_email":
+            recipients = doc.get("recipients", [])
+            text = " ".join([*recipients, doc.get("subject", ""), doc.get("body", "")])
+        elif kind == "campaign":
+            # The first few distinct subjects and bodies stand for the whole batch.
+            text = " ".join(
+                [
+                    *doc["recipients"],
+                    similarity_text(doc["subjects"]),
+                    similarity_text(doc["bodies"]),
+                ]
+            )
+        else:
+            return f"{doc['name']} {doc['body']}", kind, None
+        return text, kind, datetime.fromisoformat(doc["sent_date"])
+
+    def _get_similarity_index(self) -> VectorIndex:
+        # Callers hold self._search_lock.
+        if self._similarity_index is None:
+            index = VectorIndex()
+            for kind, table in (
+                ("sent_email", self.sent_emails),
+                ("campaign", self.campaigns),
+                ("template", self.templates),
+            ):
+                for doc in table.all():
+                    if kind == "sent_email":
+                        self._hydrate(doc)
+                    elif kind == "campaign":
+                        self._hydrate_campaign(doc)
+                    index.add((kind, doc.doc_id), *self._similarity_fields(kind, doc))
+            self._similarity_index = index
+        return self._similarity_index
+
+    @_reads
+    def similar(
+        self,
+        query: str,
+        kinds: tuple[str, ...] | list[str] | None = None,
+        k: int = 5,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        min_score: float = 0.0,
+    ) -> list[dict[str, Any]]:
+        """
+        Find the sent emails, campaigns and templates most similar to ``query``.
+
+        Unlike ``search``, not every word has to match: documents are ranked by the cosine
+        similarity of hashed TF-IDF vectors, so loosely worded questions still find something.
+
+        Args:
+            query: Free text, e.g. "charles invoice" or "follow-up after a meeting".
+            kinds: Any of ``SIMILAR_KINDS``; ``None`` for all of them.
+            k: Maximum number of results.
+            start: Only emails and campaigns sent at or after this time.
+            end: Only emails and campaigns sent before this time.
+            min_score: Drop weaker matches; hashing makes scores under ~0.1 mostly noise.
+
+        Returns:
+            ``[{"kind", "score", "doc"}, ...]``, most similar first.
+        """
+        tables = {
+            "sent_email": self.sent_emails,
+            "campaign": self.campaigns,
+            "template": self.templates,
+        }
+        with self._search_lock:
+            hits = self._get_similarity_index().search(query, k, kinds, start, end, min_score)
+        results = []
+        for (kind, doc_id), score in hits:
+            doc = tables[kind].get(doc_id=doc_id)
+            if kind == "sent_email":
+                self._hydrate(doc)
+            elif kind == "campaign":
+                self._hydrate_campaign(doc)
+            if doc is not None:
+                results.append({"kind": kind, "score": score, "doc": doc})
+        return results
+
+    @_reads
     def search_sent_emails(self, query: str) -> list[dict[str, Any]]:
-        Email = Query()
-        return self.sent_emails.search(
-            (Email.recipients.search(query))
-            | (Email.subject.search(query))
-            | (Email.body.search(query))
-        )
+        """
+        Every sent email matching ``query``, best match first.
+
+        Messages sent as part of a campaign come back one per recipient, shaped like
+        ``sent_emails`` rows plus ``campaign_id``. A campaign contributes only its sent messages
+        whose own recipient, subject and body match every query word.
+        """
+        with self._search_lock:
+            index = self._get_search_index()
+            page = index.search(
+                query, limit=len(index), where=lambda key: key[0] in ("sent_email", "campaign")
+            )
+        terms = tokenize(query)
+        results = []
+        for (kind, doc_id), _ in page.hits:
+            if kind == "sent_email":
+                results.append(self._hydrate(self.sent_emails.get(doc_id=doc_id)))
+                continue
+            campaign = self._hydrate_campaign(self.campaigns.get(doc_id=doc_id))
+            if campaign is None:
+                continue
+            for recipient, subject, body, status in zip(
+                campaign["recipients"],
+                campaign["subjects"],
+                campaign["bodies"],
+                campaign["statuses"],
+                strict=True,
+            ):
+                words = tokenize(f"{recipient} {subject} {body}")
+                if status == "sent" and all(
+                    any(word.startswith(term) for word in words) for term in terms
+                ):
+                    results.append(
+                        {
+                            "recipients": [recipient],
+                            "subject": subject,
+                            "body": body,
+                            "sent_date": campaign["sent_date"],
+                            "campaign_id": doc_id,
+                        }
+                    )
+        return results
+
+
+def _move_body_to(body_hash: str) -> Callable[[dict[str, Any]], None]:
+    def transform(doc: dict[str, Any]) -> None:
+        doc.pop("body", None)
+        doc["body_hash"] = body_hash
+
+    return transform
+
+
+class _VersionedTable:
+    """A storage table that calls ``on_write`` after every insert, update or removal."""
+
+    __slots__ = ("_table", "_on_write")
+
+    def __init__(self, table: Any, on_write: Callable[[], None]) -> None:
+        self._table = table
+        self._on_write = on_write
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._table, name)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __iter__(self) -> Iterator[Document]:
+        return iter(self._table)
+
+    def _write(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        try:
+            return getattr(self._table, method)(*args, **kwargs)
+        finally:
+            self._on_write()
+
+    def insert(self, *args: Any, **kwargs: Any) -> int:
+        return self._write("insert", *args, **kwargs)
+
+    def insert_multiple(self, *args: Any, **kwargs: Any) -> list[int]:
+        return self._write("insert_multiple", *args, **kwargs)
+
+    def update(self, *args: Any, **kwargs: Any) -> list[int]:
+        return self._write("update", *args, **kwargs)
+
+    def remove(self, *args: Any, **kwargs: Any) -> list[int]:
+        return self._write("remove", *args, **kwargs)
+
+    def truncate(self) -> None:
+        return self._write("truncate")
+
+
+def _set_recipient_statuses(
+    statuses: Mapping[str, str], errors: Mapping[str, str | None]
+) -> Callable[[dict[str, Any]], None]:
+    def transform(doc: dict[str, Any]) -> None:
+        for i, recipient in enumerate(doc["recipients"]):
+            if recipient in statuses:
+                doc["statuses"][i] = statuses[recipient]
+        for recipient, error in errors.items():
+            if error:
+                doc["errors"][recipient] = error
+            else:
+                doc["errors"].pop(recipient, None)
+
+    return transform
+
+
+def _tally(deltas: Counter, day: str, recipient: str, status: str) -> None:
+    """Count one send outcome into the ``stats`` metrics."""
+    if status == "sent":
+        deltas["sent_day", day] += 1
+        deltas["sent_to", recipient.strip().lower()] += 1
+        deltas["totals", "sent"] += 1
+    elif status == "failed":
+        deltas["failed_day", day] += 1
+        deltas["totals", "failed"] += 1
+
+
+def _outbox_key(
+    campaign_id: int | None,
+    recipient: str,
+    subject: str,
+    body_hash: str,
+    attachment_digests: Sequence[str] = (),
+) -> str:
+    text = f"{campaign_id}\0{recipient.strip().lower()}\0{subject}\0{body_hash}"
+    if attachment_digests:
+        # Appended only when present, so keys of messages without attachments are unchanged.
+        text += "\0" + "\0".join(attachment_digests)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _take_turns(rows: list[Document], limit: int) -> list[Document]:
+    """Up to ``limit`` of ``rows``, oldest first within each recipient domain, domains in turn."""
+    by_domain: dict[str, list[Document]] = {}
+    for row in sorted(rows, key=lambda row: (row["next_attempt"], row.doc_id)):
+        by_domain.setdefault(row["recipient"].rpartition("@")[2].lower(), []).append(row)
+    turns = itertools.chain.from_iterable(itertools.zip_longest(*by_domain.values()))
+    return [row for row in turns if row is not None][:limit]
+
+
+def _unsent(rows: Iterable[Mapping[str, Any]]) -> int:
+    """How many of the outbox ``rows`` have not been sent or given up on yet."""
+    return sum(row["status"] in UNSENT_STATUSES for row in rows)
+
+
+def _waiting(schedules: Iterable[Mapping[str, Any]]) -> int:
+    """How many of ``schedules`` are still due to go out."""
+    return sum(schedule.get("status") in DISPATCHABLE_STATUSES for schedule in schedules)
+
+
+def _value(doc: Mapping[str, Any] | None) -> Any:
+    return doc["value"] if doc else 0
+
+
+def _recent(recipient: str, subject: str, sent_date: str) -> dict[str, str]:
+    return {"recipient": recipient, "subject": subject, "sent_date": sent_date}
+
+
+def _sent_date(send: dict[str, str]) -> str:
+    return send["sent_date"]
+
+
+_shared: dict[str, DatabaseManager] = {}
+_shared_lock = threading.Lock()
+
+
+def get_database(db_path: str | None = None) -> DatabaseManager:
+    """
+    Return the process-wide ``DatabaseManager`` for ``db_path``, opening it on first use.
+
+    Pages call this instead of constructing their own manager, so the database file is opened
+    and parsed once per process and every session writes through the same locked instance.
+    """
+    db_path = db_path or os.getenv("EMAIL_DB_PATH", "email_manager.json")
+    key = os.path.abspath(db_path)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = DatabaseManager(db_path)
+        return _shared[key]
@@ -1,46 +1,55 @@
 from __future__ import annotations
 
-import os
 from collections.abc import Iterable, Sequence
 
-import yagmail
 from loguru import logger
 
+from utils.bulk_send import domain_key, get_send_limits, wait_for
+from utils.smtp_pool import SMTPPool, get_smtp_pool
+
+# Longest a single send waits for the sending limits before giving up.
+MAX_WAIT = 60.0
+
 
 def send_email(
     to: str | Sequence[str],
     subject: str,
     contents: str | Iterable[str],
     attachments: str | Sequence[str] | None = None,
+    pool: SMTPPool | None = None,
+    per_domain_rate: float | None = 2.0,
 ) -> bool:
     """
-    Send an email using yagmail, with sender credentials from environment variables.
+    Send an email over a pooled, persistent SMTP connection.
+
+    The send waits its turn under the sender account's and the recipients' domain limits (see
+    ``utils.bulk_send.get_send_limits``), shared with bulk sends from the same process.
 
     Args:
         to: Recipient email or list of emails.
         subject: Email subject.
         contents: Email body or iterable of parts supported by yagmail.
         attachments: Optional file path or list of file paths to attach.
+        pool: Optional SMTP pool to send through. Defaults to the shared pool built from
+            the EMAIL_SENDER / EMAIL_PASSWORD environment variables.
+        per_domain_rate: Messages per second to a recipient domain without its own quota.
 
     Returns:
         True if the email was sent successfully, False otherwise.
     """
-    sender_email = os.getenv("EMAIL_SENDER")
-    sender_password = os.getenv("EMAIL_PASSWORD")
-
-    if not sender_email or not sender_password:
+    pool = pool or get_smtp_pool()
+    if pool is None:
         logger.error("Sender email or password not found in environment variables")
         return False
 
-    yag = None
+    account, domains = get_send_limits(pool, per_domain_rate)
     try:
-        yag = yagmail.SMTP(sender_email, sender_password)
-        yag.send(to=to, subject=subject, contents=contents, attachments=attachments)
+        recipients = [to] if isinstance(to, str) else to
+        limits = [(account, pool.user), *((domains, domain_key(a)) for a in recipients)]
+        wait_for(limits, MAX_WAIT)
+        pool.send(to=to, subject=subject, contents=contents, attachments=attachments)
         logger.success("Email sent successfully")
         return True
     except Exception as exc:
         logger.error(f"An error occurred while sending the email: {exc}")
         return False
-    finally:
-        if yag is not None:
-            yag.close()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import bisect
+from collections.abc import Hashable, Iterable, Mapping
+from typing import Any
+
+
+class SortedIndex:
+    """
+    Secondary index keeping ``(key, doc_id)`` pairs in key order.
+
+    Range lookups are two binary searches and a slice, and inserts and removals keep the order
+    with ``bisect``, so the index is maintained in place as documents change. Keys must be
+    mutually comparable; ISO-8601 date strings work as-is.
+    """
+
+    def __init__(self, entries: Iterable[tuple[Hashable, int]] = ()) -> None:
+        self._keys: dict[int, Hashable] = {doc_id: key for key, doc_id in entries}
+        self._entries = sorted((key, doc_id) for doc_id, key in self._keys.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: Hashable, doc_id: int) -> None:
+        """Index ``doc_id`` under ``key``, replacing any key it had before."""
+        self.remove(doc_id)
+        self._keys[doc_id] = key
+        bisect.insort(self._entries, (key, doc_id))
+
+    def remove(self, doc_id: int) -> None:
+        key = self._keys.pop(doc_id, None)
+        if key is None:
+            return
+        position = bisect.bisect_left(self._entries, (key, doc_id))
+        del self._entries[position]
+
+    def _bounds(self, start: Hashable | None, end: Hashable | None) -> tuple[int, int]:
+        lo = 0 if start is None else bisect.bisect_left(self._entries, (start,))
+        # (end, inf) sorts after every (end, doc_id), so the end key is inclusive.
+        hi = len(self._entries)
+        if end is not None:
+            hi = bisect.bisect_right(self._entries, (end, float("inf")))
+        return lo, max(lo, hi)
+
+    def count(self, start: Hashable | None = None, end: Hashable | None = None) -> int:
+        """Number of documents with ``start <= key <= end``; ``None`` leaves a side open."""
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def range(
+        self,
+        start: Hashable | None = None,
+        end: Hashable | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+    ) -> list[int]:
+        """Doc ids with ``start <= key <= end`` in key order, sliced by ``offset``/``limit``."""
+        lo, hi = self._bounds(start, end)
+        lo += offset
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [doc_id for _, doc_id in self._entries[lo:hi]]
+
+
+class HashIndex:
+    """
+    Non-unique hash index from a key to the ids of the documents that hold it.
+
+    ``add`` moves a document to a new key and ``remove`` forgets it, so the index is kept
+    current on every write instead of being rebuilt.
+    """
+
+    def __init__(self, entries: Iterable[tuple[Hashable, int]] = ()) -> None:
+        self._keys: dict[int, Hashable] = {}
+        self._ids: dict[Hashable, dict[int, None]] = {}  # dicts keep insertion order
+        for key, doc_id in entries:
+            self.add(key, doc_id)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Hashable, doc_id: int) -> None:
+        """Index ``doc_id`` under ``key``, replacing any key it had before."""
+        self.remove(doc_id)
+        self._keys[doc_id] = key
+        self._ids.setdefault(key, {})[doc_id] = None
+
+    def remove(self, doc_id: int) -> None:
+        if doc_id not in self._keys:
+            return
+        key = self._keys.pop(doc_id)
+        ids = self._ids[key]
+        del ids[doc_id]
+        if not ids:
+            del self._ids[key]
+
+    def get(self, key: Hashable) -> list[int]:
+        return list(self._ids.get(key, ()))
+
+
+class ListingIndex:
+    """
+    Sorted, filterable snapshot of a table for paging through it.
+
+    Orders are computed per sort field on first use and filtered id lists for recent filters
+    are kept, so moving between pages of the same listing is a slice. The owner discards the
+    whole object after a write to the table.
+    """
+
+    def __init__(
+        self, docs: Iterable[Mapping[str, Any]], fields: tuple[str, ...], cache_size: int = 16
+    ) -> None:
+        self.docs = {doc.doc_id: doc for doc in docs}
+        self.fields = fields
+        self.cache_size = cache_size
+        # Lower-cased text of the filterable fields, one string per document.
+        self._text = {
+            doc_id: "\n".join(str(doc.get(field) or "") for field in fields).lower()
+            for doc_id, doc in self.docs.items()
+        }
+        self._orders: dict[str, list[int]] = {}
+        self._filtered: dict[tuple[str, str], list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _order(self, field: str) -> list[int]:
+        order = self._orders.get(field)
+        if order is None:
+            if field == "id":
+                order = sorted(self.docs)
+            else:
+                order = sorted(
+                    self.docs,
+                    key=lambda doc_id: (str(self.docs[doc_id].get(field) or "").lower(), doc_id),
+                )
+            self._orders[field] = order
+        return order
+
+    def page(
+        self, sort: str = "id", text: str = "", offset: int = 0, limit: int = 20
+    ) -> tuple[int, list[Mapping[str, Any]]]:
+        """
+        Return the number of matches and one page of documents.
+
+        ``sort`` is a field name, or ``id``, optionally prefixed with ``-`` for descending
+        order; ``text`` keeps documents containing it in any of the indexed fields.
+        """
+        descending = sort.startswith("-")
+        field = sort.lstrip("-")
+        if field != "id" and field not in self.fields:
+            raise ValueError(f"Cannot sort by {field!r}")
+        needle = text.strip().lower()
+
+        ids = self._filtered.get((field, needle))
+        if ids is None:
+            ids = self._order(field)
+            if needle:
+                ids = [doc_id for doc_id in ids if needle in self._text[doc_id]]
+                if len(self._filtered) >= self.cache_size:
+                    self._filtered.pop(next(iter(self._filtered)))
+                self._filtered[(field, needle)] = ids
+        if descending:
+            end = max(len(ids) - offset, 0)
+            window = ids[max(end - limit, 0) : end][::-1]
+        else:
+            window = ids[offset : offset + limit]
+        return len(ids), [self.docs[doc_id] for doc_id in window]
@@ -0,0 +1,201 @@
+"""
+Accuracy and latency checks for the chatbot intent matcher.
+
+Run from the ``src`` directory::
+
+    python -m utils.intent_eval              # accuracy on EVAL_SET, then the benchmark
+    python -m utils.intent_eval --json       # the same as one JSON document
+
+Accuracy is measured on ``EVAL_SET``; add a labelled prompt there with every new keyword or
+intent. The benchmark times ``classify`` on the same prompts, then compiles matchers with
+hundreds and thousands of extra synthetic intents to show the latency stays flat. It also
+times the old chain of substring checks, which grows linearly with the number of intents.
+The exit code is non-zero when accuracy drops below ``--min-accuracy``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from utils.intents import CHATBOT_INTENTS, FALLBACK_INTENT, Intent, IntentMatcher, classify
+
+# (prompt, expected intent). Includes near misses that substring matching got wrong.
+EVAL_SET: tuple[tuple[str, str], ...] = (
+    ("hello", "greeting"),
+    ("Hi there!", "greeting"),
+    ("hey", "greeting"),
+    ("good morning", "greeting"),
+    ("this is great", FALLBACK_INTENT),
+    ("I think so", FALLBACK_INTENT),
+    ("which one", FALLBACK_INTENT),
+    ("asdf qwerty", FALLBACK_INTENT),
+    ("", FALLBACK_INTENT),
+    ("compose an email", "compose"),
+    ("help me write an email to my boss", "compose"),
+    ("draft a follow-up", "compose"),
+    ("can you write something for a client?", "compose"),
+    ("hi, could you help me write an email?", "compose"),
+    ("write", "compose"),
+    ("show my templates", "templates"),
+    ("what templates do I have", "templates"),
+    ("create a template for birthdays", "templates"),
+    ("edit template", "templates"),
+    ("list my contacts", "recipients"),
+    ("who are my recipients?", "recipients"),
+    ("open the address book", "recipients"),
+    ("how many contacts do I have", "recipients"),
+    ("send an email", "send"),
+    ("schedule a message for tomorrow", "send"),
+    ("set a reminder", "send"),
+    ("remind me next week", "send"),
+    ("how do I send emails later?", "send"),
+    ("which template should I use for a thank-you note?", "suggest_template"),
+    ("suggest a template for a meeting follow-up", "suggest_template"),
+    ("recommend something similar to my invoice reminder", "suggest_template"),
+    ("what did I send to Charles last week?", "history"),
+    ("show my sent emails", "history"),
+    ("emails I sent yesterday", "history"),
+    ("find the invoice I sent last month", "history"),
+    ("search for the invoice", "search"),
+    ("find an old message", "search"),
+    ("look up John", "search"),
+    ("open the dashboard", "dashboard"),
+    ("show me the stats", "dashboard"),
+    ("sending metrics", "dashboard"),
+    ("change my signature", "user_profile"),
+    ("update my profile", "user_profile"),
+    ("settings", "user_profile"),
+    ("help", "help"),
+    ("what can you do?", "help"),
+    ("list commands", "help"),
+    ("thanks!", "thanks"),
+    ("thank you so much", "thanks"),
+    ("cheers", "thanks"),
+    ("bye", "goodbye"),
+    ("goodbye for now", "goodbye"),
+    ("see you tomorrow", "goodbye"),
+    ("talk later", "goodbye"),
+)
+
+
+def evaluate(
+    classify_fn: Callable[[str], Any] = classify,
+    samples: Sequence[tuple[str, str]] = EVAL_SET,
+) -> dict[str, Any]:
+    """
+    Classify every sample and compare with its label.
+
+    Returns:
+        ``{"accuracy", "total", "errors": [{"prompt", "expected", "got", "confidence"}]}``.
+    """
+    errors = []
+    for prompt, expected in samples:
+        match = classify_fn(prompt)
+        if match.intent != expected:
+            errors.append(
+                {
+                    "prompt": prompt,
+                    "expected": expected,
+                    "got": match.intent,
+                    "confidence": round(match.confidence, 3),
+                }
+            )
+    total = len(samples)
+    return {"accuracy": (total - len(errors)) / total, "total": total, "errors": errors}
+
+
+def synthetic_intents(count: int) -> list[Intent]:
+    """``count`` extra intents with made-up keywords and phrases that never match real prompts."""
+    return [
+        Intent(f"synthetic{i}", keywords=(f"kw{i}a", f"kw{i}b"), phrases=(f"ph{i} word{i}",))
+        for i in range(count)
+    ]
+
+
+def _substring_chain(intents: Sequence[Intent]) -> Callable[[str], str]:
+    # The shape of the old generate_response: check each intent's words in turn.
+    words = [(intent.name, intent.keywords + intent.phrases) for intent in intents]
+
+    def match(prompt: str) -> str:
+        prompt = prompt.lower()
+        for name, keywords in words:
+            if any(word in prompt for word in keywords):
+                return name
+        return FALLBACK_INTENT
+
+    return match
+
+
+def _time_per_call(fn: Callable[[str], Any], prompts: Sequence[str], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for prompt in prompts:
+            fn(prompt)
+    return (time.perf_counter() - start) / (rounds * len(prompts))
+
+
+def benchmark(sizes: Sequence[int] = (0, 100, 1000, 10000), rounds: int = 50) -> list[dict]:
+    """
+    Time compiled matching against the substring chain with extra synthetic intents.
+
+    Returns:
+        One ``{"intents", "compile_ms", "matcher_us", "substring_us"}`` row per size, with
+        per-prompt times in microseconds.
+    """
+    prompts = [prompt for prompt, _ in EVAL_SET]
+    rows = []
+    for extra in sizes:
+        intents = [*CHATBOT_INTENTS, *synthetic_intents(extra)]
+        start = time.perf_counter()
+        matcher = IntentMatcher(intents)
+        compile_ms = (time.perf_counter() - start) * 1000
+        rows.append(
+            {
+                "intents": len(intents),
+                "compile_ms": round(compile_ms, 2),
+                "matcher_us": round(_time_per_call(matcher.classify, prompts, rounds) * 1e6, 2),
+                "substring_us": round(
+                    _time_per_call(_substring_chain(intents), prompts, rounds) * 1e6, 2
+                ),
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Check chatbot intent accuracy and latency.")
+    parser.add_argument("--json", action="store_true", help="Print one JSON document.")
+    parser.add_argument("--rounds", type=int, default=50, help="Benchmark passes over the set.")
+    parser.add_argument("--min-accuracy", type=float, default=0.95)
+    parser.add_argument("--no-benchmark", action="store_true", help="Only measure accuracy.")
+    args = parser.parse_args(argv)
+
+    report = evaluate()
+    rows = [] if args.no_benchmark else benchmark(rounds=args.rounds)
+    if args.json:
+        print(json.dumps({"accuracy": report, "benchmark": rows}, indent=2))
+    else:
+        print(f"Accuracy: {report['accuracy']:.1%} of {report['total']} prompts")
+        for error in report["errors"]:
+            print(
+                f"  {error['prompt']!r}: expected {error['expected']}, got {error['got']} "
+                f"({error['confidence']:.0%})"
+            )
+        if rows:
+            print(f"\n{'intents':>8} {'compile ms':>11} {'matcher µs':>11} {'substring µs':>13}")
+            for row in rows:
+                print(
+                    f"{row['intents']:>8} {row['compile_ms']:>11} {row['matcher_us']:>11} "
+                    f"{row['substring_us']:>13}"
+                )
+    if report["accuracy"] < args.min_accuracy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
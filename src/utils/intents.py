@@ -0,0 +1,184 @@
+"""
+Intent classification for the keyword chatbot.
+
+Prompts are split by the same tokenizer as the search index, so "this" never matches "hi".
+Each intent lists keywords (single tokens) and phrases (token sequences). At construction
+the keywords go into one hash map from token to intents, and the phrases into a token trie.
+Classifying a prompt is then one map lookup and one trie walk per token, so the cost grows
+with the prompt length and not with the number of intents.
+
+Phrases count double, so "create a template" is about templates rather than composing.
+An intent scores the sum of its matched weights, each keyword counted once. Confidence is the
+winner's share of the total score. Prompts that match nothing, or too weakly, get the
+fallback intent. Check accuracy and latency with ``python -m utils.intent_eval``.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from utils.search_index import tokenize
+
+FALLBACK_INTENT = "unknown"
+PHRASE_WEIGHT = 2.0
+
+
+@dataclass(frozen=True)
+class Intent:
+    """A named intent with the words that signal it; ``weight`` scales all of them."""
+
+    name: str
+    keywords: tuple[str, ...] = ()
+    phrases: tuple[str, ...] = ()
+    weight: float = 1.0
+
+
+@dataclass
+class IntentMatch:
+    """The classified intent, its confidence in [0, 1] and the score of every candidate."""
+
+    intent: str
+    confidence: float
+    scores: dict[str, float] = field(default_factory=dict)
+
+
+class _TrieNode:
+    __slots__ = ("children", "intents")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.intents: list[tuple[str, float]] = []
+
+
+class IntentMatcher:
+    """
+    Keyword and phrase matcher compiled once from a list of intents.
+
+    Earlier intents win ties. ``threshold`` is the minimum score for a match.
+    """
+
+    def __init__(
+        self,
+        intents: Iterable[Intent],
+        threshold: float = 0.5,
+        fallback: str = FALLBACK_INTENT,
+    ) -> None:
+        self.threshold = threshold
+        self.fallback = fallback
+        self._priority: dict[str, int] = {}
+        self._keywords: dict[str, list[tuple[str, float]]] = {}
+        self._phrases = _TrieNode()
+        for intent in intents:
+            self._priority.setdefault(intent.name, len(self._priority))
+            for keyword in intent.keywords:
+                for token in tokenize(keyword):
+                    self._keywords.setdefault(token, []).append((intent.name, intent.weight))
+            for phrase in intent.phrases:
+                node = self._phrases
+                for token in tokenize(phrase):
+                    node = node.children.setdefault(token, _TrieNode())
+                node.intents.append((intent.name, intent.weight * PHRASE_WEIGHT))
+
+    @property
+    def intents(self) -> list[str]:
+        return list(self._priority)
+
+    def scores(self, text: str) -> dict[str, float]:
+        """Score every intent with at least one keyword or phrase in ``text``."""
+        tokens = tokenize(text)
+        scores: dict[str, float] = {}
+        for token in dict.fromkeys(tokens):
+            for name, weight in self._keywords.get(token, ()):
+                scores[name] = scores.get(name, 0.0) + weight
+        for start, token in enumerate(tokens):
+            node = self._phrases.children.get(token)
+            position = start + 1
+            while node is not None:
+                for name, weight in node.intents:
+                    scores[name] = scores.get(name, 0.0) + weight
+                if position == len(tokens):
+                    break
+                node = node.children.get(tokens[position])
+                position += 1
+        return scores
+
+    def classify(self, text: str) -> IntentMatch:
+        scores = self.scores(text)
+        if not scores:
+            return IntentMatch(self.fallback, 0.0, scores)
+        best = min(scores, key=lambda name: (-scores[name], self._priority[name]))
+        if scores[best] < self.threshold:
+            return IntentMatch(self.fallback, 0.0, scores)
+        return IntentMatch(best, scores[best] / sum(scores.values()), scores)
+
+
+# Intents of the email chatbot, most specific first so they win ties. Small talk weighs less,
+# so "hi, help me write an email" is about composing.
+CHATBOT_INTENTS = (
+    Intent(
+        "suggest_template",
+        keywords=("suggest", "recommend", "similar"),
+        phrases=("which template", "best template", "suggest a template", "template for this"),
+    ),
+    Intent(
+        "history",
+        keywords=("sent", "history", "previous", "earlier", "yesterday"),
+        phrases=("did i send", "i sent", "sent emails", "last week", "last month", "past week"),
+    ),
+    Intent(
+        "templates",
+        keywords=("template", "templates"),
+        phrases=("create a template", "new template", "edit template", "my templates"),
+    ),
+    Intent(
+        "compose",
+        keywords=("compose", "write", "draft", "create"),
+        phrases=("help me write", "write an email", "new email"),
+    ),
+    Intent(
+        "recipients",
+        keywords=("recipient", "recipients", "contact", "contacts", "people", "who"),
+        phrases=("address book", "my contacts"),
+    ),
+    Intent(
+        "send",
+        keywords=("send", "schedule", "scheduled", "reminder", "reminders", "remind"),
+        phrases=("send later", "set a reminder"),
+    ),
+    Intent("search", keywords=("search", "find", "lookup"), phrases=("look up", "look for")),
+    Intent(
+        "dashboard",
+        keywords=("dashboard", "stats", "statistics", "metrics", "analytics", "report"),
+    ),
+    Intent(
+        "user_profile",
+        keywords=("signature", "settings", "profile"),
+        phrases=("my profile", "my signature", "my details"),
+    ),
+    Intent(
+        "help",
+        keywords=("help", "commands", "capabilities", "features"),
+        phrases=("what can you do", "what do you do"),
+    ),
+    Intent(
+        "greeting",
+        keywords=("hello", "hi", "hey", "greetings", "hiya"),
+        phrases=("good morning", "good afternoon", "good evening"),
+        weight=0.5,
+    ),
+    Intent("thanks", keywords=("thank", "thanks", "thx", "cheers"), weight=0.5),
+    Intent(
+        "goodbye",
+        keywords=("bye", "goodbye", "farewell"),
+        phrases=("see you", "talk later"),
+        weight=0.5,
+    ),
+)
+
+_matcher = IntentMatcher(CHATBOT_INTENTS)
+
+
+def classify(text: str) -> IntentMatch:
+    """Classify a chatbot prompt with the matcher compiled from ``CHATBOT_INTENTS``."""
+    return _matcher.classify(text)
@@ -0,0 +1,308 @@
+"""
+Optional LLM backend for the email chatbot.
+
+Any server that speaks the OpenAI chat completions API can be used. Set ``OPENAI_API_KEY``,
+and ``OPENAI_BASE_URL`` for a server other than OpenAI's; ``EMAIL_CHATBOT_MODEL`` picks the
+model. Without a key the chatbot keeps its keyword replies.
+
+Replies are streamed chunk by chunk. Each complete reply is cached in memory (LRU) and on disk
+under ``EMAIL_CHATBOT_CACHE_DIR``. The cache key is the model, the normalized prompt, the recent
+conversation, the context and the version of the tables behind it, so after the data changes the
+same question goes back to the model.
+
+The model never sees the whole address book. ``build_context`` sends counts, a profession
+breakdown, template names and the sender's details, and ``relevant_records`` adds the few
+profiles and templates that match words in the prompt. To try it offline, start the stub
+server from ``utils.llm_stub`` and point ``OPENAI_BASE_URL`` at it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Iterator, Mapping, Sequence
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+_ENV_MODEL = "EMAIL_CHATBOT_MODEL"
+_ENV_CACHE_DIR = "EMAIL_CHATBOT_CACHE_DIR"
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_CACHE_DIR = ".chatbot_cache"
+
+# Earlier messages sent along with each prompt.
+HISTORY_MESSAGES = 6
+# Tables the context is built from; a write to any of them rebuilds it.
+CONTEXT_TABLES = ("profiles", "templates", "user_profile")
+
+SYSTEM_PROMPT = (
+    "You are the assistant inside an email management app. The app has pages for Profiles "
+    "(contacts), Email Templates, Send Emails (send now, schedule or add a reminder), "
+    "Reminders, Schedules, Search, Dashboard and User Profile. Help the user write emails and "
+    "use the app. Base answers about their data only on the context below, and be concise."
+)
+
+_WORD_RE = re.compile(r"[a-z0-9@.\-_]{3,}")
+_STOP_WORDS = frozenset(
+    {"the", "and", "for", "with", "about", "that", "this", "what", "which", "who", "how"}
+    | {"can", "you", "your", "email", "emails", "write", "draft", "send", "please", "want"}
+    | {"need", "some", "from", "into"}
+)
+
+
+def is_configured() -> bool:
+    """Whether an API key is set, so the LLM mode can be offered."""
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation, for cache keys."""
+    return " ".join(prompt.lower().split()).rstrip("?!. ")
+
+
+class ResponseCache:
+    """
+    Complete replies by key, in an in-memory LRU backed by one JSON file per key on disk.
+
+    The disk layer survives restarts and is shared by processes that use the same directory;
+    ``directory=None`` keeps the cache in memory only.
+    """
+
+    def __init__(self, directory: str | Path | None = None, maxsize: int = 256) -> None:
+        self.directory = Path(directory) if directory else None
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+        text = self._read(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._remember(key, text)
+        if self.directory is not None:
+            self._write(key, text)
+
+    def _remember(self, key: str, text: str) -> None:
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _read(self, key: str) -> str | None:
+        if self.directory is None:
+            return None
+        try:
+            return json.loads(self._path(key).read_text(encoding="utf-8"))["response"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Ignoring unreadable chatbot cache entry {key}: {exc}")
+            return None
+
+    def _write(self, key: str, text: str) -> None:
+        # Write to a temporary file and rename it, so readers never see a partial entry.
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump({"response": text}, handle)
+            os.replace(tmp_path, self._path(key))
+        except OSError as exc:
+            logger.warning(f"Could not write chatbot cache entry {key}: {exc}")
+
+
+# Context -------------------------------------------------------------------------
+_contexts: dict[int, tuple[tuple[int, ...], str]] = {}
+_contexts_lock = threading.Lock()
+
+
+def build_context(db: Any, max_templates: int = 20, max_professions: int = 8) -> str:
+    """
+    Summarize the contacts, templates and sender for the system prompt.
+
+    The summary is rebuilt only after a write to ``CONTEXT_TABLES``, and its size does not
+    grow with the number of contacts.
+    """
+    stamp = db.table_versions(CONTEXT_TABLES)
+    with _contexts_lock:
+        cached = _contexts.get(id(db))
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    profiles = db.get_all_profiles()
+    templates = db.get_all_templates()
+    user = db.get_user_profile()
+    professions = Counter(p.get("profession") or "unknown" for p in profiles)
+    lines = [f"Contacts: {len(profiles)}"]
+    if professions:
+        top = professions.most_common(max_professions)
+        lines.append("Most common professions: " + ", ".join(f"{n} ({c})" for n, c in top))
+    lines.append(f"Templates: {len(templates)}")
+    for template in templates[:max_templates]:
+        lines.append(f"- {template['name']}: {_preview(template['body'])}")
+    if len(templates) > max_templates:
+        lines.append(f"- ... and {len(templates) - max_templates} more")
+    if user:
+        lines.append(f"Sender: {user.get('name', '')}, {user.get('title', '')}".rstrip(", "))
+    context = "\n".join(lines)
+
+    with _contexts_lock:
+        _contexts[id(db)] = (stamp, context)
+    return context
+
+
+def relevant_records(db: Any, prompt: str, limit: int = 5, max_words: int = 6) -> str:
+    """List the profiles and templates matching the longest words of ``prompt``."""
+    words = sorted(
+        {w.strip(".-_") for w in _WORD_RE.findall(prompt.lower())} - _STOP_WORDS,
+        key=len,
+        reverse=True,
+    )[:max_words]
+    seen: dict[tuple[str, int], str] = {}
+    for word in words:
+        for hit in db.search(word, kinds=("profile", "template"), limit=limit)["hits"]:
+            doc = hit["doc"]
+            if hit["kind"] == "profile":
+                line = (
+                    f"Contact: {doc['name']} <{doc['email']}>, "
+                    f"{doc.get('title', '')}, {doc.get('profession', '')}"
+                )
+            else:
+                line = f"Template {doc['name']!r}: {_preview(doc['body'], 300)}"
+            seen.setdefault((hit["kind"], doc.doc_id), line)
+            if len(seen) >= limit:
+                return "\n".join(seen.values())
+    return "\n".join(seen.values())
+
+
+def _preview(text: str, length: int = 80) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[: length - 1] + "…"
+
+
+# Client --------------------------------------------------------------------------
+class ChatClient:
+    """Streams chat replies from an OpenAI-compatible server, through a ``ResponseCache``."""
+
+    def __init__(
+        self,
+        model: str | None = None,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        cache: ResponseCache | None = None,
+        timeout: float = 60.0,
+    ) -> None:
+        from openai import OpenAI  # Only needed once the LLM mode is used.
+
+        self.model = model or os.getenv(_ENV_MODEL, DEFAULT_MODEL)
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout)
+        self.cache = cache if cache is not None else ResponseCache()
+
+    def stream(
+        self,
+        prompt: str,
+        context: str,
+        history: Sequence[Mapping[str, str]] = (),
+        stamp: Sequence[int] = (),
+    ) -> Iterator[str]:
+        """
+        Yield the reply to ``prompt`` piece by piece.
+
+        Args:
+            prompt: The user's message.
+            context: Data summary for the system prompt, e.g. from ``build_context``.
+            history: Earlier ``{"role", "content"}`` messages; the last few are sent along.
+            stamp: Version of the data behind ``context``, e.g.
+                ``db.table_versions(CONTEXT_TABLES)``. Cached replies from other versions are
+                not reused, even when the context reads the same.
+
+        Yields:
+            Text chunks as the server produces them, or the whole reply at once on a cache hit.
+            A reply is cached only once it has been received completely.
+        """
+        recent = [{"role": m["role"], "content": m["content"]} for m in history][-HISTORY_MESSAGES:]
+        key = ResponseCache.key(
+            self.model,
+            normalize_prompt(prompt),
+            context,
+            json.dumps(recent, sort_keys=True),
+            json.dumps(list(stamp)),
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        messages = [
+            {"role": "system", "content": f"{SYSTEM_PROMPT}\n\n{context}"},
+            *recent,
+            {"role": "user", "content": prompt},
+        ]
+        parts = []
+        for chunk in self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True
+        ):
+            if chunk.choices and (text := chunk.choices[0].delta.content):
+                parts.append(text)
+                yield text
+        if parts:
+            self.cache.put(key, "".join(parts))
+
+
+_shared_client: ChatClient | None = None
+_shared_client_key: tuple | None = None
+_shared_client_lock = threading.Lock()
+
+
+def get_chat_client() -> ChatClient | None:
+    """
+    Return the process-wide chat client, built from environment variables on first use.
+
+    The client is rebuilt if the configuration changes. Returns None without an API key.
+    """
+    global _shared_client, _shared_client_key
+
+    key = tuple(
+        os.getenv(name)
+        for name in ("OPENAI_API_KEY", "OPENAI_BASE_URL", _ENV_MODEL, _ENV_CACHE_DIR)
+    )
+    with _shared_client_lock:
+        if _shared_client is not None and _shared_client_key == key:
+            return _shared_client
+        if not is_configured():
+            _shared_client = _shared_client_key = None
+            return None
+        cache = ResponseCache(os.getenv(_ENV_CACHE_DIR, DEFAULT_CACHE_DIR))
+        _shared_client = ChatClient(cache=cache)
+        _shared_client_key = key
+        return _shared_client
@@ -0,0 +1,157 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions server, for offline testing.
+
+Run it from the ``src`` directory and point the chatbot at it::
+
+    python -m utils.llm_stub --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run Home.py
+
+It answers ``POST /v1/chat/completions`` with a canned reply that echoes the last user
+message. With ``"stream": true`` the reply arrives as server-sent events, one word per chunk,
+the way the real API streams. ``GET /v1/models`` lists the single stub model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from loguru import logger
+
+STUB_MODEL = "stub-model"
+
+
+def stub_reply(messages: list[dict[str, Any]]) -> str:
+    """The canned reply: an echo of the last user message and the size of the context."""
+    prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    context = sum(len(m["content"]) for m in messages if m.get("role") == "system")
+    return f"Stub reply to: {prompt} (context: {context} characters)"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"llm_stub: {format % args}")
+
+    def _send_json(self, status: int, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/v1/models":
+            model = {"id": STUB_MODEL, "object": "model", "owned_by": "stub"}
+            self._send_json(200, {"object": "list", "data": [model]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self) -> None:
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record(request)
+        reply = stub_reply(request.get("messages", []))
+        model = request.get("model", STUB_MODEL)
+        base = {
+            "id": f"chatcmpl-stub-{self.server.requests}",
+            "created": int(time.time()),
+            "model": model,
+        }
+
+        if not request.get("stream"):
+            self._send_json(
+                200,
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        words = reply.split(" ")
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": word if i == 0 else f" {word}"} for i, word in enumerate(words)]
+        for delta in deltas:
+            self._send_chunk(base, delta, None)
+            time.sleep(self.server.delay)
+        self._send_chunk(base, {}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_chunk(
+        self, base: dict[str, Any], delta: dict[str, str], finish_reason: str | None
+    ) -> None:
+        choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        payload = {**base, "object": "chat.completion.chunk", "choices": [choice]}
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    """The stub HTTP server; ``requests`` counts the completions it has answered."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0) -> None:
+        super().__init__((host, port), _Handler)
+        self.delay = delay
+        self.requests = 0
+        self.last_request: dict[str, Any] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, request: dict[str, Any]) -> None:
+        with self._lock:
+            self.requests += 1
+            self.last_request = request
+
+    def start(self) -> StubServer:
+        """Serve from a daemon thread and return self, e.g. ``StubServer().start()``."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a stub OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds between chunks.")
+    args = parser.parse_args(argv)
+
+    server = StubServer(args.host, args.port, args.delay)
+    logger.info(f"Stub LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+In-process timing metrics for the hot paths.
+
+Code marks what it wants timed with ``span``::
+
+    with span("smtp", phase="connect"):
+        ...
+
+or decorates a function with ``timed("page_render", page="Home")``. Each distinct name and label
+set gets a ``Histogram`` with fixed latency buckets, so recording is a bisect and a few integer
+adds under a lock. ``DatabaseManager`` methods, storage file I/O, SMTP phases and page renders
+are instrumented out of the box; the Admin page shows them.
+
+Only a fraction of spans is timed: ``EMAIL_METRICS_SAMPLE_RATE`` (default 1, every span; 0
+turns timing off). An unsampled span costs one random number. Histograms then hold a sample,
+so their counts are scaled by the rate when exported; quantiles need no scaling.
+
+Export:
+
+- ``EMAIL_METRICS_PORT``: serve ``/metrics`` in the Prometheus text format, and
+  ``/metrics.json``, from a background thread.
+- ``EMAIL_METRICS_FILE``: write the JSON snapshot there every ``EMAIL_METRICS_INTERVAL``
+  seconds (default 30) and at exit.
+
+Every process (the app, the scheduler) keeps its own metrics, so give each its own port or file.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from contextlib import AbstractContextManager, nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, TypeVar
+
+from loguru import logger
+
+_ENV_SAMPLE_RATE = "EMAIL_METRICS_SAMPLE_RATE"
+_ENV_PORT = "EMAIL_METRICS_PORT"
+_ENV_FILE = "EMAIL_METRICS_FILE"
+_ENV_INTERVAL = "EMAIL_METRICS_INTERVAL"
+
+# Upper bounds in seconds, from 50 µs to 10 s; slower observations land in +Inf.
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)  # fmt: skip
+PROMETHEUS_PREFIX = "email_"
+
+F = TypeVar("F", bound=Callable[..., Any])
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Counts of observations per latency bucket, plus their count, sum and maximum."""
+
+    __slots__ = ("counts", "count", "sum", "max", "_lock")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(BUCKETS) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate the ``q`` quantile by interpolating inside its bucket, the way Prometheus'
+        ``histogram_quantile`` does. Observations above the last bucket report ``max``.
+        """
+        with self._lock:
+            counts, count, largest = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(BUCKETS):
+                    return largest
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = min(BUCKETS[index], largest)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return largest
+
+
+class _Span:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> _Span:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+_UNSAMPLED = nullcontext()
+
+
+class Metrics:
+    """
+    A registry of histograms keyed by metric name and labels.
+
+    ``sample_rate`` can be changed at any time; it applies to spans started afterwards, and
+    exported counts are scaled by the current rate, so ``reset`` along with it.
+    """
+
+    def __init__(self, sample_rate: float = 1.0) -> None:
+        self.sample_rate = sample_rate
+        self.started = time.time()
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        # The same histograms keyed by labels in call order, which skips the sort on hot paths.
+        self._by_call: dict[tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        call_key = (name, tuple(labels.items()))
+        histogram = self._by_call.get(call_key)
+        if histogram is None:
+            key = (name, tuple(sorted(labels.items())))
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+                self._by_call[call_key] = histogram
+        return histogram
+
+    def sampled(self) -> bool:
+        rate = self.sample_rate
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Record one duration, regardless of the sample rate."""
+        self.histogram(name, **labels).observe(seconds)
+
+    def span(self, name: str, **labels: str) -> AbstractContextManager[Any]:
+        """Time the ``with`` block into the ``name`` histogram, if this span is sampled."""
+        if not self.sampled():
+            return _UNSAMPLED
+        return _Span(self.histogram(name, **labels))
+
+    def timed(self, name: str, **labels: str) -> Callable[[F], F]:
+        """Decorator form of ``span``."""
+
+        def decorate(function: F) -> F:
+            histogram = self.histogram(name, **labels)
+
+            @wraps(function)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.sampled():
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorate
+
+    def reset(self) -> None:
+        with self._lock:
+            # Decorated functions hold on to their histograms, so empty them in place.
+            for histogram in self._histograms.values():
+                histogram.clear()
+            self.started = time.time()
+
+    # Export -------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Every histogram as plain data.
+
+        Returns:
+            ``{"started", "sample_rate", "histograms": [{"name", "labels", "count", "sum",
+            "max", "p50", "p95", "p99", "buckets": [[upper_bound, cumulative_count], ...]}]}``,
+            with counts and sums scaled up by the sample rate and times in seconds.
+        """
+        scale = 1.0 / self.sample_rate if 0.0 < self.sample_rate < 1.0 else 1.0
+        with self._lock:
+            items = sorted(self._histograms.items())
+        histograms = []
+        for (name, labels), histogram in items:
+            with histogram._lock:
+                counts, count = list(histogram.counts), histogram.count
+                total, largest = histogram.sum, histogram.max
+            if not count:
+                continue
+            cumulative, buckets = 0, []
+            for bound, bucket_count in zip((*BUCKETS, "+Inf"), counts, strict=True):
+                cumulative += bucket_count
+                buckets.append([bound, round(cumulative * scale)])
+            histograms.append(
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": round(count * scale),
+                    "sum": total * scale,
+                    "max": largest,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": buckets,
+                }
+            )
+        return {"started": self.started, "sample_rate": self.sample_rate, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """The snapshot in the Prometheus text exposition format, one histogram per metric."""
+        lines: list[str] = []
+        described: set[str] = set()
+        for histogram in self.snapshot()["histograms"]:
+            metric = f"{PROMETHEUS_PREFIX}{histogram['name']}_seconds"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in histogram["labels"].items())
+            for bound, cumulative in histogram["buckets"]:
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{metric}_bucket{{{f'{labels},{le}' if labels else le}}} {cumulative}"
+                )
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{metric}_sum{suffix} {histogram['sum']:.6f}")
+            lines.append(f"{metric}_count{suffix} {histogram['count']}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}metrics_sample_rate gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}metrics_sample_rate {self.sample_rate}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str | Path) -> None:
+        """Write the snapshot to ``path`` atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(self.snapshot(), handle)
+        os.replace(tmp_path, path)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# HTTP endpoint ---------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    server: MetricsServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"metrics: {format % args}")
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/metrics":
+            body = self.server.metrics.to_prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(self.server.metrics.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves ``/metrics`` (Prometheus text) and ``/metrics.json`` for one ``Metrics``."""
+
+    daemon_threads = True
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _Handler)
+        self.metrics = metrics
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> MetricsServer:
+        threading.Thread(target=self.serve_forever, daemon=True, name="metrics-http").start()
+        return self
+
+
+# Process-wide metrics --------------------------------------------------------------
+def _env_rate() -> float:
+    try:
+        return min(1.0, max(0.0, float(os.getenv(_ENV_SAMPLE_RATE, "1"))))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {_ENV_SAMPLE_RATE}; timing every span")
+        return 1.0
+
+
+_metrics = Metrics(_env_rate())
+_server: MetricsServer | None = None
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics, starting the configured exporters on first use."""
+    global _exporters_started, _server
+    if _exporters_started:
+        return _metrics
+    with _exporters_lock:
+        if _exporters_started:
+            return _metrics
+        _exporters_started = True
+        port = os.getenv(_ENV_PORT)
+        if port:
+            try:
+                _server = MetricsServer(
+                    _metrics, os.getenv("EMAIL_METRICS_HOST", "127.0.0.1"), int(port)
+                ).start()
+                logger.info(f"Serving metrics on {_server.url}")
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Could not serve metrics on port {port}: {exc}")
+        path = os.getenv(_ENV_FILE)
+        if path:
+            interval = float(os.getenv(_ENV_INTERVAL, "30"))
+            _start_file_export(path, interval)
+    return _metrics
+
+
+def metrics_url() -> str | None:
+    """The Prometheus endpoint of this process, if one is being served."""
+    return _server.url if _server is not None else None
+
+
+def _start_file_export(path: str, interval: float) -> None:
+    def write() -> None:
+        try:
+            _metrics.write_json(path)
+        except OSError as exc:
+            logger.warning(f"Could not write metrics to {path}: {exc}")
+
+    def loop() -> None:
+        while True:
+            time.sleep(interval)
+            write()
+
+    threading.Thread(target=loop, daemon=True, name="metrics-file").start()
+    atexit.register(write)
+
+
+def span(name: str, **labels: str) -> AbstractContextManager[Any]:
+    """``get_metrics().span(...)``: time a ``with`` block."""
+    return get_metrics().span(name, **labels)
+
+
+def timed(name: str, **labels: str) -> Callable[[F], F]:
+    """``get_metrics().timed(...)``: time every call of the decorated function."""
+    return get_metrics().timed(name, **labels)
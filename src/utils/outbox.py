@@ -0,0 +1,259 @@
+"""
+Delivery worker for the ``outbox`` table.
+
+The Send page queues every message in the outbox and sends it straight away; the worker here
+picks up whatever is left: retries that fall due, and batches whose process died before it got
+through them. ``python -m utils.scheduler`` runs one in the background. To run one on its own,
+from the ``src`` directory::
+
+    python -m utils.outbox --rate 5
+
+Workers claim messages in small batches under a lease, in a transaction that excludes those of
+other processes, so several of them (the scheduler and a Send page, say) can share one
+database, SQLite or JSON, without sending anything twice. Failed sends are classified by their SMTP
+reply (see ``utils.bulk_send.classify_error``): transient ones are retried with exponential
+backoff and random jitter, permanent ones, and messages out of attempts, go to ``dead``.
+
+Sends are paced by the account and recipient-domain quotas of ``utils.bulk_send``. Today's
+count for the account's daily quota starts from the ``sent_day`` figure in the database, so
+it holds across restarts and between processes; once it is used up, messages wait in the
+queue for the next day.
+
+Attachments are read from the ``utils.attachments`` store and encoded once per file, however
+many messages in the batch carry them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from collections.abc import Callable, Iterable
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from utils.attachments import Attachment, AttachmentStore, get_attachment_store
+from utils.bulk_send import BulkSender, OutgoingMessage, SendResult, recipient_domain
+from utils.db import DatabaseManager
+from utils.smtp_pool import SMTPPool, get_smtp_pool
+
+
+class OutboxWorker:
+    """
+    Send queued outbox messages through an SMTP pool.
+
+    ``rate`` caps messages per second overall and ``per_domain_rate`` per recipient domain
+    without a quota of its own; the account and provider quotas apply on top.
+    Each claim takes ``batch_size`` messages, by default one per pool connection, and holds
+    them for ``lease`` seconds. Attached files come from ``attachments``, by default the
+    shared store.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        pool: SMTPPool | None = None,
+        rate: float | None = None,
+        per_domain_rate: float | None = 2.0,
+        batch_size: int | None = None,
+        max_attempts: int = 5,
+        base_backoff: float = 60.0,
+        max_backoff: float = 3600.0,
+        lease: float = 300.0,
+        poll_interval: float = 2.0,
+        name: str | None = None,
+        attachments: AttachmentStore | None = None,
+    ) -> None:
+        self.db = db
+        self.pool = pool or get_smtp_pool()
+        if self.pool is None:
+            raise ValueError("Sender email or password not configured in the environment")
+        self.attachments = attachments or get_attachment_store()
+        self.sender = BulkSender(self.pool, per_domain_rate=per_domain_rate, rate=rate)
+        self.batch_size = batch_size or self.pool.max_connections
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._stop = threading.Event()
+        self._quota_day: date | None = None
+
+    def backoff(self, attempts: int) -> timedelta:
+        """Delay before the next attempt: exponential, capped, then jittered down by up to half."""
+        delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+    def _message_id(self, key: str) -> str:
+        # Stable per outbox row, so a requeued message that did go out the first time can be
+        # recognised as a duplicate by the receiving side.
+        return f"<{key}@{recipient_domain(self.pool.user) or 'localhost'}>"
+
+    def _outcome(
+        self, row: dict[str, Any], result: SendResult
+    ) -> tuple[int, str, str | None, int | None, datetime | None]:
+        if result.success:
+            return row.doc_id, "sent", None, None, result.sent_at
+        error = f"{result.error_class}: {result.error}"
+        if result.transient and row["attempts"] < self.max_attempts:
+            next_attempt = datetime.now() + self.backoff(row["attempts"])
+            logger.warning(f"Send to {row['recipient']} failed, retrying at {next_attempt}")
+            return row.doc_id, "failed", error, result.error_code, next_attempt
+        logger.error(f"Giving up on {row['recipient']} after {row['attempts']} attempt(s)")
+        return row.doc_id, "dead", error, result.error_code, None
+
+    def drain_once(
+        self,
+        outbox_ids: Iterable[int] | None = None,
+        on_result: Callable[[SendResult, dict[str, Any]], None] | None = None,
+    ) -> list[SendResult]:
+        """
+        Claim one batch of due messages, send it and record the outcomes.
+
+        Args:
+            outbox_ids: Only send among these messages.
+            on_result: Called as ``on_result(result, row)`` from the calling thread after each
+                message completes.
+
+        Returns:
+            One ``SendResult`` per claimed message, in completion order; empty when nothing
+            was due.
+        """
+        self.sender.seed_today(self.db.get_stat("sent_day", date.today().isoformat()))
+        remaining = self.sender.remaining_today()
+        if remaining == 0:
+            if self._quota_day != date.today():
+                self._quota_day = date.today()
+                logger.warning("Daily sending quota used up; the outbox resumes tomorrow")
+            return []
+        limit = self.batch_size if remaining is None else min(self.batch_size, remaining)
+        rows = self.db.claim_outbox(self.name, limit, self.lease, outbox_ids)
+        if not rows:
+            return []
+        by_message, sendable, unsendable = {}, [], []
+        for row in rows:
+            message = OutgoingMessage(
+                to=row["recipient"],
+                subject=row["subject"],
+                body=row["body"],
+                message_id=self._message_id(row["key"]),
+            )
+            by_message[id(message)] = (message, row)
+            try:
+                message.attachments = [
+                    self.attachments.part(Attachment.from_dict(doc))
+                    for doc in row.get("attachments", ())
+                ]
+            except OSError as exc:
+                # A file missing from the store will not come back by retrying.
+                logger.error(f"Cannot attach files for {row['recipient']}: {exc}")
+                unsendable.append(
+                    SendResult(message, False, 0.0, datetime.now(), type(exc).__name__, str(exc))
+                )
+                continue
+            sendable.append(message)
+        results, outcomes = [], []
+        try:
+            for result in itertools.chain(unsendable, self.sender.iter_send(sendable)):
+                row = by_message[id(result.message)][1]
+                results.append(result)
+                outcomes.append(self._outcome(row, result))
+                if on_result is not None:
+                    on_result(result, row)
+        finally:
+            # Whatever got an outcome is recorded even if the batch was interrupted; the rest
+            # stays ``sending`` until its lease runs out.
+            self.db.finish_outbox(outcomes)
+        return results
+
+    def drain(
+        self,
+        outbox_ids: Iterable[int] | None = None,
+        on_result: Callable[[SendResult, dict[str, Any]], None] | None = None,
+        time_budget: float | None = None,
+    ) -> list[SendResult]:
+        """
+        Call ``drain_once`` until nothing is due; see there for the other arguments.
+
+        With ``time_budget``, no new batch is claimed once that many seconds have passed; what
+        is left stays queued for the next worker.
+        """
+        outbox_ids = None if outbox_ids is None else list(outbox_ids)
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        results: list[SendResult] = []
+        while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+            batch = self.drain_once(outbox_ids, on_result)
+            if not batch:
+                break
+            results += batch
+        return results
+
+    # Background loop ----------------------------------------------------------
+    def run_forever(self) -> None:
+        logger.info(f"Outbox worker {self.name} started")
+        while not self._stop.is_set():
+            try:
+                recovered = self.db.recover_outbox()
+                if recovered:
+                    logger.warning(f"Moved {recovered} interrupted message(s) to dead letters")
+                self.drain()
+            except Exception as exc:
+                # A broken database file or similar: keep the worker alive and try again.
+                logger.exception(f"Outbox worker error: {exc}")
+            self._stop.wait(self.poll_interval)
+        logger.info(f"Outbox worker {self.name} stopped")
+
+    def start(self) -> OutboxWorker:
+        """Run ``run_forever`` in a daemon thread and return self."""
+        threading.Thread(target=self.run_forever, daemon=True, name="outbox-worker").start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Send queued outbox messages as they fall due.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Path to the database file. Defaults to $EMAIL_DB_PATH or email_manager.json.",
+    )
+    parser.add_argument("--rate", type=float, default=None, help="Messages per second overall.")
+    parser.add_argument(
+        "--per-domain-rate", type=float, default=2.0, help="Messages per second per domain."
+    )
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts before giving up.")
+    parser.add_argument(
+        "--base-backoff", type=float, default=60.0, help="Seconds before the first retry."
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=2.0, help="Seconds between checks when idle."
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    worker = OutboxWorker(
+        DatabaseManager(args.db),
+        rate=args.rate,
+        per_domain_rate=args.per_domain_rate,
+        max_attempts=args.max_attempts,
+        base_backoff=args.base_backoff,
+        poll_interval=args.poll_interval,
+    )
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: worker.stop())
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
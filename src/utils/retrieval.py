@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import re
+import zlib
+from collections import Counter
+from collections.abc import Hashable, Iterable
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.search_index import tokenize
+
+
+def hashed_features(text: str, dims: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the words and word pairs of ``text`` into ``dims`` signed buckets.
+
+    Returns:
+        The distinct bucket numbers and their ``log(1 + count)`` weights, signed so that
+        colliding features tend to cancel rather than add up.
+    """
+    tokens = tokenize(text)
+    counts: Counter[int] = Counter()
+    for feature in (*tokens, *(f"{a} {b}" for a, b in zip(tokens, tokens[1:], strict=False))):
+        digest = zlib.crc32(feature.encode())
+        counts[digest % dims] += 1 if digest & 0x80000000 else -1
+    if not counts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    raw = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return buckets, np.sign(raw) * np.log1p(np.abs(raw))
+
+
+class VectorIndex:
+    """
+    Hashed TF-IDF embeddings of short documents for top-k similarity search.
+
+    Every document is one L2-normalized column of a dense ``float16`` matrix with ``dims``
+    rows. A query only touches the rows of its own buckets, so scoring is a small
+    vector-matrix product over contiguous memory, then an ``argpartition``. Document
+    frequencies are kept per bucket and applied to the query, so ``add`` and ``remove``
+    update the index in place without re-weighting other rows. Rows of removed documents are
+    reused, and the matrix grows by doubling. At the default 512 dimensions a document takes
+    about 1 KB.
+
+    Each document can carry a ``kind`` and a ``when`` timestamp to filter on. Unrelated words
+    that share a bucket add a little similarity, so very low scores are noise; ``min_score``
+    cuts them off.
+    """
+
+    def __init__(self, dims: int = 512, capacity: int = 256) -> None:
+        self.dims = dims
+        self._vectors = np.zeros((dims, capacity), dtype=np.float16)
+        self._kinds = np.full(capacity, -1, dtype=np.int16)
+        self._when = np.full(capacity, np.nan)
+        self._keys: list[Hashable | None] = []
+        self._rows: dict[Hashable, int] = {}
+        self._free: list[int] = []
+        self._kind_codes: dict[str, int] = {}
+        self._df = np.zeros(dims, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes + self._kinds.nbytes + self._when.nbytes
+
+    def _grow(self) -> None:
+        capacity = len(self._kinds) * 2
+        vectors = np.zeros((self.dims, capacity), dtype=self._vectors.dtype)
+        vectors[:, : self._vectors.shape[1]] = self._vectors
+        self._vectors = vectors
+        for name, fill in (("_kinds", -1), ("_when", np.nan)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, key: Hashable, text: str, kind: str = "", when: datetime | None = None) -> None:
+        """Index ``text`` under ``key``, replacing any document it had before."""
+        self.remove(key)
+        buckets, weights = hashed_features(text, self.dims)
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._keys)
+            self._keys.append(None)
+            if row == len(self._kinds):
+                self._grow()
+        vector = np.zeros(self.dims, dtype=np.float32)
+        vector[buckets] = weights
+        norm = float(np.linalg.norm(vector))
+        self._vectors[:, row] = vector / norm if norm else vector
+        self._kinds[row] = self._kind_codes.setdefault(kind, len(self._kind_codes))
+        self._when[row] = when.timestamp() if when else np.nan
+        self._keys[row] = key
+        self._rows[key] = row
+        self._df[buckets] += 1
+
+    def remove(self, key: Hashable) -> None:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._df[np.flatnonzero(self._vectors[:, row])] -= 1
+        self._vectors[:, row] = 0.0
+        self._kinds[row] = -1
+        self._when[row] = np.nan
+        self._keys[row] = None
+        self._free.append(row)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        kinds: Iterable[str] | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        min_score: float = 0.0,
+    ) -> list[tuple[Hashable, float]]:
+        """
+        Return up to ``k`` ``(key, score)`` pairs most similar to ``query``, best first.
+
+        A query without any words returns the newest matching documents instead, with score 0.
+
+        Args:
+            query: Free text.
+            k: Number of results.
+            kinds: Only documents of these kinds; ``None`` for all.
+            start: Only documents with ``when`` at or after this time.
+            end: Only documents with ``when`` before this time.
+            min_score: Only documents with a cosine similarity above this.
+        """
+        buckets, weights = hashed_features(query, self.dims)
+        used = len(self._keys)
+        if not self._rows:
+            return []
+        if len(buckets):
+            idf = np.log((1 + len(self._rows)) / (1 + self._df[buckets])) + 1
+            weights = weights * idf
+            scores = weights.astype(np.float32) @ self._vectors[buckets, :used].astype(np.float32)
+            scores /= float(np.linalg.norm(weights))
+        else:
+            # Rank by date; undated documents last.
+            scores = np.nan_to_num(self._when[:used], nan=-np.inf)
+
+        mask = self._kinds[:used] >= 0
+        if kinds is not None:
+            codes = [self._kind_codes[kind] for kind in kinds if kind in self._kind_codes]
+            mask &= np.isin(self._kinds[:used], codes)
+        if start is not None or end is not None:
+            when = self._when[:used]
+            with np.errstate(invalid="ignore"):
+                if start is not None:
+                    mask &= when >= start.timestamp()
+                if end is not None:
+                    mask &= when < end.timestamp()
+        if len(buckets):
+            mask &= scores > min_score
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > k:
+            top = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        if not len(buckets):
+            return [(self._keys[row], 0.0) for row in order]
+        return [(self._keys[row], float(scores[row])) for row in order]
+
+
+# Time phrases ---------------------------------------------------------------------
+_PERIOD_RE = re.compile(
+    r"\b(?:(today)|(yesterday)|(this|last|past) (week|month|year)|(?:last|past) (\d+) days)\b",
+    re.IGNORECASE,
+)
+
+
+def parse_period(
+    text: str, now: datetime | None = None
+) -> tuple[datetime | None, datetime | None, str]:
+    """
+    Find a time phrase such as "yesterday", "last month" or "past 10 days" in ``text``.
+
+    Returns:
+        ``(start, end, rest)``: the period it covers (``None`` when there is none) and the
+        text with the phrase removed.
+    """
+    match = _PERIOD_RE.search(text)
+    if match is None:
+        return None, None, text
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    today_word, yesterday, which, unit, days = match.groups()
+    if today_word:
+        start, end = today, None
+    elif yesterday:
+        start, end = today - timedelta(days=1), today
+    elif days:
+        start, end = today - timedelta(days=int(days)), None
+    else:
+        which, unit = which.lower(), unit.lower()
+        if unit == "week":
+            start = today - timedelta(days=today.weekday())
+            previous = start - timedelta(weeks=1)
+        elif unit == "month":
+            start = today.replace(day=1)
+            previous = (start - timedelta(days=1)).replace(day=1)
+        else:
+            start = today.replace(month=1, day=1)
+            previous = start.replace(year=start.year - 1)
+        if which == "this":
+            end = None
+        elif which == "last":
+            start, end = previous, start
+        else:  # "past month" is a rolling window
+            length = {"week": 7, "month": 30, "year": 365}[unit]
+            start, end = today - timedelta(days=length), None
+    rest = " ".join((text[: match.start()] + text[match.end() :]).split())
+    return start, end, rest
+
+
+# Words that carry no topic in questions like "what did I send to Charles last week?"
+QUERY_STOP_WORDS = frozenset(
+    {"what", "which", "did", "do", "i", "me", "my", "we", "the", "a", "an", "to", "for", "of"}
+    | {"about", "with", "show", "list", "find", "any", "all", "was", "were", "is", "that"}
+    | {"send", "sent", "email", "emails", "mail", "message", "messages", "history", "past"}
+    | {"previous", "earlier", "template", "templates", "suggest", "similar", "recommend"}
+    | {"best", "fits", "should", "use", "can", "you", "please", "one", "like", "on", "in"}
+    | {"help", "write", "draft", "compose", "create", "new", "some", "something"}
+)
+
+
+def topic(text: str) -> str:
+    """The words of ``text`` that say what it is about, for ``VectorIndex.search``."""
+    return " ".join(token for token in tokenize(text) if token not in QUERY_STOP_WORDS)
+
+
+def similarity_text(texts: Iterable[str], limit: int = 3) -> str:
+    """Join the first ``limit`` distinct non-empty texts, e.g. a campaign's bodies."""
+    distinct = [text for text in dict.fromkeys(texts) if text]
+    return "\n".join(distinct[:limit])
@@ -0,0 +1,273 @@
+"""
+Background dispatcher for the ``schedules`` table.
+
+Run it next to the Streamlit app, from the ``src`` directory::
+
+    python -m utils.scheduler --db email_manager.json
+
+Pending schedules are kept in a min-heap keyed by their due time. The loop sleeps until the
+earliest item is due, waking early only to stat the database file; the file is re-read only
+when its modification time changes, which is how rows added by the Streamlit process are
+picked up. Rows written before the scheduler existed carry no ``status`` and are left alone.
+
+A schedule points either at a single sent email (``email_id``) or at a whole campaign
+(``campaign_id``). A due campaign is handed to the outbox: every recipient not yet sent to is
+queued there and the schedule becomes ``queued``. The scheduler also runs an outbox worker
+(``utils.outbox``), which sends those messages, retries failures and records each outcome in
+the campaign's status array; once the last one is settled the schedule becomes ``sent``, or
+``failed`` if any message was given up on. Single emails are sent directly and retried here.
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from utils.db import DISPATCHABLE_STATUSES, DatabaseManager
+from utils.helpers import send_email
+from utils.outbox import OutboxWorker
+
+
+class ScheduleDispatcher:
+    """
+    Send scheduled emails, or queue scheduled campaigns in the outbox, when they fall due.
+
+    Failed single emails are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        db_path: str | None = None,
+        watch_interval: float = 2.0,
+        max_attempts: int = 5,
+        base_backoff: float = 60.0,
+        max_backoff: float = 3600.0,
+    ) -> None:
+        self.db_path = db_path or os.getenv("EMAIL_DB_PATH", "email_manager.json")
+        self.db = DatabaseManager(self.db_path)
+        self.watch_interval = watch_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._heap: list[tuple[datetime, int]] = []
+        self._due: dict[int, datetime] = {}  # schedule_id -> due time of its live heap entry
+        self._file_stamp: tuple[tuple[int, int], ...] | None = None
+        self._stop = threading.Event()
+
+    # Loading ------------------------------------------------------------------
+    def _stat(self) -> tuple[tuple[int, int], ...]:
+        # SQLite in WAL mode appends to the -wal file and leaves the main file untouched.
+        stamp = []
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp.append((st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload schedules into the heap if the database file changed since the last load."""
+        stamp = self._stat()
+        if not force and stamp == self._file_stamp:
+            return
+        self._file_stamp = stamp
+
+        waiting = {}
+        for schedule in self.db.get_all_schedules():
+            if schedule.get("status") in DISPATCHABLE_STATUSES:
+                due = schedule.get("next_attempt") or schedule["schedule_date"]
+                waiting[schedule.doc_id] = datetime.fromisoformat(due)
+        # Entries of schedules sent, failed or deleted since are left on the heap, superseded.
+        for schedule_id in self._due.keys() - waiting.keys():
+            del self._due[schedule_id]
+        for schedule_id, due in waiting.items():
+            if self._due.get(schedule_id) != due:
+                self._due[schedule_id] = due
+                heapq.heappush(self._heap, (due, schedule_id))
+
+    def _mark_own_write(self) -> None:
+        # Our own status updates touch the file; don't treat them as external changes.
+        self._file_stamp = self._stat()
+
+    # Dispatch -----------------------------------------------------------------
+    def backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff))
+
+    def dispatch(self, schedule_id: int) -> None:
+        schedule = self.db.get_schedule(schedule_id)
+        if schedule is None or schedule.get("status") not in DISPATCHABLE_STATUSES:
+            return
+
+        attempts = schedule.get("attempts", 0) + 1
+        if "campaign_id" in schedule:
+            queued = self._queue_campaign(schedule_id, schedule["campaign_id"])
+            if queued:
+                self.db.update_schedule_status(schedule_id, "queued", attempts=attempts)
+            else:
+                self.db.update_schedule_status(schedule_id, "failed", error="campaign not found")
+            self._mark_own_write()
+            return
+
+        sent = self._send_email(schedule_id, schedule["email_id"])
+        if sent is None:
+            self.db.update_schedule_status(schedule_id, "failed", error="email not found")
+            self._mark_own_write()
+            return
+
+        if sent:
+            self.db.update_schedule_status(schedule_id, "sent", attempts=attempts)
+        elif attempts >= self.max_attempts:
+            self.db.update_schedule_status(
+                schedule_id, "failed", attempts=attempts, error="send failed"
+            )
+            logger.error(f"Schedule {schedule_id} failed after {attempts} attempts")
+        else:
+            next_attempt = datetime.now() + self.backoff(attempts)
+            self.db.update_schedule_status(
+                schedule_id,
+                "retrying",
+                attempts=attempts,
+                next_attempt=next_attempt,
+                error="send failed",
+            )
+            self._due[schedule_id] = next_attempt
+            heapq.heappush(self._heap, (next_attempt, schedule_id))
+            logger.warning(f"Schedule {schedule_id} failed, retrying at {next_attempt}")
+        self._mark_own_write()
+
+    def _send_email(self, schedule_id: int, email_id: int) -> bool | None:
+        email = self.db.get_sent_email(email_id)
+        if email is None:
+            logger.error(f"Schedule {schedule_id} points at missing email {email_id}")
+            return None
+        if not send_email(to=email["recipients"], subject=email["subject"], contents=email["body"]):
+            return False
+        logger.info(f"Schedule {schedule_id} sent to {', '.join(email['recipients'])}")
+        return True
+
+    def _queue_campaign(self, schedule_id: int, campaign_id: int) -> bool:
+        campaign = self.db.get_campaign(campaign_id)
+        if campaign is None:
+            logger.error(f"Schedule {schedule_id} points at missing campaign {campaign_id}")
+            return False
+        # Idempotency keys make this safe to repeat if we die before marking the schedule.
+        messages = [
+            (recipient, subject, body)
+            for recipient, subject, body, status in zip(
+                campaign["recipients"],
+                campaign["subjects"],
+                campaign["bodies"],
+                campaign["statuses"],
+                strict=True,
+            )
+            if status != "sent"
+        ]
+        self.db.enqueue_outbox(
+            messages, campaign_id=campaign_id, attachments=campaign.get("attachments")
+        )
+        logger.info(
+            f"Schedule {schedule_id} queued campaign {campaign_id} for {len(messages)} recipients"
+        )
+        return True
+
+    def run_due(self, now: datetime | None = None) -> int:
+        """Dispatch every heap entry that is due; return how many schedules were attempted."""
+        now = now or datetime.now()
+        dispatched = 0
+        while self._heap and self._heap[0][0] <= now:
+            due, schedule_id = heapq.heappop(self._heap)
+            if self._due.get(schedule_id) != due:
+                continue  # superseded by a newer entry for the same schedule
+            del self._due[schedule_id]
+            self.dispatch(schedule_id)
+            dispatched += 1
+        return dispatched
+
+    def seconds_until_next(self, now: datetime | None = None) -> float | None:
+        if not self._heap:
+            return None
+        now = now or datetime.now()
+        return max(0.0, (self._heap[0][0] - now).total_seconds())
+
+    # Main loop ----------------------------------------------------------------
+    def run_forever(self) -> None:
+        logger.info(f"Scheduler watching {self.db_path}")
+        self.refresh(force=True)
+        while not self._stop.is_set():
+            self.run_due()
+            wait = self.seconds_until_next()
+            timeout = self.watch_interval if wait is None else min(wait, self.watch_interval)
+            if self._stop.wait(timeout):
+                break
+            self.refresh()
+        logger.info("Scheduler stopped")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Dispatch scheduled emails as they fall due.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Path to the database file. Defaults to $EMAIL_DB_PATH or email_manager.json.",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between checks of the database file for new schedules.",
+    )
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts before giving up.")
+    parser.add_argument(
+        "--base-backoff", type=float, default=60.0, help="Seconds before the first retry."
+    )
+    parser.add_argument(
+        "--rate", type=float, default=None, help="Outbox messages per second overall."
+    )
+    parser.add_argument(
+        "--no-outbox", action="store_true", help="Don't run an outbox worker in this process."
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    dispatcher = ScheduleDispatcher(
+        args.db,
+        watch_interval=args.watch_interval,
+        max_attempts=args.max_attempts,
+        base_backoff=args.base_backoff,
+    )
+    worker = None
+    if not args.no_outbox:
+        try:
+            worker = OutboxWorker(
+                dispatcher.db,
+                rate=args.rate,
+                max_attempts=args.max_attempts,
+                base_backoff=args.base_backoff,
+            ).start()
+        except ValueError as exc:
+            logger.warning(f"Not running the outbox worker: {exc}")
+
+    def stop(*_) -> None:
+        dispatcher.stop()
+        if worker is not None:
+            worker.stop()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, stop)
+    dispatcher.run_forever()
+
+
+if __name__ == "__main__":
+    main()
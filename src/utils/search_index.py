@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import bisect
+import math
+import re
+from collections import Counter
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import dataclass, field
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case ``text`` and split it into alphanumeric tokens (``a.b@x.com`` -> a, b, x, com)."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class SearchPage:
+    """One page of ranked search results."""
+
+    total: int
+    hits: list[tuple[Hashable, float]] = field(default_factory=list)
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking and prefix matching.
+
+    Documents are identified by any hashable key and indexed from a list of text fields.
+    ``add`` replaces an existing document with the same key and ``remove`` drops it, so the
+    index can be kept current incrementally. A query matches documents that contain every
+    query token, where each token also matches any indexed term it is a prefix of.
+
+    Postings are plain dicts so updates stay cheap; scoring converts the postings of each
+    queried term to NumPy arrays (cached until that term changes) and ranks vectorized.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_expansions: int = 64,
+        cache_size: int = 64,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self.cache_size = cache_size
+
+        self._slots: dict[Hashable, int] = {}  # document key -> dense slot
+        self._keys: list[Hashable | None] = []  # slot -> document key (None once removed)
+        self._lengths = np.zeros(1024, dtype=np.float64)  # slot -> token count
+        self._total_len = 0
+        self._doc_terms: dict[int, Counter[str]] = {}
+        self._postings: dict[str, dict[int, int]] = {}
+        self._terms: list[str] = []  # sorted vocabulary, for prefix lookups
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        # Fully ranked slots of recent queries, so paging through them is a slice.
+        self._cache: dict[tuple[str, ...], tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    # Maintenance --------------------------------------------------------------
+    def add(self, key: Hashable, fields: Iterable[str]) -> None:
+        if key in self._slots:
+            self.remove(key)
+        self._cache.clear()
+
+        slot = len(self._keys)
+        self._keys.append(key)
+        self._slots[key] = slot
+        if slot >= len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+
+        terms = Counter(_TOKEN_RE.findall(" ".join(text for text in fields if text).lower()))
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[slot] = tf
+            self._arrays.pop(term, None)
+        length = sum(terms.values())
+        self._doc_terms[slot] = terms
+        self._lengths[slot] = length
+        self._total_len += length
+
+    def remove(self, key: Hashable) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        self._cache.clear()
+        self._keys[slot] = None
+        self._total_len -= int(self._lengths[slot])
+        self._lengths[slot] = 0
+        for term in self._doc_terms.pop(slot):
+            postings = self._postings[term]
+            del postings[slot]
+            self._arrays.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    # Querying -----------------------------------------------------------------
+    def _expand(self, token: str) -> list[str]:
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + "\uffff", start)
+        candidates = self._terms[start:end]
+        if len(candidates) <= self.max_expansions:
+            return candidates
+        # Too many completions: keep the exact term and the most selective ones.
+        candidates.sort(key=lambda t: (t != token, len(self._postings[t])))
+        return candidates[: self.max_expansions]
+
+    def _term_arrays(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            slots = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            arrays = self._arrays[term] = (slots, tfs)
+        return arrays
+
+    def search(
+        self,
+        query: str,
+        offset: int = 0,
+        limit: int = 20,
+        where: Callable[[Hashable], bool] | None = None,
+    ) -> SearchPage:
+        """
+        Rank documents matching every token of ``query``.
+
+        Args:
+            query: Free text; the tokens are ANDed and each one is prefix-matched.
+            offset: Number of ranked hits to skip.
+            limit: Maximum number of hits to return.
+            where: Optional predicate on document keys to restrict the results.
+
+        Returns:
+            The total match count and the requested ``(key, score)`` slice, best first.
+        """
+        tokens = tuple(dict.fromkeys(tokenize(query)))
+        if not tokens or not self._slots:
+            return SearchPage(total=0)
+
+        ranked = self._cache.get(tokens)
+        if ranked is None:
+            ranked = self._rank(tokens)
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[tokens] = ranked
+        slots, scores = ranked
+
+        if where is None:
+            page = range(offset, min(offset + limit, len(slots)))
+            hits = [(self._keys[slots[i]], float(scores[i])) for i in page]
+            return SearchPage(total=len(slots), hits=hits)
+
+        matching = [i for i in range(len(slots)) if where(self._keys[slots[i]])]
+        hits = [(self._keys[slots[i]], float(scores[i])) for i in matching[offset : offset + limit]]
+        return SearchPage(total=len(matching), hits=hits)
+
+    def _rank(self, tokens: tuple[str, ...]) -> tuple[np.ndarray, np.ndarray]:
+        expansions = [self._expand(token) for token in tokens]
+        if not all(expansions):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        n_docs = len(self._slots)
+        size = len(self._keys)
+        lengths = self._lengths[:size]
+        avg_len = self._total_len / n_docs or 1.0
+        k1, b = self.k1, self.b
+
+        total = np.zeros(size)
+        matched = np.ones(size, dtype=bool)
+        for token, terms in zip(tokens, expansions, strict=True):
+            best = np.zeros(size)
+            for term in terms:
+                slots, tfs = self._term_arrays(term)
+                idf = math.log(1 + (n_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                # Exact matches outrank completions of the same prefix.
+                weight = idf * (k1 + 1) * (1.0 if term == token else 0.8)
+                norm = tfs + k1 * (1 - b + b * lengths[slots] / avg_len)
+                # Slots are unique within one term, so a fancy-indexed maximum is safe.
+                best[slots] = np.maximum(best[slots], weight * tfs / norm)
+            matched &= best > 0
+            total += best
+
+        candidates = np.flatnonzero(matched)
+        order = candidates[np.argsort(-total[candidates], kind="stable")]
+        return order, total[order]
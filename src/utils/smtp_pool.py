@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import copy
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from email.mime.base import MIMEBase
+
+import yagmail
+from loguru import logger
+from yagmail.dkim import add_dkim_sig_to_message
+from yagmail.headers import resolve_addresses
+from yagmail.message import prepare_message
+from yagmail.validate import validate_email_with_regex
+
+from utils.metrics import span
+
+# Env vars that configure the shared pool, in addition to EMAIL_SENDER / EMAIL_PASSWORD.
+_ENV_HOST = "EMAIL_SMTP_HOST"
+_ENV_PORT = "EMAIL_SMTP_PORT"
+_ENV_SSL = "EMAIL_SMTP_SSL"
+_ENV_STARTTLS = "EMAIL_SMTP_STARTTLS"
+_ENV_SKIP_LOGIN = "EMAIL_SMTP_SKIP_LOGIN"
+_ENV_MAX_CONNECTIONS = "EMAIL_SMTP_MAX_CONNECTIONS"
+_ENV_MAX_MESSAGES = "EMAIL_SMTP_MAX_MESSAGES"
+
+
+def _env_flag(name: str) -> bool | None:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return None
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _split_attachments(
+    attachments: str | MIMEBase | Sequence[str | MIMEBase] | None,
+) -> tuple[list[str], list[MIMEBase]]:
+    """Separate file paths, which yagmail encodes, from ready-made MIME parts."""
+    if attachments is None:
+        return [], []
+    if isinstance(attachments, (str, MIMEBase)):
+        attachments = [attachments]
+    paths = [item for item in attachments if not isinstance(item, MIMEBase)]
+    parts = [item for item in attachments if isinstance(item, MIMEBase)]
+    return paths, parts
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no SMTP connection becomes available within the acquire timeout."""
+
+
+class PooledConnection:
+    """A logged-in yagmail client plus the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, client: yagmail.SMTP) -> None:
+        self.client = client
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        self.broken = False
+
+    def connect(self) -> None:
+        # yagmail's own ``send`` calls ``login`` on every message, which opens a brand new
+        # connection. We log in once here and talk to ``client.smtp`` directly afterwards.
+        with span("smtp", phase="connect"):
+            self.client.login()
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        self.broken = False
+
+    def is_alive(self) -> bool:
+        smtp = self.client.smtp
+        if smtp is None or self.client.is_closed:
+            return False
+        try:
+            status, _ = smtp.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        return status == 250
+
+    def send(
+        self,
+        to: str | Sequence[str],
+        subject: str,
+        contents: str | Iterable[str],
+        attachments: str | MIMEBase | Sequence[str | MIMEBase] | None = None,
+        message_id: str | None = None,
+    ) -> None:
+        paths, parts = _split_attachments(attachments)
+        with span("smtp", phase="prepare"):
+            if parts:
+                recipients, message = self._prepare_with_parts(
+                    to, subject, contents, paths, parts, message_id
+                )
+            else:
+                recipients, message = self.client.prepare_send(
+                    to=to,
+                    subject=subject,
+                    contents=contents,
+                    attachments=paths or None,
+                    message_id=message_id,
+                )
+        with span("smtp", phase="send"):
+            self.client.smtp.sendmail(self.client.user, recipients, message)
+        self.messages_sent += 1
+        self.last_used = time.monotonic()
+
+    def _prepare_with_parts(
+        self,
+        to: str | Sequence[str],
+        subject: str,
+        contents: str | Iterable[str],
+        paths: list[str],
+        parts: list[MIMEBase],
+        message_id: str | None,
+    ) -> tuple[list[str], bytes | str]:
+        # What ``prepare_send`` does, except that the already encoded parts are attached as
+        # they are instead of being read and encoded again.
+        client = self.client
+        addresses = resolve_addresses(client.user, client.useralias, to, None, None)
+        if client.soft_email_validation:
+            for address in addresses["recipients"]:
+                validate_email_with_regex(address)
+        msg = prepare_message(
+            client.user,
+            client.useralias,
+            addresses,
+            subject,
+            contents,
+            paths or None,
+            None,
+            client.encoding,
+            message_id=message_id,
+        )
+        if client.dkim is not None:
+            # The signature has to cover the real payloads, so take the slow path.
+            for part in parts:
+                msg.attach(part)
+            add_dkim_sig_to_message(msg, client.dkim)
+            return addresses["recipients"], msg.as_string()
+
+        # The generator writes a payload out line by line, which for a large attachment costs
+        # more than encoding it did. Each part goes in as a short placeholder instead and its
+        # payload is spliced into the finished text, all with CRLF line endings so that
+        # smtplib does not rewrite the whole message again.
+        payloads = {}
+        for part in parts:
+            token = f"attachment-{uuid.uuid4().hex}"
+            placeholder = copy.copy(part)
+            placeholder.set_payload(token)
+            msg.attach(placeholder)
+            payloads[token] = part.get_payload()
+        text = msg.as_string(policy=msg.policy.clone(linesep="\r\n"))
+        for token, payload in payloads.items():
+            text = text.replace(token, payload, 1)
+        return addresses["recipients"], text.encode("ascii")
+
+    def close(self) -> None:
+        try:
+            self.client.close()
+        except Exception as exc:  # pragma: no cover - best effort on teardown
+            logger.debug(f"Ignoring error while closing SMTP connection: {exc}")
+
+
+class SMTPPool:
+    """
+    Bounded pool of persistent, logged-in SMTP connections.
+
+    Connections are created lazily, reused across messages and recycled once they have sent
+    ``max_messages_per_connection`` messages. A connection that sat idle longer than
+    ``keepalive_interval`` seconds is probed with ``NOOP`` before reuse, and a send that hits
+    ``SMTPServerDisconnected`` reconnects and retries once.
+
+    Phases are timed into the ``smtp`` histogram of ``utils.metrics``: ``acquire`` (waiting for
+    a free slot), ``connect`` (opening and logging in), ``prepare`` (building the MIME message)
+    and ``send`` (the SMTP transaction).
+    """
+
+    def __init__(
+        self,
+        user: str,
+        password: str | None,
+        host: str = "smtp.gmail.com",
+        port: int | None = None,
+        smtp_ssl: bool = True,
+        smtp_starttls: bool | None = None,
+        smtp_skip_login: bool = False,
+        max_connections: int = 4,
+        max_messages_per_connection: int = 100,
+        keepalive_interval: float = 30.0,
+        acquire_timeout: float = 60.0,
+    ) -> None:
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.smtp_ssl = smtp_ssl
+        self.smtp_starttls = smtp_starttls
+        self.smtp_skip_login = smtp_skip_login
+        self.max_connections = max_connections
+        self.max_messages_per_connection = max_messages_per_connection
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: queue.LifoQueue[PooledConnection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._closed = False
+
+    @classmethod
+    def from_env(cls) -> SMTPPool | None:
+        """Build a pool from environment variables, or return None if credentials are missing."""
+        sender_email = os.getenv("EMAIL_SENDER")
+        sender_password = os.getenv("EMAIL_PASSWORD")
+        skip_login = bool(_env_flag(_ENV_SKIP_LOGIN))
+
+        if not sender_email or (not sender_password and not skip_login):
+            return None
+
+        port = os.getenv(_ENV_PORT)
+        smtp_ssl = _env_flag(_ENV_SSL)
+        return cls(
+            sender_email,
+            sender_password,
+            host=os.getenv(_ENV_HOST, "smtp.gmail.com"),
+            port=int(port) if port else None,
+            smtp_ssl=True if smtp_ssl is None else smtp_ssl,
+            smtp_starttls=_env_flag(_ENV_STARTTLS),
+            smtp_skip_login=skip_login,
+            max_connections=int(os.getenv(_ENV_MAX_CONNECTIONS, "4")),
+            max_messages_per_connection=int(os.getenv(_ENV_MAX_MESSAGES, "100")),
+        )
+
+    # Connection lifecycle -----------------------------------------------------
+    def _new_connection(self) -> PooledConnection:
+        client = yagmail.SMTP(
+            self.user,
+            self.password,
+            host=self.host,
+            port=self.port,
+            smtp_ssl=self.smtp_ssl,
+            smtp_starttls=self.smtp_starttls,
+            smtp_skip_login=self.smtp_skip_login,
+        )
+        conn = PooledConnection(client)
+        conn.connect()
+        logger.debug(f"Opened SMTP connection to {self.host}")
+        return conn
+
+    def _checkout(self) -> PooledConnection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_connection()
+
+            idle_for = time.monotonic() - conn.last_used
+            if idle_for < self.keepalive_interval or conn.is_alive():
+                return conn
+            logger.debug("Discarding stale SMTP connection")
+            conn.close()
+
+    def _checkin(self, conn: PooledConnection) -> None:
+        exhausted = conn.messages_sent >= self.max_messages_per_connection
+        if self._closed or conn.broken or exhausted:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Borrow a live connection for the duration of the ``with`` block."""
+        if self._closed:
+            raise RuntimeError("SMTP pool is closed")
+        with span("smtp", phase="acquire"):
+            acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        if not acquired:
+            raise PoolExhaustedError(
+                f"No SMTP connection available after {self.acquire_timeout:.0f}s"
+            )
+        conn: PooledConnection | None = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server rejected this message but the session itself is still usable.
+            raise
+        except BaseException:
+            if conn is not None:
+                conn.broken = True
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    # Sending ------------------------------------------------------------------
+    def send(
+        self,
+        to: str | Sequence[str],
+        subject: str,
+        contents: str | Iterable[str],
+        attachments: str | MIMEBase | Sequence[str | MIMEBase] | None = None,
+        message_id: str | None = None,
+    ) -> None:
+        """
+        Send one message over a pooled connection, reconnecting once if the server hung up.
+
+        ``attachments`` are file paths, which yagmail reads and encodes for this message, or
+        ready-made MIME parts such as ``AttachmentStore.part`` returns, which are reused as
+        they are. ``message_id`` sets the ``Message-ID`` header; by default yagmail derives one
+        from the sender, recipients and subject.
+        """
+        with self.connection() as conn:
+            try:
+                conn.send(to, subject, contents, attachments, message_id)
+            except smtplib.SMTPServerDisconnected:
+                logger.warning("SMTP server disconnected, reconnecting")
+                conn.close()
+                conn.connect()
+                conn.send(to, subject, contents, attachments, message_id)
+
+    def close(self) -> None:
+        """Close every idle connection and refuse further checkouts."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_shared_pool: SMTPPool | None = None
+_shared_pool_key: tuple | None = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool | None:
+    """
+    Return the process-wide SMTP pool, creating it from environment variables on first use.
+
+    The pool is rebuilt if the sender configuration in the environment changes. Returns None
+    when sender credentials are not configured.
+    """
+    global _shared_pool, _shared_pool_key
+
+    key = tuple(
+        os.getenv(name)
+        for name in (
+            "EMAIL_SENDER",
+            "EMAIL_PASSWORD",
+            _ENV_HOST,
+            _ENV_PORT,
+            _ENV_SSL,
+            _ENV_STARTTLS,
+            _ENV_SKIP_LOGIN,
+            _ENV_MAX_CONNECTIONS,
+            _ENV_MAX_MESSAGES,
+        )
+    )
+    with _shared_pool_lock:
+        if _shared_pool is not None and _shared_pool_key == key:
+            return _shared_pool
+        if _shared_pool is not None:
+            _shared_pool.close()
+        _shared_pool = SMTPPool.from_env()
+        _shared_pool_key = key
+        return _shared_pool
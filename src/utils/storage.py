@@ -0,0 +1,669 @@
+"""
+Storage backends for ``DatabaseManager``.
+
+A backend is any object with ``table(name)`` and ``close()``, where each table offers the
+subset of TinyDB's ``Table`` API that ``DatabaseManager`` uses. TinyDB itself is the JSON
+backend, over ``CachedJSONStorage`` so the file is parsed once per process. ``SQLiteStorage``
+keeps each table in SQLite with WAL journaling and expression indexes on the date and
+foreign-key fields, so writes no longer rewrite the whole database.
+
+Both storages offer ``transaction()``, which groups writes into one durable commit and rolls
+them back on error, and an optional write-behind mode that defers commits until
+``flush_every`` writes have queued up or ``flush_interval`` seconds have passed. A transaction
+excludes those of other processes on the same database: SQLite takes its write lock, and the
+JSON storage holds an ``flock`` on a ``.lock`` file next to the database.
+
+Convert an existing JSON file once with::
+
+    python -m utils.storage migrate email_manager.json email_manager.db
+
+and move sent-email bodies written by older versions into the deduplicated ``bodies`` table
+with::
+
+    python -m utils.storage compact email_manager.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import fcntl
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Callable, Iterable, Iterator, Mapping, MutableMapping, Sequence
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+from tinydb import Storage, TinyDB
+from tinydb.queries import QueryLike
+from tinydb.table import Document, Table
+
+from utils.metrics import span
+
+TABLE_NAMES = (
+    "profiles",
+    "templates",
+    "sent_emails",
+    "reminders",
+    "schedules",
+    "user_profile",
+    "bodies",
+    "campaigns",
+    "stats",
+    "outbox",
+)
+
+# Fields that get a SQLite expression index, per table.
+INDEXED_FIELDS: dict[str, tuple[str, ...]] = {
+    "sent_emails": ("sent_date",),
+    "reminders": ("email_id", "campaign_id", "reminder_date"),
+    "schedules": ("email_id", "campaign_id", "schedule_date"),
+    "campaigns": ("sent_date",),
+    "bodies": ("hash",),
+    "outbox": ("key", "campaign_id"),
+}
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+class _FlushPolicy:
+    """Write-behind bookkeeping: flush after ``every`` deferred writes or ``interval`` seconds."""
+
+    def __init__(
+        self,
+        flush: Callable[[], None],
+        every: int,
+        interval: float,
+        lock: Callable[[], AbstractContextManager[Any]],
+    ) -> None:
+        self._flush = flush
+        self.every = every
+        self.interval = interval
+        self._lock = lock
+        self.pending = 0
+        self._timer: threading.Timer | None = None
+
+    def record(self) -> None:
+        self.pending += 1
+        if self.pending >= self.every:
+            self._flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.interval, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def reset(self) -> None:
+        self.pending = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self) -> None:
+        with self._lock():
+            self._timer = None
+            if self.pending:
+                self._flush()
+
+
+class CachedJSONStorage(Storage):
+    """
+    TinyDB storage that keeps the parsed JSON document in memory.
+
+    TinyDB's default ``JSONStorage`` re-reads and re-parses the file on every table access.
+    This storage parses it once and serves reads from memory, re-reading only when the file's
+    mtime or size shows another process (such as the scheduler) has written to it. Writes go
+    to disk atomically via a temporary file and ``os.replace``, either immediately or, in
+    write-behind mode, in batches.
+
+    ``lock`` should be the lock that guards every read-modify-write on the database; the
+    write-behind timer takes it before flushing so it never serializes a half-applied update.
+    Transactions also hold an exclusive ``flock`` on ``<path>.lock`` from the read of the file
+    to the write that ends them, so those of several processes apply one after the other. In
+    write-behind mode the write is deferred past the unlock unless the transaction is
+    ``durable``, so only durable transactions are safe against concurrent processes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        encoding: str = "utf-8",
+        write_behind: bool = False,
+        flush_every: int = 100,
+        flush_interval: float = 2.0,
+        lock: Callable[[], AbstractContextManager[Any]] | None = None,
+    ) -> None:
+        self.path = path
+        self.encoding = encoding
+        self.write_behind = write_behind
+        self._data: dict[str, dict[str, Any]] | None = None
+        self._stamp: tuple[int, int] | None = None
+        self._loads = 0
+        self._dirty = False
+        self._tx_depth = 0
+        self._lock_file: int | None = None
+        self._policy = _FlushPolicy(self.flush, flush_every, flush_interval, lock or nullcontext)
+        if write_behind:
+            atexit.register(self.flush)
+        if not os.path.exists(path):
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._persist({})
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def read(self) -> dict[str, dict[str, Any]] | None:
+        # Unflushed changes in memory always win over the file on disk.
+        if self._data is not None and (self._dirty or self._tx_depth):
+            return self._data
+        stamp = self._stat()
+        if self._data is None or stamp != self._stamp:
+            with span("storage_io", backend="json", op="read"):
+                with open(self.path, encoding=self.encoding) as handle:
+                    raw = handle.read()
+                self._data = json.loads(raw) if raw.strip() else {}
+            self._stamp = stamp
+            self._loads += 1
+        return self._data
+
+    def generation(self) -> int:
+        """A number that changes whenever the file is re-read after another process wrote it."""
+        self.read()
+        return self._loads
+
+    def write(self, data: dict[str, dict[str, Any]]) -> None:
+        self._data = data
+        if self._tx_depth:
+            self._dirty = True
+        elif self.write_behind:
+            self._dirty = True
+            self._policy.record()
+        else:
+            self._persist(data)
+
+    def _persist(self, data: dict[str, dict[str, Any]]) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+        try:
+            with span("storage_io", backend="json", op="write"):
+                with os.fdopen(fd, "w", encoding=self.encoding) as handle:
+                    # dumps() runs the C encoder; dump() to a file encodes chunk by chunk.
+                    handle.write(json.dumps(data))
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._data = data
+        self._stamp = self._stat()
+        self._dirty = False
+        self._policy.reset()
+
+    def flush(self) -> None:
+        """Write any deferred changes to disk now."""
+        if self._dirty and not self._tx_depth and self._data is not None:
+            self._persist(self._data)
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # Only the outermost transaction locks; flock is per open file, not re-entrant.
+        if self._lock_file is not None:
+            yield
+            return
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with span("storage_io", backend="json", op="lock"):
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            self._lock_file = fd
+            yield
+        finally:
+            self._lock_file = None
+            os.close(fd)  # also releases the lock
+
+    @contextmanager
+    def transaction(self, durable: bool = False) -> Iterator[None]:
+        """
+        Apply all writes in the block with one durable write, or none of them on error.
+
+        With ``durable``, the write happens before the block returns even in write-behind mode.
+        """
+        with self._file_lock():
+            # Under the lock, so the snapshot includes every write another process finished.
+            # The data is plain JSON, and a C-level round trip copies it far faster than
+            # deepcopy.
+            snapshot = json.loads(json.dumps(self.read()))
+            was_dirty = self._dirty
+            self._tx_depth += 1
+            try:
+                yield
+            except BaseException:
+                self._tx_depth -= 1
+                self._data = snapshot
+                self._dirty = was_dirty
+                raise
+            self._tx_depth -= 1
+            if not self._tx_depth and self._dirty:
+                if self.write_behind and not durable:
+                    self._policy.record()
+                else:
+                    self._persist(self._data)
+
+    def close(self) -> None:
+        self.flush()
+
+
+class _JSONTable(Table):
+    """
+    TinyDB table that notices when another process has written the file.
+
+    TinyDB caches the next free document id and the results of past searches per table. Both
+    go stale once the storage re-reads a file another process changed, and the stale id makes
+    the next insert fail with "Document with ID ... already exists".
+    """
+
+    _generation: int | None = None
+
+    def _sync(self) -> None:
+        generation = self._storage.generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._next_id = None
+            self.clear_cache()
+
+    def _get_next_id(self) -> int:
+        self._sync()
+        return super()._get_next_id()
+
+    def search(self, cond: QueryLike) -> list[Document]:
+        self._sync()
+        return super().search(cond)
+
+
+class _JSONDatabase(TinyDB):
+    table_class = _JSONTable
+
+
+class SQLiteTable:
+    """A TinyDB-compatible table whose documents live as JSON rows in SQLite."""
+
+    def __init__(self, storage: SQLiteStorage, name: str) -> None:
+        self.name = name
+        self._storage = storage
+        self._conn = storage.conn
+        self._lock = storage.lock
+        with self._lock:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" '
+                "(doc_id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)"
+            )
+            for field in INDEXED_FIELDS.get(name, ()):
+                self._conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "ix_{name}_{field}" '
+                    f"ON \"{name}\" (json_extract(data, '$.{field}'))"
+                )
+
+    # Reads --------------------------------------------------------------------
+    def _rows(self, sql: str, params: Iterable[Any] = ()) -> list[Document]:
+        with self._lock:
+            rows = self._conn.execute(sql, tuple(params)).fetchall()
+        return [Document(json.loads(data), doc_id=doc_id) for doc_id, data in rows]
+
+    def all(self) -> list[Document]:
+        return self._rows(f'SELECT doc_id, data FROM "{self.name}" ORDER BY doc_id')
+
+    def __iter__(self) -> Iterator[Document]:
+        return iter(self.all())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM "{self.name}"').fetchone()[0]
+
+    def search(self, cond: QueryLike) -> list[Document]:
+        return [doc for doc in self.all() if cond(doc)]
+
+    def get(
+        self,
+        cond: QueryLike | None = None,
+        doc_id: int | None = None,
+        doc_ids: list[int] | None = None,
+    ) -> Document | list[Document] | None:
+        if doc_id is not None:
+            rows = self._rows(f'SELECT doc_id, data FROM "{self.name}" WHERE doc_id = ?', [doc_id])
+            return rows[0] if rows else None
+        if doc_ids is not None:
+            return self._by_ids(doc_ids)
+        if cond is not None:
+            return next((doc for doc in self.all() if cond(doc)), None)
+        raise RuntimeError("You have to pass either cond, doc_id or doc_ids")
+
+    def search_in(self, field: str, values: Iterable[Any]) -> list[Document]:
+        """Return the documents whose ``field`` is one of ``values``, via its index if any."""
+        values = list(values)
+        if not values:
+            return []
+        marks = ",".join("?" * len(values))
+        return self._rows(
+            f'SELECT doc_id, data FROM "{self.name}" '
+            f"WHERE json_extract(data, '$.{field}') IN ({marks})",
+            values,
+        )
+
+    def page_after(
+        self, doc_id: int, limit: int, fields: Sequence[str] | None = None
+    ) -> list[Document]:
+        """
+        Return up to ``limit`` documents with ids greater than ``doc_id``, in id order.
+
+        With ``fields``, SQLite extracts just those top-level fields and hands the whole page
+        back as one JSON array, so Python decodes one string per page instead of one per row.
+        """
+        page = f'SELECT doc_id, data FROM "{self.name}" WHERE doc_id > ? ORDER BY doc_id LIMIT ?'
+        if not fields:
+            return self._rows(page, [doc_id, limit])
+        values = ", ".join(f"json_extract(data, '$.{field}')" for field in fields)
+        with self._lock:
+            (text,) = self._conn.execute(
+                f"SELECT json_group_array(json_array(doc_id, {values})) FROM ({page})",
+                (doc_id, limit),
+            ).fetchone()
+        # Aggregates do not promise to keep the subquery's order; a sorted list sorts in O(n).
+        rows = sorted(json.loads(text), key=lambda row: row[0])
+        return [Document(dict(zip(fields, row[1:], strict=True)), doc_id=row[0]) for row in rows]
+
+    def _by_ids(self, doc_ids: Iterable[int]) -> list[Document]:
+        ids = list(doc_ids)
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        return self._rows(
+            f'SELECT doc_id, data FROM "{self.name}" WHERE doc_id IN ({marks}) ORDER BY doc_id', ids
+        )
+
+    def _target_ids(self, cond: QueryLike | None, doc_ids: Iterable[int] | None) -> list[int]:
+        if doc_ids is not None:
+            return list(doc_ids)
+        if cond is not None:
+            return [doc.doc_id for doc in self.all() if cond(doc)]
+        return [doc.doc_id for doc in self.all()]
+
+    # Writes -------------------------------------------------------------------
+    def insert(self, document: Mapping) -> int:
+        return self.insert_multiple([document])[0]
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> list[int]:
+        doc_ids: list[int] = []
+        with self._lock, self._storage.write():
+            for document in documents:
+                if isinstance(document, Document):
+                    self._conn.execute(
+                        f'INSERT INTO "{self.name}" (doc_id, data) VALUES (?, ?)',
+                        (document.doc_id, json.dumps(document)),
+                    )
+                    doc_ids.append(document.doc_id)
+                else:
+                    cursor = self._conn.execute(
+                        f'INSERT INTO "{self.name}" (data) VALUES (?)', (json.dumps(document),)
+                    )
+                    doc_ids.append(cursor.lastrowid)
+        return doc_ids
+
+    def update(
+        self,
+        fields: Mapping | Callable[[MutableMapping], None],
+        cond: QueryLike | None = None,
+        doc_ids: Iterable[int] | None = None,
+    ) -> list[int]:
+        with self._lock, self._storage.write():
+            docs = self._by_ids(self._target_ids(cond, doc_ids))
+            for doc in docs:
+                if callable(fields):
+                    fields(doc)
+                else:
+                    doc.update(fields)
+                self._conn.execute(
+                    f'UPDATE "{self.name}" SET data = ? WHERE doc_id = ?',
+                    (json.dumps(doc), doc.doc_id),
+                )
+        return [doc.doc_id for doc in docs]
+
+    def remove(
+        self, cond: QueryLike | None = None, doc_ids: Iterable[int] | None = None
+    ) -> list[int]:
+        if cond is None and doc_ids is None:
+            raise RuntimeError("Use truncate() to remove all documents")
+        ids = self._target_ids(cond, doc_ids)
+        if ids:
+            marks = ",".join("?" * len(ids))
+            with self._lock, self._storage.write():
+                self._conn.execute(f'DELETE FROM "{self.name}" WHERE doc_id IN ({marks})', ids)
+        return ids
+
+    def truncate(self) -> None:
+        with self._lock, self._storage.write():
+            self._conn.execute(f'DELETE FROM "{self.name}"')
+
+    def clear_cache(self) -> None:
+        """Present for parity with TinyDB's ``Table``; SQLite tables keep no query cache."""
+
+
+class SQLiteStorage:
+    """SQLite database in WAL mode holding one JSON-document table per collection."""
+
+    def __init__(
+        self,
+        path: str,
+        write_behind: bool = False,
+        flush_every: int = 100,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self.path = path
+        self.write_behind = write_behind
+        self.lock = threading.RLock()
+        # Autocommit mode; ``write`` manages transactions explicitly.
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._depth = 0
+        self._tables: dict[str, SQLiteTable] = {}
+        self._policy = _FlushPolicy(self.flush, flush_every, flush_interval, lambda: self.lock)
+        if write_behind:
+            atexit.register(self.flush)
+
+    def table(self, name: str) -> SQLiteTable:
+        if name not in self._tables:
+            self._tables[name] = SQLiteTable(self, name)
+        return self._tables[name]
+
+    def write(self) -> _SQLiteWrite:
+        return _SQLiteWrite(self)
+
+    def generation(self) -> int:
+        """A number that changes whenever another connection commits to the database."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def transaction(self, durable: bool = False) -> _SQLiteWrite:
+        """
+        Apply all writes in the block in one SQLite transaction, or none of them on error.
+
+        With ``durable``, the outermost block commits even in write-behind mode.
+        """
+        return _SQLiteWrite(self, durable)
+
+    def flush(self) -> None:
+        """Commit any writes held back by write-behind mode."""
+        with self.lock:
+            if not self._depth and self.conn.in_transaction:
+                with span("storage_io", backend="sqlite", op="commit"):
+                    self.conn.execute("COMMIT")
+            self._policy.reset()
+
+    def close(self) -> None:
+        with self.lock:
+            self.flush()
+            self.conn.close()
+        atexit.unregister(self.flush)
+
+
+class _SQLiteWrite:
+    """
+    Re-entrant write block. Each level is a savepoint so an inner failure only undoes its own
+    writes; the outermost level commits, or in write-behind mode leaves the transaction open
+    for the flush policy to commit unless it is ``durable``.
+    """
+
+    def __init__(self, storage: SQLiteStorage, durable: bool = False) -> None:
+        self.storage = storage
+        self.durable = durable
+
+    def __enter__(self) -> None:
+        storage = self.storage
+        storage.lock.acquire()
+        try:
+            if not storage.conn.in_transaction:
+                storage.conn.execute("BEGIN IMMEDIATE")
+            storage.conn.execute(f"SAVEPOINT w{storage._depth}")
+        except BaseException:
+            storage.lock.release()
+            raise
+        storage._depth += 1
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        storage = self.storage
+        try:
+            storage._depth -= 1
+            name = f"w{storage._depth}"
+            if exc_type:
+                storage.conn.execute(f"ROLLBACK TO {name}")
+            storage.conn.execute(f"RELEASE {name}")
+            if not storage._depth:
+                if exc_type and not storage._policy.pending:
+                    # Nothing else is waiting in the transaction; end it rather than leave the
+                    # database locked by an empty BEGIN IMMEDIATE.
+                    storage.conn.execute("ROLLBACK")
+                elif storage.write_behind and not exc_type and not self.durable:
+                    storage._policy.record()
+                else:
+                    # Also reached on error in write-behind mode: commit the earlier deferred
+                    # writes now, since no new write is left to trigger the flush policy.
+                    with span("storage_io", backend="sqlite", op="commit"):
+                        storage.conn.execute("COMMIT")
+                    storage._policy.reset()
+        finally:
+            storage.lock.release()
+
+
+def iter_chunks(
+    table: Any, chunk_size: int = 1000, fields: Sequence[str] | None = None
+) -> Iterator[list[Document]]:
+    """
+    Yield the documents of ``table`` in id order, ``chunk_size`` at a time.
+
+    SQLite tables are paged with keyset queries, so only one chunk is loaded at a time. TinyDB
+    tables already live in memory; they are sliced by id so each chunk is still a fresh copy.
+    ``fields`` narrows each document to those top-level fields; missing ones come back None.
+    """
+    if isinstance(table, SQLiteTable):
+        after = 0
+        while chunk := table.page_after(after, chunk_size, fields):
+            yield chunk
+            after = chunk[-1].doc_id
+        return
+    ids = sorted(doc.doc_id for doc in table)
+    for start in range(0, len(ids), chunk_size):
+        docs = (table.get(doc_id=doc_id) for doc_id in ids[start : start + chunk_size])
+        chunk = [doc for doc in docs if doc is not None]
+        if fields:
+            chunk = [Document({f: doc.get(f) for f in fields}, doc.doc_id) for doc in chunk]
+        if chunk:
+            yield chunk
+
+
+def open_storage(
+    db_path: str,
+    write_behind: bool = False,
+    flush_every: int = 100,
+    flush_interval: float = 2.0,
+    lock: Callable[[], AbstractContextManager[Any]] | None = None,
+) -> TinyDB | SQLiteStorage:
+    """Open the backend matching ``db_path``: SQLite for .db/.sqlite files, TinyDB otherwise."""
+    if Path(db_path).suffix.lower() in SQLITE_SUFFIXES:
+        return SQLiteStorage(
+            db_path,
+            write_behind=write_behind,
+            flush_every=flush_every,
+            flush_interval=flush_interval,
+        )
+    return _JSONDatabase(
+        db_path,
+        storage=CachedJSONStorage,
+        write_behind=write_behind,
+        flush_every=flush_every,
+        flush_interval=flush_interval,
+        lock=lock,
+    )
+
+
+def migrate_json_to_sqlite(json_path: str, sqlite_path: str) -> dict[str, int]:
+    """
+    Copy every table of a TinyDB JSON file into a SQLite database, preserving document ids.
+
+    Args:
+        json_path: Existing TinyDB JSON file.
+        sqlite_path: SQLite file to create. Tables that already hold rows are refused.
+
+    Returns:
+        Number of documents copied per table.
+    """
+    source = TinyDB(json_path)
+    target = SQLiteStorage(sqlite_path)
+    counts: dict[str, int] = {}
+    try:
+        for name in sorted(set(TABLE_NAMES) | source.tables()):
+            table = target.table(name)
+            if len(table):
+                raise RuntimeError(f"Table {name!r} in {sqlite_path} is not empty")
+            docs = source.table(name).all()
+            table.insert_multiple(Document(dict(doc), doc_id=doc.doc_id) for doc in docs)
+            counts[name] = len(docs)
+            logger.info(f"Migrated {len(docs)} documents into {name}")
+    finally:
+        source.close()
+        target.close()
+    return counts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Database storage utilities.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Copy a TinyDB JSON file into SQLite.")
+    migrate.add_argument("json_path", help="Source JSON database, e.g. email_manager.json.")
+    migrate.add_argument("sqlite_path", help="Target SQLite database, e.g. email_manager.db.")
+    compact = commands.add_parser("compact", help="Deduplicate stored sent-email bodies.")
+    compact.add_argument("db_path", help="Database to compact, JSON or SQLite.")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        counts = migrate_json_to_sqlite(args.json_path, args.sqlite_path)
+        logger.success(f"Migrated {sum(counts.values())} documents to {args.sqlite_path}")
+    elif args.command == "compact":
+        from utils.db import DatabaseManager  # db imports this module
+
+        stats = DatabaseManager(args.db_path).compact_bodies()
+        logger.success(
+            f"Moved {stats['moved']} bodies into {stats['bodies']} unique rows, "
+            f"removed {stats['removed']} unused"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+# {{ name }}, {{user.name}}, {{ signature }} ...
+_PLACEHOLDER_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_.]*)\s*\}\}")
+
+RECIPIENT_FIELDS = ("name", "first_name", "email", "title", "profession")
+USER_FIELDS = ("name", "title", "degree", "university", "profession")
+
+
+class CompiledTemplate:
+    """
+    A template body parsed once into literal text and placeholder slots.
+
+    Rendering fills the slots through a single ``str.format`` call, so the per-recipient
+    cost is one dict lookup per placeholder. Placeholders with no value in the context are
+    left in the output unchanged, so typos stay visible instead of silently disappearing.
+    """
+
+    __slots__ = ("source", "fields", "_format", "_raw")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        fields: list[str] = []
+        raw: list[str] = []
+        parts: list[str] = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(source):
+            parts.append(_escape_braces(source[position : match.start()]))
+            parts.append(f"{{{len(fields)}}}")
+            fields.append(match.group(1))
+            raw.append(match.group(0))
+            position = match.end()
+        parts.append(_escape_braces(source[position:]))
+        self.fields = tuple(fields)
+        self._raw = tuple(raw)
+        self._format = "".join(parts)
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        if not self.fields:
+            return self.source
+        values = [
+            context.get(field, raw) for field, raw in zip(self.fields, self._raw, strict=True)
+        ]
+        return self._format.format(*values)
+
+
+def _escape_braces(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def user_context(user_profile: Mapping[str, Any] | None) -> dict[str, str]:
+    """Placeholders describing the sender: ``{{user.name}}``, ``{{signature}}`` and so on."""
+    profile = user_profile or {}
+    context = {f"user.{field}": profile.get(field, "") or "" for field in USER_FIELDS}
+    context["signature"] = profile.get("signature", "") or ""
+    return context
+
+
+def recipient_context(profile: Mapping[str, Any]) -> dict[str, str]:
+    """Placeholders describing one recipient profile: ``{{name}}``, ``{{title}}`` and so on."""
+    name = (profile.get("name") or "").strip()
+    return {
+        "name": name,
+        "first_name": name.split()[0] if name else "",
+        "email": profile.get("email", ""),
+        "title": profile.get("title", ""),
+        "profession": profile.get("profession", ""),
+    }
+
+
+def render_batch(
+    template: CompiledTemplate,
+    profiles: Sequence[Mapping[str, Any]],
+    user_profile: Mapping[str, Any] | None = None,
+    suffix: str = "",
+) -> list[str]:
+    """
+    Render ``template`` once per recipient profile.
+
+    The sender context is built once for the whole batch; only the recipient fields change
+    between renders. ``suffix`` (for example a signature block) is appended to every body.
+    """
+    if not template.fields:
+        return [template.source + suffix] * len(profiles)
+    context = user_context(user_profile)
+    bodies = []
+    for profile in profiles:
+        context.update(recipient_context(profile))
+        bodies.append(template.render(context) + suffix)
+    return bodies
+
+
+class TemplateCache:
+    """Compiled templates keyed by template ``doc_id``; entries are dropped when invalidated."""
+
+    def __init__(self) -> None:
+        self._compiled: dict[int, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+
+    def get(self, template_id: int, body: str) -> CompiledTemplate:
+        with self._lock:
+            compiled = self._compiled.get(template_id)
+            if compiled is None or compiled.source != body:
+                compiled = self._compiled[template_id] = CompiledTemplate(body)
+            return compiled
+
+    def invalidate(self, template_id: int | None = None) -> None:
+        with self._lock:
+            if template_id is None:
+                self._compiled.clear()
+            else:
+                self._compiled.pop(template_id, None)
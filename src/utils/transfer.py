@@ -0,0 +1,280 @@
+"""
+Streaming import of contacts and export of sending history.
+
+Run from the ``src`` directory::
+
+    python -m utils.transfer import-profiles contacts.csv
+    python -m utils.transfer export sent_emails history.jsonl
+    python -m utils.transfer export profiles contacts.csv
+
+Imports read CSV (with a header row) or JSON Lines one record at a time and insert them in
+chunks through ``DatabaseManager.add_profiles``, so memory stays bounded by the chunk size
+whatever the file size. Records are validated, and emails already stored or repeated in the
+file are skipped. Exports stream rows out of the database chunk by chunk in the same way.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import sys
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import IO, Any
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from utils.db import PROFILE_FIELDS, DatabaseManager
+
+FORMATS = ("csv", "jsonl")
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Columns written per exported table. Campaigns are flattened to one row per recipient.
+# Exported profiles can be imported again.
+EXPORT_COLUMNS: dict[str, tuple[str, ...]] = {
+    "profiles": ("id", *PROFILE_FIELDS),
+    "sent_emails": ("id", "recipients", "subject", "body", "sent_date"),
+    "campaigns": (
+        "campaign_id",
+        "kind",
+        "sent_date",
+        "recipient",
+        "subject",
+        "body",
+        "status",
+        "error",
+    ),
+    "reminders": ("id", "email_id", "campaign_id", "reminder_date"),
+    "schedules": (
+        "id",
+        "email_id",
+        "campaign_id",
+        "schedule_date",
+        "status",
+        "attempts",
+        "next_attempt",
+        "error",
+    ),
+}
+
+
+def detect_format(path: str | Path) -> str:
+    """Guess ``csv`` or ``jsonl`` from a file name, defaulting to CSV."""
+    return "jsonl" if Path(path).suffix.lower() in {".jsonl", ".ndjson", ".json"} else "csv"
+
+
+# Import -----------------------------------------------------------------------
+@dataclass
+class ImportReport:
+    """Counts from one import, with the first few validation errors."""
+
+    read: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    MAX_ERRORS = 20
+
+    def reject(self, line: int, reason: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[tuple[int, Mapping[str, Any] | None]]:
+    """
+    Yield ``(line, record)`` pairs from a CSV or JSON Lines text stream, one at a time.
+
+    Blank JSONL lines are skipped; lines that are not a JSON object yield ``None``.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, {k.strip().lower(): v for k, v in record.items() if k}
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError:
+            record = None
+        yield line, record if isinstance(record, dict) else None
+
+
+def validate_profile(record: Mapping[str, Any] | None) -> tuple[dict[str, str] | None, str]:
+    """Normalize one imported record into a profile, or return the reason it is rejected."""
+    if record is None:
+        return None, "not a JSON object"
+    profile = {name: str(record.get(name) or "").strip() for name in PROFILE_FIELDS}
+    if not profile["email"]:
+        return None, "missing email"
+    if not _EMAIL_RE.match(profile["email"]):
+        return None, f"invalid email {profile['email']!r}"
+    if not profile["name"]:
+        return None, "missing name"
+    return profile, ""
+
+
+def import_profiles(
+    db: DatabaseManager,
+    stream: IO[str],
+    fmt: str = "csv",
+    chunk_size: int = 1000,
+    on_chunk: Callable[[ImportReport], None] | None = None,
+) -> ImportReport:
+    """
+    Stream profiles from ``stream`` into the database in chunks.
+
+    Args:
+        db: Database to import into.
+        stream: Text stream of CSV (with a header row) or JSON Lines records.
+        fmt: ``csv`` or ``jsonl``.
+        chunk_size: Records validated and inserted per write.
+        on_chunk: Called with the running report after each chunk, e.g. for progress.
+
+    Returns:
+        How many records were read, inserted, skipped as duplicates and rejected.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    report = ImportReport()
+    records = read_records(stream, fmt)
+    while chunk := list(islice(records, chunk_size)):
+        valid = []
+        for line, record in chunk:
+            profile, reason = validate_profile(record)
+            if profile is None:
+                report.reject(line, reason)
+            else:
+                valid.append(profile)
+        inserted = len(db.add_profiles(valid))
+        report.read += len(chunk)
+        report.inserted += inserted
+        report.duplicates += len(valid) - inserted
+        if on_chunk is not None:
+            on_chunk(report)
+    return report
+
+
+# Export -----------------------------------------------------------------------
+def export_rows(
+    db: DatabaseManager, table: str, chunk_size: int = 1000
+) -> Iterator[dict[str, Any]]:
+    """Yield the rows of ``table`` shaped for export, streaming from the database."""
+    if table not in EXPORT_COLUMNS:
+        raise ValueError(f"Cannot export table: {table}")
+    for doc in db.iter_table(table, chunk_size=chunk_size):
+        if table == "campaigns":
+            yield from _campaign_rows(doc)
+        else:
+            yield {"id": doc.doc_id, **doc}
+
+
+def _campaign_rows(campaign: Mapping[str, Any]) -> Iterable[dict[str, Any]]:
+    for recipient, subject, body, status in zip(
+        campaign["recipients"],
+        campaign["subjects"],
+        campaign["bodies"],
+        campaign["statuses"],
+        strict=True,
+    ):
+        yield {
+            "campaign_id": campaign.doc_id,
+            "kind": campaign["kind"],
+            "sent_date": campaign["sent_date"],
+            "recipient": recipient,
+            "subject": subject,
+            "body": body,
+            "status": status,
+            "error": campaign["errors"].get(recipient),
+        }
+
+
+def write_rows(
+    rows: Iterable[Mapping[str, Any]], stream: IO[str], fmt: str, columns: tuple[str, ...]
+) -> int:
+    """Write ``rows`` to ``stream`` as CSV or JSON Lines; return how many were written."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            # Lists such as recipients become "a@x.com;b@y.com" in a CSV cell.
+            writer.writerow({k: ";".join(v) if isinstance(v, list) else v for k, v in row.items()})
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps({k: row.get(k) for k in columns}) + "\n")
+            count += 1
+    return count
+
+
+def export_table(
+    db: DatabaseManager, table: str, stream: IO[str], fmt: str = "jsonl", chunk_size: int = 1000
+) -> int:
+    """Stream ``table`` to ``stream``; return the number of rows written."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if table not in EXPORT_COLUMNS:
+        raise ValueError(f"Cannot export table: {table}")
+    return write_rows(export_rows(db, table, chunk_size), stream, fmt, EXPORT_COLUMNS[table])
+
+
+# CLI --------------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Import contacts and export sending history.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Path to the database file. Defaults to $EMAIL_DB_PATH or email_manager.json.",
+    )
+    parser.add_argument("--format", choices=FORMATS, help="File format; guessed from the name.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per database write.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import-profiles", help="Import contacts from CSV or JSONL.")
+    importer.add_argument("path", help="File to import, or - for stdin.")
+    exporter = commands.add_parser("export", help="Export a table to CSV or JSONL.")
+    exporter.add_argument("table", choices=list(EXPORT_COLUMNS))
+    exporter.add_argument("path", help="File to write, or - for stdout.")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = DatabaseManager(args.db)
+    fmt = args.format or detect_format(args.path)
+
+    if args.command == "import-profiles":
+        if args.path == "-":
+            report = import_profiles(db, sys.stdin, fmt, args.chunk_size)
+        else:
+            with open(args.path, encoding="utf-8-sig", newline="") as stream:
+                report = import_profiles(
+                    db,
+                    stream,
+                    fmt,
+                    args.chunk_size,
+                    on_chunk=lambda r: logger.info(f"Read {r.read} records"),
+                )
+        for error in report.errors:
+            logger.warning(error)
+        logger.success(
+            f"Imported {report.inserted} of {report.read} profiles "
+            f"({report.duplicates} duplicates, {report.invalid} invalid)"
+        )
+    else:
+        if args.path == "-":
+            count = export_table(db, args.table, sys.stdout, fmt, args.chunk_size)
+        else:
+            with open(args.path, "w", encoding="utf-8", newline="") as stream:
+                count = export_table(db, args.table, stream, fmt, args.chunk_size)
+        logger.success(f"Exported {count} {args.table} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from collections.abc import Hashable
+
+import streamlit as st
+
+
+def current_page(key: str, filters: Hashable = None) -> int:
+    """
+    Return the page number stored under ``key`` in the session, starting from 0.
+
+    The page goes back to 0 whenever ``filters`` (e.g. a tuple of the query and sort order)
+    differs from the previous run, so a new filter never lands on an empty page.
+    """
+    if st.session_state.get(f"{key}_filters") != filters or key not in st.session_state:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[key] = 0
+    return st.session_state[key]
+
+
+def pager(key: str, total: int, page_size: int) -> None:
+    """Render Previous / Page x of y / Next controls that move the page stored under ``key``."""
+    pages = (total + page_size - 1) // page_size
+    if pages <= 1:
+        return
+    page = st.session_state.get(key, 0)
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("← Previous", key=f"{key}_prev", disabled=page == 0, use_container_width=True):
+            st.session_state[key] = page - 1
+            st.rerun()
+    with info_col:
+        st.caption(f"Page {page + 1} of {pages}")
+    with next_col:
+        if st.button(
+            "Next →", key=f"{key}_next", disabled=page + 1 >= pages, use_container_width=True
+        ):
+            st.session_state[key] = page + 1
+            st.rerun()
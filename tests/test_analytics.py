@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+from utils import analytics
+from utils.db import DatabaseManager
+
+
+@pytest.fixture(params=["email_manager.json", "email_manager.db"])
+def db(request, tmp_path):
+    db = DatabaseManager(str(tmp_path / request.param))
+    db.add_profile("Ann", "ann@example.com", "Dr.", "Doctor")
+    db.add_sent_email([" Ann@Example.com", "bob@test.org"], "Hi", "Body", datetime(2024, 5, 6, 9))
+    db.add_campaign(
+        ["ann@example.com", "cid@test.org", "dee@test.org"],
+        ["Hello"] * 3,
+        ["Body"] * 3,
+        datetime(2024, 5, 6, 11, 30),
+        statuses=["sent", "failed", "pending"],
+    )
+    return db
+
+
+def test_load_history_has_a_row_per_recipient_sent_or_failed(db):
+    history = analytics.load_history(db, chunk_size=1)
+
+    assert len(history) == 4
+    assert list(history["recipient"]) == [
+        "ann@example.com",
+        "bob@test.org",
+        "ann@example.com",
+        "cid@test.org",
+    ]
+    assert list(history["status"]) == ["sent", "sent", "sent", "failed"]
+    assert list(history["domain"]) == ["example.com", "test.org", "example.com", "test.org"]
+    assert list(history["profession"]) == ["Doctor", "Unknown", "Doctor", "Unknown"]
+    assert list(history["sent_at"].dt.hour) == [9, 9, 11, 11]
+
+
+def test_summaries(db):
+    history = analytics.load_history(db)
+
+    hourly = analytics.volume(history, "h")
+    assert list(hourly.index.hour) == [9, 10, 11]
+    assert hourly["sent"].tolist() == [2, 0, 1]
+    assert hourly["failed"].tolist() == [0, 0, 1]
+
+    domains = analytics.breakdown(history, "domain")
+    assert domains.loc["test.org", "total"] == 2
+    assert domains.loc["test.org", "failure_rate"] == 0.5
+
+    grid = analytics.hour_heatmap(history)
+    # 2024-05-06 was a Monday.
+    assert grid.loc["Mon", 9] == 2
+    assert grid.loc["Mon", 11] == 1
+    assert grid.to_numpy().sum() == 3
+
+
+def test_empty_history(tmp_path):
+    history = analytics.load_history(DatabaseManager(str(tmp_path / "empty.json")))
+
+    assert history.empty
+    assert analytics.volume(history).empty
+
+
+def test_get_history_is_cached_until_a_write(db):
+    first = analytics.get_history(db)
+    assert analytics.get_history(db) is first
+
+    db.add_sent_email(["eve@test.org"], "Hi", "Body", datetime(2024, 5, 7))
+    assert len(analytics.get_history(db)) == len(first) + 1
+
+
+def test_iter_table_fields(db):
+    docs = list(db.iter_table("campaigns", fields=("recipients", "missing")))
+
+    assert [dict(doc) for doc in docs] == [
+        {"recipients": ["ann@example.com", "cid@test.org", "dee@test.org"], "missing": None}
+    ]
+    assert docs[0].doc_id == 1
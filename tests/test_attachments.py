@@ -0,0 +1,104 @@
+import base64
+import io
+import os
+
+import pytest
+
+from utils.attachments import Attachment, AttachmentStore, AttachmentTooLargeError
+
+# Spans several read chunks, with a short last one.
+CONTENT = bytes(range(256)) * 500
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(tmp_path / "attachments", max_bytes=len(CONTENT) + 10)
+
+
+def _stored(store):
+    return sorted(os.listdir(store.directory))
+
+
+def test_a_file_over_the_cap_is_refused_and_not_kept(store):
+    with pytest.raises(AttachmentTooLargeError, match="big.bin"):
+        store.save(io.BytesIO(b"x" * (store.max_bytes + 1)), "big.bin")
+
+    assert _stored(store) == []
+
+
+def test_a_file_at_the_cap_is_kept(store):
+    attachment = store.save(io.BytesIO(b"x" * store.max_bytes), "exact.bin")
+
+    assert attachment.size == store.max_bytes
+    assert _stored(store) == [attachment.digest]
+
+
+def test_the_cap_applies_to_all_files_on_a_message(store):
+    half = Attachment("a", "a.bin", store.max_bytes // 2, "application/octet-stream")
+    rest = Attachment("b", "b.bin", store.max_bytes - half.size, "application/octet-stream")
+
+    assert store.check_total([half, rest]) == store.max_bytes
+    with pytest.raises(AttachmentTooLargeError, match="add up to"):
+        store.check_total([half, rest, Attachment("c", "c.bin", 1, "text/plain")])
+
+
+def test_identical_files_are_stored_once(store):
+    first = store.save(io.BytesIO(CONTENT), "report.pdf")
+    second = store.save(io.BytesIO(CONTENT), "copy of report.pdf")
+    other = store.save(io.BytesIO(b"something else"), "notes.txt")
+
+    assert first.digest == second.digest != other.digest
+    assert (first.filename, second.filename) == ("report.pdf", "copy of report.pdf")
+    assert first.size == len(CONTENT)
+    assert first.content_type == "application/pdf"
+    assert other.content_type == "text/plain"
+    assert _stored(store) == sorted([first.digest, other.digest])
+    assert store.path(first.digest).read_bytes() == CONTENT
+
+
+def test_part_is_base64_of_the_file(store):
+    attachment = store.save(io.BytesIO(CONTENT), "report.pdf")
+
+    part = store.part(attachment)
+
+    assert part.get_content_type() == "application/pdf"
+    assert part["Content-Transfer-Encoding"] == "base64"
+    assert part.get_filename() == "report.pdf"
+    payload = part.get_payload()
+    assert all(len(line) <= 76 for line in payload.split("\r\n"))
+    assert "\n" not in payload.replace("\r\n", "")
+    assert base64.b64decode(payload) == CONTENT
+    assert part.get_payload(decode=True) == CONTENT
+
+
+def test_parts_are_encoded_once(store):
+    attachment = store.save(io.BytesIO(CONTENT), "report.pdf")
+
+    first = store.part(attachment)
+    assert store.part(attachment) is first
+    renamed = store.part(Attachment.from_dict({**attachment.to_dict(), "filename": "r.pdf"}))
+
+    assert renamed is not first
+    assert renamed.get_filename() == "r.pdf"
+    assert (store.hits, store.misses) == (1, 2)
+
+
+def test_parts_beyond_the_cache_budget_are_evicted(tmp_path):
+    uploads = AttachmentStore(tmp_path)
+    first = uploads.save(io.BytesIO(CONTENT), "first.bin")
+    second = uploads.save(io.BytesIO(CONTENT[::-1]), "second.bin")
+    # Room for one encoded part, not two.
+    size = len(uploads.part(first).get_payload())
+    store = AttachmentStore(tmp_path, cache_bytes=size * 3 // 2)
+
+    store.part(first)
+    store.part(first)
+    store.part(second)
+    store.part(first)
+
+    assert (store.hits, store.misses) == (1, 3)
+
+
+def test_part_of_a_missing_file_raises(store):
+    with pytest.raises(FileNotFoundError):
+        store.part(Attachment("0" * 32, "gone.bin", 1, "application/octet-stream"))
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+from benchmarks.__main__ import main
+from benchmarks.harness import Case, compare, measure, result_id
+
+RESULT_KEYS = {
+    "backend",
+    "size",
+    "group",
+    "name",
+    "items",
+    "repeat",
+    "cold_ms",
+    "min_ms",
+    "median_ms",
+    "p95_ms",
+    "items_per_s",
+}
+
+
+def _result(median_ms, min_ms=None, name="search"):
+    return {
+        "backend": "sqlite",
+        "size": 100,
+        "group": "db",
+        "name": name,
+        "median_ms": median_ms,
+        "min_ms": median_ms if min_ms is None else min_ms,
+    }
+
+
+def test_measure_reports_timings_and_throughput():
+    calls = []
+    result = measure(Case("db", "noop", lambda: calls.append(1), items=10), repeat=5)
+
+    assert len(calls) == 6  # one cold call, then the timed ones
+    assert result["repeat"] == 5
+    assert result["min_ms"] <= result["median_ms"] <= result["p95_ms"]
+    assert result["items_per_s"] > 0
+    assert set(result) == RESULT_KEYS - {"backend", "size"}
+
+
+def test_compare_flags_a_slower_run_only():
+    baseline = [_result(10.0), _result(10.0, name="gone")]
+
+    assert [row["status"] for row in compare([_result(10.0)], baseline)] == ["same"]
+    slower = compare([_result(20.0)], baseline, threshold=0.5)
+    assert slower == [
+        {
+            "id": "sqlite/100/db.search",
+            "status": "regression",
+            "baseline_ms": 10.0,
+            "median_ms": 20.0,
+            "ratio": 2.0,
+        }
+    ]
+    assert compare([_result(4.0)], baseline)[0]["status"] == "improvement"
+    assert compare([_result(1.0, name="added")], baseline)[0]["status"] == "new"
+
+
+def test_compare_ignores_noise_and_interrupted_medians():
+    baseline = [_result(0.01)]
+    assert compare([_result(0.05)], baseline, noise_ms=0.1)[0]["status"] == "same"
+    # A slow median whose fastest call did not slow down is interference, not a regression.
+    baseline = [_result(10.0, min_ms=9.0)]
+    assert compare([_result(20.0, min_ms=9.5)], baseline)[0]["status"] == "same"
+
+
+def _run(tmp_path, *extra, only="render.*"):
+    output = tmp_path / "results.json"
+    argv = [
+        "--sizes", "20", "--backends", "json", "--only", only, "--repeat", "3",
+        "--no-cache", "--output", str(output), "--json", *extra,
+    ]  # fmt: skip
+    try:
+        main(argv)
+        code = 0
+    except SystemExit as exc:
+        code = exc.code
+    return code, json.loads(output.read_text(encoding="utf-8"))
+
+
+def test_run_writes_the_json_document_and_flags_regressions(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    code, document = _run(tmp_path, "--baseline", str(baseline), "--save-baseline")
+
+    assert code == 0
+    assert set(document) == {"meta", "results", "comparison"}
+    assert {"commit", "created", "sizes", "backends", "seed", "repeat", "threshold"} <= set(
+        document["meta"]
+    )
+    assert document["results"]
+    assert all(set(result) == RESULT_KEYS for result in document["results"])
+    assert {result["group"] for result in document["results"]} == {"render"}
+    assert json.loads(baseline.read_text(encoding="utf-8"))["results"] == document["results"]
+
+    # Pretend the baseline was a hundred times faster: every case now counts as a regression.
+    saved = json.loads(baseline.read_text(encoding="utf-8"))
+    for result in saved["results"]:
+        for key in ("median_ms", "min_ms"):
+            result[key] /= 100
+    baseline.write_text(json.dumps(saved), encoding="utf-8")
+
+    code, document = _run(tmp_path, "--baseline", str(baseline), "--noise-ms", "0")
+    assert code == 1
+    assert [row["id"] for row in document["comparison"]] == [
+        result_id(result) for result in document["results"]
+    ]
+    assert {row["status"] for row in document["comparison"]} == {"regression"}
+
+
+@pytest.mark.parametrize("pattern", ["render.render", "json/20/render.render"])
+def test_only_selects_by_name_or_full_id(tmp_path, pattern):
+    baseline = tmp_path / "missing.json"
+    code, document = _run(tmp_path, "--baseline", str(baseline), only=pattern)
+    assert code == 0
+    assert document["comparison"] == []
+    assert [result_id(result) for result in document["results"]] == ["json/20/render.render"]
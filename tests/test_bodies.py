@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from utils.db import DatabaseManager
+
+SENT = datetime(2024, 5, 1, 9, 0)
+
+
+@pytest.fixture(params=[".json", ".db"])
+def db(tmp_path, request):
+    return DatabaseManager(str(tmp_path / f"email_manager{request.param}"))
+
+
+def _stored_bodies(db):
+    return sorted(doc["body"] for doc in db.bodies.all())
+
+
+def test_identical_bodies_are_stored_once(db):
+    first = db.add_sent_email(["a@example.com"], "Hi", "Same body", SENT)
+    db.add_sent_emails(
+        [(["b@example.com"], "Hi", "Same body", SENT), (["c@example.com"], "Hi", "Other", SENT)]
+    )
+    db.add_campaign(["d@example.com", "e@example.com"], ["Hi", "Hi"], ["Same body"] * 2, SENT)
+
+    assert _stored_bodies(db) == ["Other", "Same body"]
+    assert "body" not in db.sent_emails.get(doc_id=first)
+    assert db.get_sent_email(first)["body"] == "Same body"
+    assert [email["body"] for email in db.get_all_sent_emails()] == [
+        "Same body",
+        "Same body",
+        "Other",
+    ]
+    # Another manager, with no bodies loaded yet, reads them too.
+    assert DatabaseManager(db.db_path).get_sent_email(first)["body"] == "Same body"
+
+
+def test_compact_moves_inline_bodies_and_drops_only_orphans(db):
+    kept = db.add_sent_email(["a@example.com"], "Hi", "Sent body", SENT)
+    db.add_campaign(["b@example.com"], ["Hi"], ["Campaign body"], SENT)
+    db.enqueue_outbox([("c@example.com", "Hi", "Queued body")])
+    # A row written before bodies moved out, and a body nothing refers to any more.
+    legacy = db.sent_emails.insert(
+        {"recipients": ["d@example.com"], "subject": "Old", "body": "Sent body",
+         "sent_date": SENT.isoformat()}
+    )  # fmt: skip
+    db.bodies.insert({"hash": "0" * 32, "body": "Orphan"})
+
+    assert db.compact_bodies() == {"moved": 1, "bodies": 3, "removed": 1}
+
+    assert _stored_bodies(db) == ["Campaign body", "Queued body", "Sent body"]
+    assert "body" not in db.sent_emails.get(doc_id=legacy)
+    assert db.get_sent_email(legacy)["body"] == "Sent body"
+    assert db.get_sent_email(kept)["body"] == "Sent body"
+    assert db.get_campaign(db.get_all_campaigns()[0].doc_id)["bodies"] == ["Campaign body"]
+    assert db.compact_bodies() == {"moved": 0, "bodies": 3, "removed": 0}
@@ -0,0 +1,173 @@
+import sys
+import threading
+import uuid
+
+import pytest
+
+from utils.bulk_send import (
+    BulkSender,
+    DomainRateLimiter,
+    OutgoingMessage,
+    Quota,
+    QuotaExceededError,
+    _Bucket,
+    reserve,
+)
+
+
+class FakePool:
+    """Stands in for ``SMTPPool``: records what it sends, instantly."""
+
+    def __init__(self, max_connections=2):
+        # A fresh account each time, so the process-wide limiters start from zero.
+        self.user = f"{uuid.uuid4().hex}@example.com"
+        self.host = "smtp.example.com"
+        self.max_connections = max_connections
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to, subject, contents, attachments=None, message_id=None):
+        with self._lock:
+            self.sent += to
+
+
+def test_quota_parse():
+    assert Quota.parse("20/min, 500/day") == Quota(per_minute=20, per_day=500)
+    assert Quota.parse("2.5 / s") == Quota(per_second=2.5)
+    with pytest.raises(ValueError):
+        Quota.parse("20 per minute")
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = _Bucket(rate=2.0, capacity=1, now=0.0)
+    assert bucket.delay(0.0) == 0
+    bucket.tokens -= 1
+    assert bucket.delay(0.0) == pytest.approx(0.5)
+    assert bucket.delay(0.25) == pytest.approx(0.25)
+    assert bucket.delay(10.0) == 0
+    assert bucket.tokens == 1
+
+
+def test_limiter_spaces_messages_and_allows_a_burst():
+    limiter = DomainRateLimiter(rate=1.0, burst=3)
+    for _ in range(3):
+        assert limiter.delay("example.com") == 0
+        limiter.take("example.com")
+    assert 0.9 < limiter.delay("example.com") <= 1.0
+    # Keys are limited independently.
+    assert limiter.delay("other.com") == 0
+
+
+def test_daily_quota_counts_from_seed_and_raises_with_its_key():
+    limiter = DomainRateLimiter(quotas={"gmail": Quota(per_day=5)})
+    limiter.seed_today("gmail", 3)
+    assert limiter.remaining_today("gmail") == 2
+    assert limiter.remaining_today("example.com") is None
+    limiter.take("gmail")
+    limiter.take("gmail")
+
+    with pytest.raises(QuotaExceededError) as raised:
+        limiter.delay("gmail")
+    assert raised.value.key == "gmail"
+    assert raised.value.retry_after > 0
+
+
+def test_defer_holds_a_key_back():
+    limiter = DomainRateLimiter()
+    limiter.defer("example.com", 30)
+    assert 29 < limiter.delay("example.com") <= 30
+
+
+def test_reserve_counts_against_every_limit_or_none():
+    account = DomainRateLimiter(quotas={"me": Quota(per_day=10)})
+    domains = DomainRateLimiter(quotas={"slow.com": Quota(per_second=1)})
+
+    assert reserve([(account, "me"), (domains, "slow.com")]) == 0
+    assert reserve([(account, "me"), (domains, "slow.com")]) > 0
+    # The domain held the second message back, so the account did not count it.
+    assert account.remaining_today("me") == 9
+
+
+def test_reserve_raises_for_the_limit_that_blocked():
+    account = DomainRateLimiter(quotas={"me": Quota(per_day=1)})
+    domains = DomainRateLimiter(quotas={"slow.com": Quota(per_minute=1)})
+    reserve([(account, "me"), (domains, "fast.com")])
+
+    with pytest.raises(QuotaExceededError) as raised:
+        reserve([(account, "me"), (domains, "fast.com")])
+    assert raised.value.key == "me"
+
+    reserve([(domains, "slow.com")])
+    with pytest.raises(QuotaExceededError) as raised:
+        reserve([(DomainRateLimiter(), "me"), (domains, "slow.com")], max_wait=5)
+    assert raised.value.key == "slow.com"
+    assert raised.value.retry_after > 5
+
+
+@pytest.fixture
+def switch_often():
+    # Switch threads as often as possible, so any gap between check and count shows.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_concurrent_reserves_never_exceed_the_quota(switch_often):
+    account = DomainRateLimiter(quotas={"me": Quota(per_day=500)})
+    domains = DomainRateLimiter()
+    barrier = threading.Barrier(8)
+    granted = []
+
+    def send():
+        barrier.wait()
+        while True:
+            try:
+                reserve([(account, "me"), (domains, "example.com")])
+            except QuotaExceededError:
+                return
+            granted.append(1)
+
+    threads = [threading.Thread(target=send) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(granted) == 500
+
+
+def _messages(*recipients):
+    return [OutgoingMessage(to, "Hello", "Body") for to in recipients]
+
+
+@pytest.mark.parametrize("quota, sent", [("3/day", 3), ("1/min", 1)])
+def test_spent_account_quota_stops_the_whole_batch(monkeypatch, quota, sent):
+    monkeypatch.setenv("EMAIL_ACCOUNT_QUOTA", quota)
+    pool = FakePool()
+    sender = BulkSender(pool, per_domain_rate=None, max_wait=5)
+    recipients = [f"user{n}@domain{n % 3}.com" for n in range(9)]
+
+    results = list(sender.iter_send(_messages(*recipients)))
+
+    assert len(pool.sent) == sent
+    failed = [result for result in results if not result.success]
+    assert len(failed) == 9 - sent
+    assert {result.error_class for result in failed} == {"QuotaExceededError"}
+    assert all(result.transient for result in failed)
+    assert all(pool.user in result.error for result in failed)
+
+
+def test_spent_domain_quota_holds_back_only_that_domain(monkeypatch):
+    monkeypatch.setenv("EMAIL_DOMAIN_QUOTAS", "slow.com=1/day")
+    pool = FakePool()
+    sender = BulkSender(pool, per_domain_rate=None)
+
+    results = list(
+        sender.iter_send(_messages("a@slow.com", "b@slow.com", "c@fast.com", "d@fast.com"))
+    )
+
+    assert sorted(pool.sent) == ["a@slow.com", "c@fast.com", "d@fast.com"]
+    (failed,) = [result for result in results if not result.success]
+    assert failed.recipient == "b@slow.com"
+    assert "slow.com" in failed.error
@@ -0,0 +1,123 @@
+import multiprocessing
+
+import pytest
+
+from utils.cache import CachedDatabase
+from utils.db import DatabaseManager
+
+
+@pytest.fixture(params=[".json", ".db"])
+def path(tmp_path, request):
+    return str(tmp_path / f"email_manager{request.param}")
+
+
+@pytest.fixture
+def cached(path):
+    return CachedDatabase(DatabaseManager(path))
+
+
+def _names(cached):
+    return [profile["name"] for profile in cached.get_all_profiles()]
+
+
+def test_repeated_reads_are_hits(cached):
+    cached.add_profile("Ann", "ann@example.com", "", "")
+
+    assert _names(cached) == ["Ann"]
+    assert _names(cached) == ["Ann"]
+    assert _names(cached) == ["Ann"]
+
+    stats = cached.stats()
+    assert stats["methods"]["get_all_profiles"] == {"hits": 2, "misses": 1}
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert stats["entries"] == 1
+
+
+def test_arguments_are_cached_separately(cached):
+    for name in ("Ann", "Bob", "Cid"):
+        cached.add_profile(name, f"{name.lower()}@example.com", "", "")
+
+    first = cached.list_profiles(offset=0, limit=2)
+    second = cached.list_profiles(offset=2, limit=2)
+    assert cached.list_profiles(offset=0, limit=2) is first
+
+    assert [p["name"] for p in first["items"]] == ["Ann", "Bob"]
+    assert [p["name"] for p in second["items"]] == ["Cid"]
+    assert cached.stats()["methods"]["list_profiles"] == {"hits": 1, "misses": 2}
+
+
+def test_uncached_calls_pass_through(cached):
+    profile_id = cached.add_profile("Ann", "ann@example.com", "", "")
+
+    assert cached.get_profile(profile_id)["name"] == "Ann"
+    assert cached.get_profile(profile_id)["name"] == "Ann"
+    assert cached.stats()["hits"] == cached.stats()["misses"] == 0
+
+
+def test_a_write_here_invalidates_only_its_tables(cached):
+    cached.add_profile("Ann", "ann@example.com", "", "")
+    cached.add_template("Welcome", "Hi {{name}}")
+    assert _names(cached) == ["Ann"]
+    assert len(cached.get_all_templates()) == 1
+
+    cached.add_profile("Bob", "bob@example.com", "", "")
+
+    assert _names(cached) == ["Ann", "Bob"]
+    assert len(cached.get_all_templates()) == 1
+    methods = cached.stats()["methods"]
+    assert methods["get_all_profiles"] == {"hits": 0, "misses": 2}
+    assert methods["get_all_templates"] == {"hits": 1, "misses": 1}
+
+
+def test_a_write_from_another_manager_invalidates(cached, path):
+    cached.add_profile("Ann", "ann@example.com", "", "")
+    assert _names(cached) == ["Ann"]
+
+    DatabaseManager(path).add_profile("Bob", "bob@example.com", "", "")
+
+    assert _names(cached) == ["Ann", "Bob"]
+    assert cached.stats()["methods"]["get_all_profiles"] == {"hits": 0, "misses": 2}
+
+
+def _add_in_child(path):
+    DatabaseManager(path).add_profile("Child", "child@example.com", "", "")
+
+
+def test_a_write_from_another_process_invalidates(cached, path):
+    cached.add_profile("Parent", "parent@example.com", "", "")
+    assert _names(cached) == ["Parent"]
+
+    child = multiprocessing.get_context("spawn").Process(target=_add_in_child, args=(path,))
+    child.start()
+    child.join(60)
+    assert child.exitcode == 0
+
+    assert _names(cached) == ["Parent", "Child"]
+    assert _names(cached) == ["Parent", "Child"]
+    assert cached.stats()["methods"]["get_all_profiles"] == {"hits": 1, "misses": 2}
+
+
+def test_least_recently_used_entries_are_evicted(path):
+    cached = CachedDatabase(DatabaseManager(path), maxsize=2)
+    for name in ("Ann", "Bob", "Cid"):
+        cached.add_profile(name, f"{name.lower()}@example.com", "", "")
+
+    for offset in (0, 1, 2):
+        cached.list_profiles(offset=offset, limit=1)
+    assert cached.stats()["entries"] == 2
+
+    cached.list_profiles(offset=2, limit=1)
+    cached.list_profiles(offset=0, limit=1)
+    assert cached.stats()["methods"]["list_profiles"] == {"hits": 1, "misses": 4}
+
+
+def test_clear_drops_every_entry(cached):
+    cached.add_profile("Ann", "ann@example.com", "", "")
+    _names(cached)
+
+    cached.clear()
+
+    assert cached.stats()["entries"] == 0
+    _names(cached)
+    assert cached.stats()["methods"]["get_all_profiles"] == {"hits": 0, "misses": 2}
@@ -0,0 +1,80 @@
+from datetime import date, datetime
+
+import pytest
+
+from utils.db import DatabaseManager
+
+
+@pytest.fixture(params=["email_manager.json", "email_manager.db"])
+def db_path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def test_lookups_see_updates_from_another_process(db_path):
+    app, scheduler = DatabaseManager(db_path), DatabaseManager(db_path)
+    profile_id = app.add_profile("Ann", "ann@example.com", "CEO", "Tech")
+    assert app.find_profile_by_email("ann@example.com").doc_id == profile_id
+    assert app.list_profiles()["items"][0]["email"] == "ann@example.com"
+
+    # Same number of rows, different contents: a size check would miss this.
+    scheduler.update_profile(profile_id, "Ann", "ann@new.example.com", "CEO", "Tech")
+
+    assert app.find_profile_by_email("ann@example.com") is None
+    assert app.find_profile_by_email("ann@new.example.com").doc_id == profile_id
+    assert app.get_profile(profile_id)["email"] == "ann@new.example.com"
+    assert app.list_profiles()["items"][0]["email"] == "ann@new.example.com"
+
+
+def test_lookups_see_writes_that_bypass_tracking(db_path):
+    db = DatabaseManager(db_path)
+    profile_id = db.add_profile("Ann", "ann@example.com", "CEO", "Tech")
+    assert db.find_profiles_by_name("ann")[0].doc_id == profile_id
+
+    db.profiles.update({"name": "Anna"}, doc_ids=[profile_id])
+
+    assert db.find_profiles_by_name("ann") == []
+    assert db.find_profiles_by_name("anna")[0].doc_id == profile_id
+    assert db.get_profile(profile_id)["name"] == "Anna"
+
+
+def test_tracked_writes_keep_indexes_without_rebuilding(db_path):
+    db = DatabaseManager(db_path)
+    db.add_profile("Ann", "ann@example.com", "CEO", "Tech")
+    index = db._lookup_index(db.profiles, "email")
+    profiles = db._profile_map()
+
+    bob = db.add_profile("Bob", "bob@example.com", "CTO", "Tech")
+    db.add_profiles([{"name": "Cid", "email": "cid@example.com"}])
+
+    assert db._lookup_index(db.profiles, "email") is index
+    assert db._profile_map() is profiles
+    assert db.find_profile_by_email("BOB@example.com ").doc_id == bob
+    assert db.find_profile_by_email("cid@example.com")["name"] == "Cid"
+
+
+def test_reminder_index_sees_moves_from_another_process(db_path):
+    app, scheduler = DatabaseManager(db_path), DatabaseManager(db_path)
+    email_id = app.add_sent_email(["ann@example.com"], "Hello", "Body", datetime(2024, 5, 1))
+    reminder_id = app.add_reminder(email_id, datetime(2024, 5, 10))
+    assert app.count_due_reminders(datetime(2024, 5, 11)) == 1
+
+    # Moving a reminder keeps the table the same size.
+    scheduler.update_reminder(reminder_id, datetime(2024, 6, 10))
+
+    assert app.count_due_reminders(datetime(2024, 5, 11)) == 0
+    page = app.list_reminders(start=datetime(2024, 6, 1))
+    assert [item["reminder"].doc_id for item in page["items"]] == [reminder_id]
+    assert page["items"][0]["email"]["subject"] == "Hello"
+
+
+def test_campaign_days_see_campaigns_from_another_process(db_path):
+    app, scheduler = DatabaseManager(db_path), DatabaseManager(db_path)
+    first = app.add_campaign(["a@example.com"], ["One"], ["Body"], datetime(2024, 5, 1, 9))
+    assert [c.doc_id for c in app.get_campaigns_on(date(2024, 5, 1))] == [first]
+
+    # One campaign out, one in: the count is unchanged.
+    scheduler.delete_campaign(first)
+    second = scheduler.add_campaign(["b@example.com"], ["Two"], ["Body"], datetime(2024, 5, 2, 9))
+
+    assert app.get_campaigns_on(date(2024, 5, 1)) == []
+    assert [c.doc_id for c in app.get_campaigns_on(date(2024, 5, 2))] == [second]
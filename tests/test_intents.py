@@ -0,0 +1,38 @@
+import pytest
+
+from utils.intent_eval import EVAL_SET
+from utils.intents import FALLBACK_INTENT, Intent, IntentMatcher, classify
+
+
+@pytest.mark.parametrize("prompt, expected", EVAL_SET)
+def test_classifies_eval_set(prompt, expected):
+    assert classify(prompt).intent == expected
+
+
+def test_matches_whole_words_only():
+    # Substring matching took "this" for "hi" and "which one" for a template question.
+    assert classify("this").intent == FALLBACK_INTENT
+    assert classify("hiya").intent == "greeting"
+
+
+def test_phrase_outweighs_keyword():
+    matcher = IntentMatcher(
+        [Intent("compose", keywords=("create",)), Intent("templates", phrases=("a template",))]
+    )
+    match = matcher.classify("create a template")
+    assert match.intent == "templates"
+    assert match.scores == {"compose": 1.0, "templates": 2.0}
+    assert match.confidence == pytest.approx(2 / 3)
+
+
+def test_earlier_intent_wins_ties():
+    intents = [Intent("first", keywords=("shared",)), Intent("second", keywords=("shared",))]
+    assert IntentMatcher(intents).classify("shared").intent == "first"
+    assert IntentMatcher(intents[::-1]).classify("shared").intent == "second"
+
+
+def test_keyword_counts_once_and_weak_matches_fall_back():
+    matcher = IntentMatcher([Intent("greeting", keywords=("hi",), weight=0.4)], threshold=0.5)
+    assert matcher.scores("hi hi hi") == {"greeting": pytest.approx(0.4)}
+    match = matcher.classify("hi hi hi")
+    assert (match.intent, match.confidence) == (FALLBACK_INTENT, 0.0)
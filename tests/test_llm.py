@@ -0,0 +1,124 @@
+import pytest
+
+from utils.db import DatabaseManager
+from utils.llm import (
+    CONTEXT_TABLES,
+    ChatClient,
+    ResponseCache,
+    build_context,
+    normalize_prompt,
+)
+from utils.llm_stub import StubServer
+
+
+@pytest.fixture
+def stub():
+    server = StubServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "email_manager.json"))
+
+
+def _client(stub, cache_dir):
+    return ChatClient(
+        model="stub-model", base_url=stub.base_url, api_key="stub", cache=ResponseCache(cache_dir)
+    )
+
+
+def test_reply_streams_in_chunks(stub, tmp_path):
+    client = _client(stub, tmp_path / "cache")
+
+    chunks = list(client.stream("Draft a thank-you note", "Contacts: 3"))
+
+    assert len(chunks) > 3
+    assert "".join(chunks).startswith("Stub reply to: Draft a thank-you note")
+    assert stub.last_request["stream"] is True
+    assert stub.last_request["messages"][0]["content"].endswith("Contacts: 3")
+
+
+def test_repeated_prompt_is_served_from_the_cache(stub, tmp_path):
+    client = _client(stub, tmp_path / "cache")
+    reply = "".join(client.stream("Draft a thank-you note", "ctx"))
+
+    for prompt in (
+        "Draft a thank-you note",
+        "  draft A   THANK-YOU note? ",
+        "Draft a thank-you note!",
+    ):
+        assert list(client.stream(prompt, "ctx")) == [reply]
+
+    assert stub.requests == 1
+    assert client.cache.hits == 3
+    assert normalize_prompt("  Draft A\tthank-you NOTE?! ") == "draft a thank-you note"
+
+
+def test_new_context_history_or_data_version_asks_again(stub, tmp_path, db):
+    client = _client(stub, tmp_path / "cache")
+    db.add_profile("Ann", "ann@example.com", "CTO", "Engineer")
+    context = build_context(db)
+    stamp = db.table_versions(CONTEXT_TABLES)
+    list(client.stream("hello", context, stamp=stamp))
+    list(client.stream("hello", context, stamp=db.table_versions(CONTEXT_TABLES)))
+    assert stub.requests == 1
+
+    # A title change leaves the summary as it was, but the profiles version moves.
+    profile_id = db.get_all_profiles()[0].doc_id
+    db.update_profile(profile_id, "Ann", "ann@example.com", "CEO", "Engineer")
+    assert build_context(db) == context
+    list(client.stream("hello", context, stamp=db.table_versions(CONTEXT_TABLES)))
+    assert stub.requests == 2
+
+    db.add_template("Thanks", "Thank you!")
+    list(client.stream("hello", build_context(db), stamp=db.table_versions(CONTEXT_TABLES)))
+    assert stub.requests == 3
+
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+    list(client.stream("hello", context, history))
+    assert stub.requests == 4
+
+
+def test_cache_survives_a_new_instance_and_evicts_least_recently_used(tmp_path):
+    first = ResponseCache(tmp_path, maxsize=2)
+    for key in ("a", "b", "c"):
+        first.put(key, f"reply {key}")
+    assert list(first._entries) == ["b", "c"]
+
+    second = ResponseCache(tmp_path, maxsize=2)
+    assert second.get("a") == "reply a"
+    assert (second.hits, second.misses) == (1, 0)
+    assert second.get("missing") is None
+    assert second.misses == 1
+
+    memory_only = ResponseCache(None)
+    memory_only.put("a", "reply")
+    assert memory_only.get("a") == "reply"
+    assert ResponseCache(None).get("a") is None
+
+
+def test_cached_reply_survives_a_restart(stub, tmp_path):
+    reply = "".join(_client(stub, tmp_path / "cache").stream("hello", "ctx"))
+
+    assert list(_client(stub, tmp_path / "cache").stream("hello", "ctx")) == [reply]
+    assert stub.requests == 1
+
+
+def test_context_stays_small_with_thousands_of_profiles(db):
+    db.add_profiles(
+        {"name": f"P{n}", "email": f"p{n}@example.com", "title": "", "profession": f"job{n % 50}"}
+        for n in range(5000)
+    )
+    for n in range(40):
+        db.add_template(f"Template {n}", "Body " * 100)
+
+    context = build_context(db)
+
+    assert len(context) < 3000
+    assert "Contacts: 5000" in context
+    assert "... and 20 more" in context
+    assert context.count("job") == 8
+    assert "p1@example.com" not in context
@@ -0,0 +1,211 @@
+import multiprocessing
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from utils.db import DatabaseManager
+from utils.outbox import OutboxWorker
+from utils.scheduler import ScheduleDispatcher
+from utils.smtp_pool import SMTPPool
+
+NOW = datetime(2024, 5, 1, 9, 0)
+
+
+class Refuser:
+    """aiosmtpd handler that answers 451 to ``slow@`` and 550 to ``bad@`` recipients."""
+
+    def __init__(self):
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("slow@"):
+            return "451 4.7.1 Try again later"
+        if address.startswith("bad@"):
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered += envelope.rcpt_tos
+        return "250 OK"
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "email_manager.json"))
+
+
+@pytest.fixture
+def server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = Refuser()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def _worker(db, controller, **kwargs):
+    pool = SMTPPool(
+        "sender@example.com",
+        None,
+        host=controller.hostname,
+        port=controller.port,
+        smtp_ssl=False,
+        smtp_starttls=False,
+        smtp_skip_login=True,
+        max_connections=2,
+    )
+    worker = OutboxWorker(db, pool, per_domain_rate=None, poll_interval=0.1, **kwargs)
+    worker.sender.deferral_cooldown = 0.0
+    return worker
+
+
+def _messages(*recipients):
+    return [(recipient, "Hello", f"Body for {recipient}") for recipient in recipients]
+
+
+def test_enqueue_is_idempotent(db):
+    first = db.enqueue_outbox(_messages("a@example.com", "b@example.com"), campaign_id=1)
+    again = db.enqueue_outbox(_messages("b@example.com", "a@example.com"), campaign_id=1)
+
+    assert again == first[::-1]
+    assert db.count_outbox()["queued"] == 2
+    # Another campaign, or explicit keys, make new messages.
+    assert db.enqueue_outbox(_messages("a@example.com"), campaign_id=2)[0] not in first
+    assert db.enqueue_outbox(_messages("a@example.com"), keys=["x"]) == db.enqueue_outbox(
+        _messages("a@example.com"), keys=["x"]
+    )
+    assert db.count_outbox()["queued"] == 4
+
+
+def test_claim_leases_due_messages_and_recovers_expired_ones(db):
+    (due,) = db.enqueue_outbox(_messages("a@example.com"), not_before=NOW)
+    (later,) = db.enqueue_outbox(_messages("b@example.com"), not_before=NOW + timedelta(hours=1))
+
+    claimed = db.claim_outbox("w1", 10, lease=60, now=NOW)
+    assert [row.doc_id for row in claimed] == [due]
+    assert claimed[0]["owner"] == "w1"
+    assert claimed[0]["attempts"] == 1
+    assert claimed[0]["body"] == "Body for a@example.com"
+    assert db.claim_outbox("w2", 10, now=NOW) == []
+
+    assert db.recover_outbox(now=NOW + timedelta(seconds=30)) == 0
+    assert db.recover_outbox(now=NOW + timedelta(seconds=61)) == 1
+    assert [row["status"] for row in db.get_outbox([due, later])] == ["dead", "queued"]
+
+    assert db.requeue_outbox([due]) == 1
+    row = db.get_outbox([due])[0]
+    assert (row["status"], row["attempts"]) == ("queued", 0)
+
+
+def _claim_all(db_path, owner, results):
+    db = DatabaseManager(db_path)
+    claimed = []
+    while rows := db.claim_outbox(owner, 3, now=NOW + timedelta(hours=1)):
+        claimed += [row.doc_id for row in rows]
+    results.put(claimed)
+
+
+@pytest.mark.parametrize("suffix", [".json", ".db"])
+def test_workers_in_separate_processes_never_claim_the_same_message(tmp_path, suffix):
+    db_path = str(tmp_path / f"email_manager{suffix}")
+    ids = DatabaseManager(db_path).enqueue_outbox(
+        _messages(*(f"user{n}@example{n % 5}.com" for n in range(60))), not_before=NOW
+    )
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=_claim_all, args=(db_path, f"w{n}", results)) for n in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    claimed = [doc_id for _ in workers for doc_id in results.get(timeout=60)]
+    for worker in workers:
+        worker.join(60)
+
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_backoff_is_exponential_capped_and_jittered(db, server):
+    worker = _worker(db, server[0], base_backoff=10, max_backoff=50)
+    for attempts, ceiling in ((1, 10), (2, 20), (3, 40), (4, 50), (8, 50)):
+        delay = worker.backoff(attempts).total_seconds()
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_worker_retries_transient_failures_later(db, server):
+    controller, handler = server
+    ok, slow = db.enqueue_outbox(_messages("ann@example.com", "slow@example.org"))
+
+    before = datetime.now()
+    results = _worker(db, controller, base_backoff=60).drain()
+
+    assert handler.delivered == ["ann@example.com"]
+    assert sorted(result.success for result in results) == [False, True]
+    sent, retry = db.get_outbox([ok, slow])
+    assert sent["status"] == "sent"
+    assert (retry["status"], retry["attempts"], retry["error_code"]) == ("failed", 1, 451)
+    next_attempt = datetime.fromisoformat(retry["next_attempt"])
+    assert before + timedelta(seconds=30) <= next_attempt <= datetime.now() + timedelta(seconds=60)
+
+
+def test_worker_dead_letters_permanent_failures_and_spent_retries(db, server):
+    controller, handler = server
+    bad, slow = db.enqueue_outbox(_messages("bad@example.com", "slow@example.org"))
+
+    # Without a backoff the retries fall due at once, so one drain uses them all up.
+    _worker(db, controller, base_backoff=0, max_attempts=3).drain()
+
+    rows = db.get_outbox([bad, slow])
+    assert [(row["status"], row["attempts"]) for row in rows] == [("dead", 1), ("dead", 3)]
+    assert [row["error_code"] for row in rows] == [550, 451]
+    assert handler.delivered == []
+    assert db.count_outbox()["dead"] == 2
+
+
+def _dispatch_campaign(db, *recipients):
+    campaign_id = db.add_campaign(
+        list(recipients), ["Hello"] * len(recipients), ["Body"] * len(recipients), NOW, "schedule"
+    )
+    dispatcher = ScheduleDispatcher(db.db_path)
+    dispatcher.refresh()
+    assert dispatcher.run_due(NOW) == 1
+    (schedule,) = db.get_schedules_for_campaign(campaign_id)
+    assert schedule["status"] == "queued"
+    return schedule.doc_id
+
+
+def test_a_queued_campaign_schedule_is_sent_once_every_message_is(db, server):
+    controller, handler = server
+    schedule_id = _dispatch_campaign(db, "ann@example.com", "bob@example.com")
+
+    _worker(db, controller).drain()
+
+    assert sorted(handler.delivered) == ["ann@example.com", "bob@example.com"]
+    schedule = db.get_schedule(schedule_id)
+    assert (schedule["status"], schedule["attempts"], schedule["error"]) == ("sent", 1, None)
+
+
+def test_a_queued_campaign_schedule_fails_once_a_message_is_dead(db, server):
+    controller, handler = server
+    schedule_id = _dispatch_campaign(db, "ann@example.com", "slow@example.org", "bad@example.com")
+
+    worker = _worker(db, controller, base_backoff=60)
+    worker.drain()
+    # One message is still waiting for its retry.
+    assert db.get_schedule(schedule_id)["status"] == "queued"
+
+    slow = db.list_outbox("failed")["items"][0]
+    db.finish_outbox([(slow.doc_id, "dead", "gave up", 451, None)])
+    schedule = db.get_schedule(schedule_id)
+    assert (schedule["status"], schedule["error"]) == ("failed", "2 of 3 messages not delivered")
+    assert db.get_totals()["backlog"] == 0
+
+    # Requeueing a dead message puts the schedule back in the outbox's hands.
+    db.requeue_outbox([slow.doc_id])
+    assert db.get_schedule(schedule_id)["status"] == "queued"
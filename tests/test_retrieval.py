@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+from utils.db import DatabaseManager
+from utils.retrieval import VectorIndex, parse_period, similarity_text, topic
+
+NOW = datetime(2024, 5, 15, 13, 30)  # a Wednesday
+
+
+def test_vector_index_ranks_by_similarity():
+    index = VectorIndex(dims=256)
+    index.add("invoice", "your invoice for march is overdue")
+    index.add("party", "birthday party on saturday")
+    index.add("meeting", "notes from the project meeting")
+
+    hits = index.search("overdue invoice", k=2)
+
+    assert hits[0][0] == "invoice"
+    assert all(score < hits[0][1] for _, score in hits[1:])
+    assert len(hits) <= 2
+    assert index.search("overdue invoice", min_score=hits[0][1]) == []
+
+
+def test_vector_index_filters_and_reuses_removed_rows():
+    index = VectorIndex(dims=256, capacity=2)
+    index.add(1, "invoice reminder", kind="email", when=datetime(2024, 5, 1))
+    index.add(2, "invoice template", kind="template")
+    index.add(3, "invoice paid", kind="email", when=datetime(2024, 5, 10))
+
+    assert [key for key, _ in index.search("invoice", kinds=["template"])] == [2]
+    assert [key for key, _ in index.search("invoice", start=datetime(2024, 5, 5))] == [3]
+    assert [key for key, _ in index.search("invoice", end=datetime(2024, 5, 5))] == [1]
+
+    index.remove(2)
+    index.add(4, "something else")
+    assert len(index) == 3
+    assert index.search("invoice", kinds=["template"]) == []
+
+
+def test_vector_index_empty_query_returns_newest_first():
+    index = VectorIndex(dims=256)
+    index.add("old", "a", when=datetime(2024, 1, 1))
+    index.add("undated", "b")
+    index.add("new", "c", when=datetime(2024, 3, 1))
+
+    assert index.search("", k=3) == [("new", 0.0), ("old", 0.0), ("undated", 0.0)]
+
+
+@pytest.mark.parametrize(
+    "text, start, end",
+    [
+        ("sent today", datetime(2024, 5, 15), None),
+        ("sent yesterday", datetime(2024, 5, 14), datetime(2024, 5, 15)),
+        ("sent this week", datetime(2024, 5, 13), None),
+        ("sent last week", datetime(2024, 5, 6), datetime(2024, 5, 13)),
+        ("sent last month", datetime(2024, 4, 1), datetime(2024, 5, 1)),
+        ("sent past month", datetime(2024, 4, 15), None),
+        ("sent last 10 days", datetime(2024, 5, 5), None),
+        ("sent last year", datetime(2023, 1, 1), datetime(2024, 1, 1)),
+    ],
+)
+def test_parse_period(text, start, end):
+    assert parse_period(text, now=NOW) == (start, end, "sent")
+
+
+def test_parse_period_without_time_phrase():
+    assert parse_period("invoice for Charles", now=NOW) == (None, None, "invoice for Charles")
+
+
+def test_topic_and_similarity_text():
+    assert topic("What did I send to Charles about the invoice?") == "charles invoice"
+    assert similarity_text(["a", "", "a", "b", "c", "d"]) == "a\nb\nc"
+
+
+def test_similar_finds_sent_emails_within_a_period(tmp_path):
+    db = DatabaseManager(str(tmp_path / "email_manager.json"))
+    db.add_sent_email(["charles@example.com"], "Invoice", "Overdue invoice", datetime(2024, 5, 8))
+    db.add_sent_email(["charles@example.com"], "Invoice", "Paid invoice", datetime(2024, 4, 8))
+    db.add_template("Invoice reminder", "Your invoice is overdue")
+
+    hits = db.similar("charles invoice", kinds=["sent_email"], start=datetime(2024, 5, 6))
+    assert [hit["doc"]["body"] for hit in hits] == ["Overdue invoice"]
+
+    kinds = {hit["kind"] for hit in db.similar("overdue invoice")}
+    assert kinds == {"sent_email", "template"}
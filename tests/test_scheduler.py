@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import scheduler
+from utils.db import DatabaseManager
+from utils.scheduler import ScheduleDispatcher
+
+DUE = datetime(2024, 5, 1, 9, 0)
+
+
+@pytest.fixture(params=[".json", ".db"])
+def path(tmp_path, request):
+    return str(tmp_path / f"email_manager{request.param}")
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Subjects handed to ``send_email``, in order; set ``sent.ok = False`` to fail them."""
+
+    class Sent(list):
+        ok = True
+
+    sent = Sent()
+
+    def send_email(to, subject, contents):
+        sent.append(subject)
+        return sent.ok
+
+    monkeypatch.setattr(scheduler, "send_email", send_email)
+    return sent
+
+
+def _schedule(db, subject, due):
+    email_id = db.add_sent_email(["ann@example.com"], subject, "Body", DUE)
+    return db.add_schedule(email_id, due)
+
+
+def test_refresh_picks_up_schedules_added_by_another_manager(path):
+    dispatcher = ScheduleDispatcher(path)
+    dispatcher.refresh(force=True)
+    assert dispatcher.seconds_until_next() is None
+
+    schedule_id = _schedule(DatabaseManager(path), "Hi", DUE)
+    dispatcher.refresh()
+
+    assert dispatcher._due == {schedule_id: DUE}
+    assert dispatcher.seconds_until_next(DUE - timedelta(minutes=1)) == 60
+
+
+def test_refresh_skips_an_unchanged_file(path, monkeypatch):
+    dispatcher = ScheduleDispatcher(path)
+    _schedule(dispatcher.db, "Hi", DUE)
+    reads = []
+    get_all_schedules = dispatcher.db.get_all_schedules
+    monkeypatch.setattr(
+        dispatcher.db, "get_all_schedules", lambda: reads.append(1) or get_all_schedules()
+    )
+
+    dispatcher.refresh()
+    dispatcher.refresh()
+    assert len(reads) == 1
+
+    _schedule(DatabaseManager(path), "Later", DUE + timedelta(days=1))
+    dispatcher.refresh()
+    dispatcher.refresh()
+    assert len(reads) == 2
+
+
+def test_own_status_updates_do_not_trigger_a_reload(path, sent, monkeypatch):
+    dispatcher = ScheduleDispatcher(path)
+    _schedule(dispatcher.db, "Hi", DUE)
+    dispatcher.refresh()
+    reads = []
+    get_all_schedules = dispatcher.db.get_all_schedules
+    monkeypatch.setattr(
+        dispatcher.db, "get_all_schedules", lambda: reads.append(1) or get_all_schedules()
+    )
+
+    assert dispatcher.run_due(DUE) == 1
+    dispatcher.refresh()
+
+    assert sent == ["Hi"]
+    assert reads == []
+
+
+def test_run_due_dispatches_in_due_order(path, sent):
+    db = DatabaseManager(path)
+    for subject, minutes in (("third", 30), ("first", 10), ("later", 90), ("second", 20)):
+        _schedule(db, subject, DUE + timedelta(minutes=minutes))
+    dispatcher = ScheduleDispatcher(path)
+    dispatcher.refresh()
+
+    assert dispatcher.run_due(DUE + timedelta(minutes=60)) == 3
+
+    assert sent == ["first", "second", "third"]
+    assert [s["status"] for s in dispatcher.db.get_all_schedules()] == [
+        "sent",
+        "sent",
+        "pending",
+        "sent",
+    ]
+    assert dispatcher.seconds_until_next(DUE + timedelta(minutes=60)) == 30 * 60
+
+
+def test_run_due_skips_superseded_entries(path, sent):
+    dispatcher = ScheduleDispatcher(path)
+    schedule_id = _schedule(dispatcher.db, "Moved", DUE)
+    dispatcher.refresh()
+
+    DatabaseManager(path).update_schedule(schedule_id, DUE + timedelta(hours=1))
+    dispatcher.refresh()
+
+    # The old entry is still on the heap, but only the new due time counts.
+    assert len(dispatcher._heap) == 2
+    assert dispatcher.run_due(DUE + timedelta(minutes=30)) == 0
+    assert sent == []
+    assert dispatcher._heap == [(DUE + timedelta(hours=1), schedule_id)]
+    assert dispatcher.run_due(DUE + timedelta(hours=1)) == 1
+    assert sent == ["Moved"]
+
+
+def test_run_due_skips_schedules_deleted_meanwhile(path, sent):
+    dispatcher = ScheduleDispatcher(path)
+    schedule_id = _schedule(dispatcher.db, "Gone", DUE)
+    dispatcher.refresh()
+
+    DatabaseManager(path).delete_schedule(schedule_id)
+    dispatcher.refresh()
+
+    assert dispatcher.run_due(DUE) == 0
+    assert sent == []
+
+
+def test_failed_sends_back_off_until_max_attempts(path, sent):
+    dispatcher = ScheduleDispatcher(path, max_attempts=3, base_backoff=60, max_backoff=100)
+    schedule_id = _schedule(dispatcher.db, "Flaky", DUE)
+    dispatcher.refresh()
+    sent.ok = False
+
+    before = datetime.now()
+    assert dispatcher.run_due(DUE) == 1
+    schedule = dispatcher.db.get_schedule(schedule_id)
+    assert (schedule["status"], schedule["attempts"], schedule["error"]) == (
+        "retrying",
+        1,
+        "send failed",
+    )
+    first_retry = datetime.fromisoformat(schedule["next_attempt"])
+    assert before + timedelta(seconds=60) <= first_retry <= datetime.now() + timedelta(seconds=60)
+
+    # Not due again until the backoff has passed.
+    assert dispatcher.run_due(first_retry - timedelta(seconds=1)) == 0
+    before = datetime.now()
+    assert dispatcher.run_due(first_retry) == 1
+    schedule = dispatcher.db.get_schedule(schedule_id)
+    assert (schedule["status"], schedule["attempts"]) == ("retrying", 2)
+    second_retry = datetime.fromisoformat(schedule["next_attempt"])
+    capped = timedelta(seconds=100)  # 120 seconds, capped at max_backoff
+    assert before + capped <= second_retry <= datetime.now() + capped
+
+    assert dispatcher.run_due(second_retry) == 1
+    schedule = dispatcher.db.get_schedule(schedule_id)
+    assert (schedule["status"], schedule["attempts"], schedule["next_attempt"]) == (
+        "failed",
+        3,
+        None,
+    )
+    assert sent == ["Flaky"] * 3
+    assert dispatcher.seconds_until_next() is None
+
+
+def test_a_retry_is_reloaded_after_a_restart(path, sent):
+    dispatcher = ScheduleDispatcher(path, base_backoff=60)
+    schedule_id = _schedule(dispatcher.db, "Flaky", DUE)
+    dispatcher.refresh()
+    sent.ok = False
+    dispatcher.run_due(DUE)
+
+    restarted = ScheduleDispatcher(path)
+    restarted.refresh()
+
+    next_attempt = datetime.fromisoformat(restarted.db.get_schedule(schedule_id)["next_attempt"])
+    assert restarted._due == {schedule_id: next_attempt}
+
+
+def test_backoff_doubles_up_to_the_cap(path):
+    dispatcher = ScheduleDispatcher(path, base_backoff=60.0, max_backoff=600.0)
+
+    assert [dispatcher.backoff(n).total_seconds() for n in range(1, 6)] == [
+        60,
+        120,
+        240,
+        480,
+        600,
+    ]
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from utils.db import DatabaseManager
+
+SENT = datetime(2024, 5, 1, 9, 0)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "email_manager.json"))
+
+
+def test_search_sent_emails_includes_campaign_messages(db):
+    db.add_sent_email(["old@example.com"], "Invoice", "Your overdue invoice", SENT)
+    campaign_id = db.add_campaign(
+        ["ann@example.com", "bob@example.com", "cid@example.com"],
+        ["Invoice for Ann", "Hello Bob", "Invoice for Cid"],
+        ["Your invoice is overdue", "See you soon", "Your invoice is overdue"],
+        SENT,
+        statuses=["sent", "sent", "failed"],
+    )
+
+    results = db.search_sent_emails("overdue invoice")
+
+    assert sorted(result["recipients"][0] for result in results) == [
+        "ann@example.com",
+        "old@example.com",
+    ]
+    ann = next(result for result in results if result.get("campaign_id") == campaign_id)
+    assert ann["subject"] == "Invoice for Ann"
+    assert ann["body"] == "Your invoice is overdue"
+    assert ann["sent_date"] == SENT.isoformat()
+
+
+def test_search_sent_emails_matches_recipient_and_prefix(db):
+    db.add_campaign(["charles@example.com"], ["Birthday"], ["Happy birthday!"], SENT)
+
+    assert [r["subject"] for r in db.search_sent_emails("charl birth")] == ["Birthday"]
+    assert db.search_sent_emails("invoice") == []
+
+
+def test_search_sent_emails_skips_unsent_campaigns(db):
+    db.add_campaign(["ann@example.com"], ["Invoice"], ["Overdue"], SENT, kind="schedule")
+
+    assert db.search_sent_emails("invoice") == []
+
+
+def test_search_ranks_across_kinds_and_pages(db):
+    db.add_profile("Ann Invoice", "ann@example.com", "", "")
+    db.add_template("Invoice", "Invoice reminder: your invoice is overdue")
+    db.add_sent_email(["bob@example.com"], "Lunch", "About the invoice", SENT)
+
+    results = db.search("invoice")
+    assert results["total"] == 3
+    assert results["hits"][0]["kind"] == "template"
+    assert {hit["kind"] for hit in results["hits"]} == {"profile", "template", "sent_email"}
+    assert results["hits"][2]["doc"]["body"] == "About the invoice"
+
+    page = db.search("invoice", offset=1, limit=1)
+    assert page["total"] == 3
+    assert page["hits"] == results["hits"][1:2]
+
+
+def test_search_filters_kinds_and_requires_every_word(db):
+    db.add_profile("Ann", "ann@example.com", "", "")
+    db.add_template("Ann's invoice", "Overdue")
+
+    assert [hit["kind"] for hit in db.search("ann", kinds=["template"])["hits"]] == ["template"]
+    assert db.search("ann missing")["total"] == 0
@@ -0,0 +1,120 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from utils.smtp_pool import SMTPPool
+
+
+class Recorder:
+    """aiosmtpd handler that keeps every message and the client port it came in on."""
+
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.messages.append(envelope)
+            self.peers.add(session.peer)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    handler = Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port(), timeout=0.5)
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def _pool(controller, **kwargs):
+    return SMTPPool(
+        "sender@example.com",
+        None,
+        host=controller.hostname,
+        port=controller.port,
+        smtp_ssl=False,
+        smtp_starttls=False,
+        smtp_skip_login=True,
+        **kwargs,
+    )
+
+
+def test_sends_reuse_one_connection(server):
+    controller, handler = server
+    pool = _pool(controller, max_connections=2)
+    for n in range(5):
+        pool.send(f"to{n}@example.com", f"subject {n}", "body")
+    pool.close()
+
+    assert len(handler.messages) == 5
+    assert len(handler.peers) == 1
+    assert [message.rcpt_tos for message in handler.messages] == [
+        [f"to{n}@example.com"] for n in range(5)
+    ]
+
+
+def test_connection_recycled_after_max_messages(server):
+    controller, handler = server
+    pool = _pool(controller, max_connections=1, max_messages_per_connection=2)
+    for n in range(5):
+        pool.send(f"to{n}@example.com", "subject", "body")
+    pool.close()
+
+    assert len(handler.messages) == 5
+    assert len(handler.peers) == 3
+
+
+def test_reconnects_when_server_hung_up_mid_send(server):
+    controller, handler = server
+    pool = _pool(controller, max_connections=1)
+    pool.send("first@example.com", "subject", "body")
+    # Drop the idle connection under the pool, as a server restart would.
+    with pool.connection() as conn:
+        conn.client.smtp.sock.shutdown(socket.SHUT_RDWR)
+    pool.send("second@example.com", "subject", "body")
+    pool.close()
+
+    assert [message.rcpt_tos for message in handler.messages] == [
+        ["first@example.com"],
+        ["second@example.com"],
+    ]
+    assert len(handler.peers) == 2
+
+
+def test_probes_and_replaces_connection_the_server_timed_out(server):
+    controller, handler = server
+    pool = _pool(controller, max_connections=1, keepalive_interval=0.2)
+    pool.send("first@example.com", "subject", "body")
+    # The server closes sessions idle for more than half a second.
+    time.sleep(1.0)
+    pool.send("second@example.com", "subject", "body")
+    pool.close()
+
+    assert len(handler.messages) == 2
+    assert len(handler.peers) == 2
+
+
+def test_concurrent_sends_all_delivered_within_pool_size(server):
+    controller, handler = server
+    pool = _pool(controller, max_connections=3)
+    recipients = [f"user{n}@example.com" for n in range(30)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda to: pool.send(to, "subject", "body"), recipients))
+    pool.close()
+
+    delivered = sorted(to for message in handler.messages for to in message.rcpt_tos)
+    assert delivered == sorted(recipients)
+    assert 1 <= len(handler.peers) <= 3
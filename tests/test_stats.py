@@ -0,0 +1,117 @@
+from datetime import date, datetime
+
+import pytest
+
+from utils.db import DatabaseManager
+from utils.storage import migrate_json_to_sqlite
+
+SENT = datetime(2024, 5, 1, 9, 0)
+
+
+@pytest.fixture(params=[".json", ".db"])
+def db(tmp_path, request):
+    return DatabaseManager(str(tmp_path / f"email_manager{request.param}"))
+
+
+def _aggregates(db):
+    return {
+        "totals": db.get_totals(),
+        "top": sorted(db.get_top_recipients(limit=100)),
+        "days": db.get_daily_stats(SENT.date(), date.today()),
+    }
+
+
+def _recounted(db):
+    # What the counters should hold: the same figures recomputed from the tables.
+    db.rebuild_stats()
+    return _aggregates(db)
+
+
+def _send_everything(db):
+    db.add_sent_emails(
+        [
+            (["ann@example.com", "bob@example.com"], "Hi", "Body", SENT),
+            (["Ann@Example.com"], "Again", "Body", SENT),
+        ]
+    )
+    sent = db.add_campaign(
+        ["cid@example.com", "dee@example.com"],
+        ["Hi", "Hi"],
+        ["One", "Two"],
+        SENT,
+        statuses=["sent", "failed"],
+    )
+    scheduled = db.add_campaign(
+        ["eve@example.com", "fay@example.com", "gus@example.com"],
+        ["News"] * 3,
+        ["A", "B", "C"],
+        datetime.now(),
+        kind="schedule",
+    )
+    # What the scheduler does with a due campaign: queue it and let a worker send it.
+    (schedule,) = db.get_schedules_for_campaign(scheduled)
+    outbox_ids = db.enqueue_outbox(
+        [("eve@example.com", "News", "A"), ("fay@example.com", "News", "B")],
+        campaign_id=scheduled,
+    )
+    db.update_schedule_status(schedule.doc_id, "queued", attempts=1)
+    db.claim_outbox("worker", limit=10)
+    db.finish_outbox(
+        [
+            (outbox_ids[0], "sent", None, None, datetime.now()),
+            (outbox_ids[1], "dead", "mailbox unavailable", 550, None),
+        ]
+    )
+    db.add_schedule(db.add_sent_email(["hal@example.com"], "Later", "Body", SENT), SENT)
+    return sent, scheduled
+
+
+def test_counters_match_a_recount_after_sends(db):
+    _send_everything(db)
+
+    aggregates = _aggregates(db)
+    totals = aggregates["totals"]
+    assert (totals["sent"], totals["failed"]) == (6, 2)
+    assert totals["failure_rate"] == pytest.approx(2 / 8)
+    assert totals["backlog"] == 1
+    assert totals["outbox"] == 0
+    assert ("ann@example.com", 2) in aggregates["top"]
+    assert aggregates == _recounted(db)
+
+
+def test_counters_match_a_recount_after_deletes(db):
+    sent, scheduled = _send_everything(db)
+    pending = db.add_campaign(["ivy@example.com"], ["Soon"], ["Body"], SENT, kind="schedule")
+    queued = db.enqueue_outbox([("jon@example.com", "Later", "Body")], campaign_id=pending)
+    assert db.get_totals()["backlog"] == 2
+    assert db.get_totals()["outbox"] == 1
+
+    db.delete_campaign(sent)
+    db.delete_campaign(pending)
+    (schedule,) = db.get_schedules_for_email(db.get_all_sent_emails()[-1].doc_id)
+    db.delete_schedule(schedule.doc_id)
+
+    aggregates = _aggregates(db)
+    totals = aggregates["totals"]
+    assert (totals["sent"], totals["failed"]) == (5, 1)
+    assert (totals["backlog"], totals["outbox"]) == (0, 0)
+    assert db.get_outbox(queued) == []
+    assert "cid@example.com" not in dict(aggregates["top"])
+    assert aggregates == _recounted(db)
+
+
+def test_counters_survive_migration(tmp_path):
+    json_path = str(tmp_path / "email_manager.json")
+    source = DatabaseManager(json_path)
+    _send_everything(source)
+    expected = _aggregates(source)
+
+    sqlite_path = str(tmp_path / "email_manager.db")
+    migrate_json_to_sqlite(json_path, sqlite_path)
+    target = DatabaseManager(sqlite_path)
+
+    assert _aggregates(target) == expected
+    target.add_sent_email(["kim@example.com"], "After", "Body", SENT)
+    assert target.get_totals()["sent"] == expected["totals"]["sent"] + 1
+    assert _aggregates(target) == _recounted(target)
+    target.storage.close()
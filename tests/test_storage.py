@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+import sqlite3
+from datetime import datetime
+
+import pytest
+from tinydb import Query
+
+from utils.db import DatabaseManager
+
+
+@pytest.fixture
+def json_path(tmp_path):
+    return str(tmp_path / "email_manager.json")
+
+
+def _campaign(db, recipient):
+    return db.add_campaign([recipient], ["Hello"], ["Body"], datetime(2024, 5, 1, 9, 0))
+
+
+def test_inserts_from_two_processes_interleave(json_path):
+    # Two managers on one file behave like the app and the scheduler in separate processes.
+    first, second = DatabaseManager(json_path), DatabaseManager(json_path)
+
+    ids = [
+        _campaign(first, "a@example.com"),
+        _campaign(second, "b@example.com"),
+        _campaign(first, "c@example.com"),
+        _campaign(second, "d@example.com"),
+    ]
+    profiles = [
+        first.add_profile("Ann", "ann@example.com", "", ""),
+        second.add_profile("Bob", "bob@example.com", "", ""),
+        first.add_profile("Cid", "cid@example.com", "", ""),
+    ]
+
+    assert len(set(ids)) == 4
+    assert len(set(profiles)) == 3
+    reader = DatabaseManager(json_path)
+    assert sorted(c["recipients"][0] for c in reader.get_all_campaigns()) == [
+        "a@example.com",
+        "b@example.com",
+        "c@example.com",
+        "d@example.com",
+    ]
+    assert [p["name"] for p in reader.get_all_profiles()] == ["Ann", "Bob", "Cid"]
+
+
+def _add_in_child(json_path):
+    db = DatabaseManager(json_path)
+    _campaign(db, "child@example.com")
+    db.add_profile("Child", "child@example.com", "", "")
+
+
+def test_inserts_after_a_write_from_a_child_process(json_path):
+    db = DatabaseManager(json_path)
+    _campaign(db, "parent@example.com")
+    db.add_profile("Parent", "parent@example.com", "", "")
+
+    child = multiprocessing.get_context("spawn").Process(target=_add_in_child, args=(json_path,))
+    child.start()
+    child.join(60)
+    assert child.exitcode == 0
+
+    _campaign(db, "parent2@example.com")
+    db.add_profile("Parent 2", "parent2@example.com", "", "")
+    assert len(db.get_all_campaigns()) == 3
+    assert len(db.get_all_profiles()) == 3
+
+
+def test_search_sees_rows_written_by_another_process(json_path):
+    first, second = DatabaseManager(json_path), DatabaseManager(json_path)
+    table = first.db.table("profiles")
+    assert table.search(Query().name == "Bob") == []
+
+    second.add_profile("Bob", "bob@example.com", "", "")
+
+    assert [doc["email"] for doc in table.search(Query().name == "Bob")] == ["bob@example.com"]
+
+
+class Boom(Exception):
+    pass
+
+
+@pytest.fixture
+def write_behind_db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "email_manager.db"), write_behind=True, flush_interval=60)
+    yield db
+    db.storage.close()
+
+
+def _committed_names(db):
+    # What another process would see: only rows that have been committed.
+    with sqlite3.connect(db.db_path) as conn:
+        rows = conn.execute("SELECT data FROM profiles ORDER BY doc_id").fetchall()
+    return [json.loads(data)["name"] for (data,) in rows]
+
+
+def test_failed_write_behind_transaction_releases_the_database(write_behind_db):
+    db = write_behind_db
+    with pytest.raises(Boom), db.transaction():
+        db.add_profile("Ann", "ann@example.com", "", "")
+        raise Boom
+
+    assert not db.storage.conn.in_transaction
+    other = DatabaseManager(db.db_path)
+    other.add_profile("Bob", "bob@example.com", "", "")
+    assert _committed_names(db) == ["Bob"]
+    other.storage.close()
+
+
+def test_failed_write_behind_transaction_commits_earlier_deferred_writes(write_behind_db):
+    db = write_behind_db
+    db.add_profile("Ann", "ann@example.com", "", "")
+    assert db.storage.conn.in_transaction
+
+    with pytest.raises(Boom), db.transaction():
+        db.add_profile("Bob", "bob@example.com", "", "")
+        raise Boom
+
+    assert not db.storage.conn.in_transaction
+    assert db.storage._policy.pending == 0
+    assert _committed_names(db) == ["Ann"]
+
+
+def test_write_behind_defers_commit_until_flush(write_behind_db):
+    db = write_behind_db
+    db.add_profile("Ann", "ann@example.com", "", "")
+    assert _committed_names(db) == []
+
+    db.flush()
+    assert _committed_names(db) == ["Ann"]
+
+
+def test_durable_transaction_commits_in_write_behind_mode(write_behind_db):
+    db = write_behind_db
+    with db.transaction(durable=True):
+        db.add_profile("Ann", "ann@example.com", "", "")
+    assert _committed_names(db) == ["Ann"]
+    assert not db.storage.conn.in_transaction
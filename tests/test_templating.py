@@ -0,0 +1,75 @@
+import pytest
+
+from utils.db import DatabaseManager
+from utils.templating import (
+    CompiledTemplate,
+    TemplateCache,
+    recipient_context,
+    render_batch,
+    user_context,
+)
+
+BODY = "Hi {{ first_name }} ({{title}}), {x} {{ missing }}\n{{user.name}}, {{ signature }}"
+PROFILES = [
+    {"name": "Ann Lee", "email": "ann@example.com", "title": "CTO", "profession": "Engineer"},
+    {"name": "", "email": "bob@example.com", "title": None, "profession": ""},
+    {"name": "Cid", "email": "cid@example.com"},
+]
+USER = {"name": "Me", "title": "Founder", "signature": "-- Me"}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "email_manager.json"))
+
+
+def test_render_fills_placeholders_and_keeps_unknown_ones():
+    template = CompiledTemplate(BODY)
+
+    assert template.fields == ("first_name", "title", "missing", "user.name", "signature")
+    assert template.render({"first_name": "Ann", "title": "CTO", "user.name": "Me"}) == (
+        "Hi Ann (CTO), {x} {{ missing }}\nMe, {{ signature }}"
+    )
+    assert CompiledTemplate("No {placeholders}").render({}) == "No {placeholders}"
+
+
+def test_render_batch_matches_rendering_one_at_a_time():
+    template = CompiledTemplate(BODY)
+
+    bodies = render_batch(template, PROFILES, USER, suffix="\n\nBye")
+
+    expected = [
+        template.render({**user_context(USER), **recipient_context(profile)}) + "\n\nBye"
+        for profile in PROFILES
+    ]
+    assert bodies == expected
+    assert bodies[0].startswith("Hi Ann (CTO), {x} {{ missing }}\nMe, -- Me")
+    # A recipient without a field does not inherit the previous recipient's value.
+    assert bodies[2].startswith("Hi Cid (), ")
+    assert render_batch(CompiledTemplate("Plain"), PROFILES, suffix="!") == ["Plain!"] * 3
+
+
+def test_cache_compiles_once_per_body():
+    cache = TemplateCache()
+    first = cache.get(1, "Hi {{name}}")
+
+    assert cache.get(1, "Hi {{name}}") is first
+    assert cache.get(1, "Hello {{name}}").source == "Hello {{name}}"
+    cache.invalidate(1)
+    assert cache.get(1, "Hello {{name}}") is not first
+
+
+def test_template_edits_invalidate_the_compiled_template(db, tmp_path):
+    template_id = db.add_template("Greeting", "Hi {{name}}")
+    compiled = db.get_compiled_template(template_id)
+    assert db.get_compiled_template(template_id) is compiled
+
+    db.update_template(template_id, "Greeting", "Hello {{name}}")
+    assert db.get_compiled_template(template_id).render({"name": "Ann"}) == "Hello Ann"
+
+    # An edit from another process is noticed by comparing the body.
+    DatabaseManager(db.db_path).update_template(template_id, "Greeting", "Hey {{name}}")
+    assert db.get_compiled_template(template_id).render({"name": "Ann"}) == "Hey Ann"
+
+    db.delete_template(template_id)
+    assert db.get_compiled_template(template_id) is None
@@ -0,0 +1,122 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from utils.db import DatabaseManager
+from utils.transfer import (
+    EXPORT_COLUMNS,
+    detect_format,
+    export_table,
+    import_profiles,
+    read_records,
+)
+
+SENT = datetime(2024, 5, 1, 9, 0)
+CSV = """Name,Email,Title,Profession
+Ann Lee,ann@example.com,CTO,Engineer
+Bob,bob@example.com,,
+Ann Again,ANN@example.com,,
+No Email,,,
+Bad,not-an-email,,
+,cid@example.com,,
+Dan,dan@example.com,Dr,Doctor
+"""
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "email_manager.json"))
+
+
+def _profiles(db):
+    return [
+        {k: p[k] for k in ("name", "email", "title", "profession")} for p in db.get_all_profiles()
+    ]
+
+
+def test_import_skips_duplicates_and_reports_bad_rows(db):
+    db.add_profile("Dan", "dan@example.com", "", "")
+    chunks = []
+
+    report = import_profiles(db, io.StringIO(CSV), "csv", chunk_size=2, on_chunk=chunks.append)
+
+    assert (report.read, report.inserted, report.duplicates, report.invalid) == (7, 2, 2, 3)
+    assert report.errors == [
+        "line 5: missing email",
+        "line 6: invalid email 'not-an-email'",
+        "line 7: missing name",
+    ]
+    assert len(chunks) == 4
+    assert [p["email"] for p in db.get_all_profiles()] == [
+        "dan@example.com",
+        "ann@example.com",
+        "bob@example.com",
+    ]
+
+
+def test_import_jsonl_rejects_lines_that_are_not_objects(db):
+    lines = [
+        json.dumps({"name": "Ann", "email": "ann@example.com", "title": 3}),
+        "",
+        "[1, 2]",
+        "{broken",
+    ]
+    report = import_profiles(db, io.StringIO("\n".join(lines) + "\n"), "jsonl")
+
+    assert (report.read, report.inserted, report.invalid) == (3, 1, 2)
+    assert report.errors == ["line 3: not a JSON object", "line 4: not a JSON object"]
+    assert db.get_all_profiles()[0]["title"] == "3"
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_profiles_round_trip(db, tmp_path, fmt):
+    import_profiles(db, io.StringIO(CSV), "csv")
+    exported = io.StringIO()
+    assert export_table(db, "profiles", exported, fmt) == 3
+
+    copy = DatabaseManager(str(tmp_path / "copy.json"))
+    report = import_profiles(copy, io.StringIO(exported.getvalue()), fmt)
+
+    assert (report.inserted, report.invalid) == (3, 0)
+    assert _profiles(copy) == _profiles(db)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_history_export_streams_every_row(db, fmt):
+    db.add_sent_email(["a@example.com", "b@example.com"], "Hi", "Body", SENT)
+    campaign_id = db.add_campaign(
+        ["c@example.com", "d@example.com"],
+        ["Hi C", "Hi D"],
+        ["Body C", "Body D"],
+        SENT,
+        statuses=["sent", "failed"],
+        errors={"d@example.com": "550 no such user"},
+    )
+
+    sent, campaigns = io.StringIO(), io.StringIO()
+    assert export_table(db, "sent_emails", sent, fmt, chunk_size=1) == 1
+    assert export_table(db, "campaigns", campaigns, fmt, chunk_size=1) == 2
+
+    (email,) = [record for _, record in read_records(io.StringIO(sent.getvalue()), fmt)]
+    assert set(email) == set(EXPORT_COLUMNS["sent_emails"])
+    expected = "a@example.com;b@example.com" if fmt == "csv" else ["a@example.com", "b@example.com"]
+    assert email["recipients"] == expected
+    assert email["body"] == "Body"
+    rows = [record for _, record in read_records(io.StringIO(campaigns.getvalue()), fmt)]
+    assert [(r["recipient"], r["body"], r["status"]) for r in rows] == [
+        ("c@example.com", "Body C", "sent"),
+        ("d@example.com", "Body D", "failed"),
+    ]
+    assert str(rows[0]["campaign_id"]) == str(campaign_id)
+    assert rows[1]["error"] == "550 no such user"
+
+
+def test_rejects_unknown_formats_and_tables(db):
+    assert detect_format("contacts.JSONL") == "jsonl"
+    assert detect_format("contacts.txt") == "csv"
+    with pytest.raises(ValueError):
+        import_profiles(db, io.StringIO(""), "xml")
+    with pytest.raises(ValueError):
+        export_table(db, "stats", io.StringIO())